@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+benchmark.py — Mide tiempo y memoria de las etapas del pipeline EPA.
+
+Ejecuta sobre un conjunto de datos (sintetico, ver synthetic_data.py, o un
+directorio como data/raw) las etapas load_csv, clean, validate_clean,
+build_features, el aplanado de los JSON crudos, el cubo denso, los
+agregados, el indice EpaCube y cada uno de los 9 graficos en cada perfil
+de renderizado (publication y preview).  De cada etapa guarda el mejor
+tiempo y la mediana de --repeat ejecuciones y el pico de memoria
+(tracemalloc, en una ejecucion aparte), y lo anade a data/bench/results.jsonl.  Cada resultado
+se compara con la ejecucion anterior sobre los mismos datos y se marcan
+como REGRESION las etapas mas lentas que --threshold veces la anterior.
+
+Uso:
+    python benchmark.py                    # datos sinteticos x1
+    python benchmark.py --scale 1 10       # x1 y x10
+    python benchmark.py --data data/raw    # datos descargados
+    python benchmark.py --repeat 5 --no-memory
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+from src.config import BENCH_RESULTS_PATH, RAW_PATH, ROOT
+from src.aggregates import rollup
+from src.cleaning import clean
+from src.dense import build_dense
+from src.features import build_features
+from src.io import flatten_series, iter_json_series, load_csv
+from src.query import EpaCube
+from src.utils import validate_clean
+from src import viz
+
+# A stage is a regression when it is this many times slower than the
+# previous run on the same data, and by at least MIN_DELTA seconds
+THRESHOLD = 1.25
+MIN_DELTA = 0.02
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+
+def measure(fn: Callable, repeat: int = 3, memory: bool = True) -> tuple[object, dict]:
+    """Run *fn* *repeat* times; return its result and the timings.
+
+    Peak memory is measured in an extra run, since tracemalloc slows
+    allocation-heavy code down.
+    """
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    stats = {"seconds": round(min(times), 4),
+             "median": round(statistics.median(times), 4)}
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            stats["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+        finally:
+            tracemalloc.stop()
+    return result, stats
+
+
+def _chart(plot_fn, source: str, out: Path, render: str = "publication"):
+    def run(ctx):
+        # Raw-table charts start cold, as in a fresh worker process
+        viz._read_raw_table.cache_clear()
+        plot_fn(ctx[source], save_path=out, render=render)
+    return run
+
+
+def stages(raw_dir: Path, charts_dir: Path) -> list[tuple[str, Callable, str | None]]:
+    """(name, fn(ctx), ctx key for its result) for every benchmarked stage."""
+    jsons = sorted(Path(raw_dir).glob("*_raw.json"))
+    steps = [
+        ("load_csv", lambda ctx: load_csv(Path(raw_dir) / RAW_PATH.name), "raw_df"),
+        ("clean", lambda ctx: clean(ctx["raw_df"]), "clean"),
+        ("validate_clean", lambda ctx: validate_clean(ctx["clean"], verbose=False), None),
+        ("build_features", lambda ctx: build_features(ctx["clean"]), "features"),
+        ("flatten_json", lambda ctx: [flatten_series(iter_json_series(p)) for p in jsons],
+         None),
+        ("dense_cube", lambda ctx: build_dense(ctx["features"]), "dense"),
+        ("aggregates", lambda ctx: rollup(ctx["dense"]), "aggregates"),
+        ("epa_cube", lambda ctx: EpaCube(ctx["features"], dense=ctx["dense"],
+                                         aggregates=ctx["aggregates"]), "df"),
+    ]
+    # Every chart in each render profile ("chart:<name>" is publication)
+    for render in viz.RENDER_PROFILES:
+        suffix = "" if render == "publication" else f":{render}"
+        for filename, plot_fn, source in viz.CHARTS:
+            name = Path(filename).stem
+            steps.append((f"chart:{name}{suffix}",
+                          _chart(plot_fn, source, Path(charts_dir) / filename, render), None))
+    return steps
+
+
+def run_benchmark(raw_dir: Path, repeat: int = 3, memory: bool = True) -> dict[str, dict]:
+    """Time (and memory-profile) every stage on the data in *raw_dir*."""
+    results = {}
+    with tempfile.TemporaryDirectory() as charts_dir:
+        ctx = {"raw": Path(raw_dir)}
+        for name, fn, key in stages(raw_dir, Path(charts_dir)):
+            result, results[name] = measure(lambda: fn(ctx), repeat, memory)
+            if key is not None:
+                ctx[key] = result
+            line = f"  {name:<38} {results[name]['seconds']:8.3f} s"
+            if memory:
+                line += f"  {results[name]['peak_mb']:9.1f} MB"
+            print(line)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Results history
+# ---------------------------------------------------------------------------
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def last_result(dataset: str, path: Path = BENCH_RESULTS_PATH) -> dict | None:
+    """The most recent saved record for *dataset*, if any."""
+    if not Path(path).exists():
+        return None
+    previous = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["dataset"] == dataset:
+                previous = record
+    return previous
+
+
+def save_result(record: dict, path: Path = BENCH_RESULTS_PATH) -> None:
+    """Append *record* to the JSON Lines history at *path*."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def regressions(current: dict, previous: dict | None,
+                threshold: float = THRESHOLD) -> list[str]:
+    """Stages of *current* markedly slower than in *previous*."""
+    if previous is None:
+        return []
+    slower = []
+    for name, stats in current["stages"].items():
+        before = previous["stages"].get(name)
+        if before is None:
+            continue
+        if (stats["seconds"] > before["seconds"] * threshold
+                and stats["seconds"] - before["seconds"] >= MIN_DELTA):
+            slower.append(name)
+    return slower
+
+
+def print_comparison(current: dict, previous: dict | None, slower: list[str]) -> None:
+    if previous is None:
+        print("  (sin ejecucion anterior con la que comparar)")
+        return
+    print(f"  Comparado con {previous['timestamp']} "
+          f"(commit {previous.get('commit') or '?'}):")
+    for name, stats in current["stages"].items():
+        before = previous["stages"].get(name)
+        if before is None or not before["seconds"]:
+            continue
+        change = stats["seconds"] / before["seconds"] - 1
+        flag = "  REGRESION" if name in slower else ""
+        print(f"  {name:<38} {before['seconds']:8.3f} s -> "
+              f"{stats['seconds']:8.3f} s  ({change:+.0%}){flag}")
+
+
+def benchmark_dataset(raw_dir: Path, dataset: str, repeat: int = 3, memory: bool = True,
+                      results_path: Path = BENCH_RESULTS_PATH,
+                      threshold: float = THRESHOLD) -> list[str]:
+    """Benchmark *raw_dir*, save the record and return the regressed stages."""
+    print(f"\n[{dataset}] {raw_dir}")
+    stats = run_benchmark(raw_dir, repeat=repeat, memory=memory)
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "dataset": dataset,
+        "repeat": repeat,
+        "stages": stats,
+    }
+    previous = last_result(dataset, results_path)
+    slower = regressions(record, previous, threshold)
+    print_comparison(record, previous, slower)
+    save_result(record, results_path)
+    return slower
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(
+        description="Mide tiempo y memoria de las etapas del pipeline EPA.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    p.add_argument("--scale", type=int, nargs="+", default=[1],
+                   help="Escalas de datos sinteticos a medir (default: 1)")
+    p.add_argument("--data", type=Path, default=None,
+                   help="Medir este directorio (p. ej. data/raw) en lugar de "
+                        "datos sinteticos")
+    p.add_argument("-r", "--repeat", type=int, default=3,
+                   help="Ejecuciones por etapa (default: 3)")
+    p.add_argument("--memory", action=argparse.BooleanOptionalAction, default=True,
+                   help="Medir el pico de memoria (default: True)")
+    p.add_argument("--threshold", type=float, default=THRESHOLD,
+                   help=f"Factor de lentitud que se marca como regresion "
+                        f"(default: {THRESHOLD:g})")
+    p.add_argument("--results", type=Path, default=BENCH_RESULTS_PATH,
+                   help="Historico de resultados (default: data/bench/results.jsonl)")
+    p.add_argument("--fail-on-regression", action="store_true",
+                   help="Salir con codigo 1 si alguna etapa empeora")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.data is not None:
+        datasets = [(args.data, str(args.data.resolve()))]
+    else:
+        from synthetic_data import ensure_synthetic
+        datasets = [(ensure_synthetic(scale), f"synthetic-x{scale}") for scale in args.scale]
+
+    slower = []
+    for raw_dir, dataset in datasets:
+        slower += benchmark_dataset(raw_dir, dataset, repeat=args.repeat,
+                                    memory=args.memory, results_path=args.results,
+                                    threshold=args.threshold)
+    print(f"\nResultados anadidos a {args.results}")
+    if slower and args.fail_on_regression:
+        sys.exit(1)
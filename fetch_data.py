@@ -3,7 +3,8 @@
 fetch_data.py — Descarga datos de la EPA desde la API publica del INE.
 
 Descarga las 6 tablas de la EPA necesarias para el proyecto,
-las guarda como JSON crudo y genera el CSV combinado (raw y dirty).
+las guarda como JSON crudo y genera el CSV combinado (raw y dirty),
+mas copias columnares en Parquet (--format).
 
 Uso:
     python fetch_data.py --start 2020 --end 2025
@@ -21,16 +22,27 @@ Tablas descargadas:
         65112 — Ocupados por nacionalidad, sexo y grupo de edad
 """
 
+from __future__ import annotations
+
 import argparse
+import hashlib
 import json
 import random
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+from src.config import HTTP_CACHE_DIR, HTTP_CACHE_TTL
 
-import pandas as pd
-import requests
+# pandas, requests and src.io (pandas/numpy) are imported inside the
+# functions that use them, so --help and argument errors are instant
+if TYPE_CHECKING:
+    import pandas as pd
+    import requests
 
 # ---------------------------------------------------------------------------
 # Configuration
@@ -68,6 +80,11 @@ EXTRA_TABLES = {
     },
 }
 
+# Concurrent downloads: at most FETCH_WORKERS requests in flight and on
+# average FETCH_RATE new requests per second (replaces the fixed 1 s sleep)
+FETCH_WORKERS = 4
+FETCH_RATE = 1.0
+
 RAW_CSV_COLUMNS = [
     "tabla", "serie_cod", "serie_nombre", "fecha_ms",
     "anyo", "periodo_id", "valor", "secreto",
@@ -78,43 +95,197 @@ RAW_CSV_COLUMNS = [
 # ---------------------------------------------------------------------------
 
 
-def build_url(tabla_id: int, start_year: int, end_year: int) -> str:
+def build_url(tabla_id: int, start_year: int, end_year: int,
+              since: str | None = None) -> str:
     """Build the INE API URL with a date range filter.
 
     The EPA publishes quarterly data.  To capture full years we request
-    from Jan-1 of *start_year* through Dec-31 of *end_year*.
+    from Jan-1 of *start_year* through Dec-31 of *end_year*.  *since*
+    (``YYYYMMDD``) replaces the start date, for incremental fetches.
+    """
+    start = since or f"{start_year}0101"
+    return f"{BASE_URL}/{tabla_id}?date={start}:{end_year}1231"
+
+
+class TokenBucket:
+    """Thread-safe token bucket: *rate* requests per second, bursts of *burst*."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available and take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst,
+                                   self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ResponseCache:
+    """On-disk cache of INE API responses, keyed by request URL.
+
+    An entry younger than *ttl* seconds is served without any request.
+    Older entries are revalidated with ``If-None-Match``/``If-Modified-Since``
+    when the server sent an ETag/Last-Modified (a 304 reuses the body);
+    otherwise the new body is compared with the cached one by SHA-256.
+    With ``offline=True`` every lookup is served from the cache, however old.
     """
-    return f"{BASE_URL}/{tabla_id}?date={start_year}0101:{end_year}1231"
+
+    def __init__(self, root: Path = HTTP_CACHE_DIR, ttl: float = HTTP_CACHE_TTL,
+                 offline: bool = False):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.offline = offline
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        key = hashlib.sha256(url.encode()).hexdigest()[:32]
+        return self.root / f"{key}.json", self.root / f"{key}.meta.json"
+
+    def _meta(self, url: str) -> dict | None:
+        body, meta = self._paths(url)
+        if not (body.exists() and meta.exists()):
+            return None
+        return json.loads(meta.read_text(encoding="utf-8"))
+
+    def _write_meta(self, url: str, meta: dict) -> None:
+        path = self._paths(url)[1]
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        tmp.replace(path)
+
+    def _load(self, url: str) -> list[dict]:
+        return json.loads(self._paths(url)[0].read_bytes())
+
+    def get(self, url: str) -> list[dict] | None:
+        """Cached response if still fresh (or offline), else None."""
+        meta = self._meta(url)
+        if meta is None:
+            return None
+        if self.offline or time.time() - meta["fetched_at"] < self.ttl:
+            return self._load(url)
+        return None
+
+    def validators(self, url: str) -> dict[str, str]:
+        """Conditional request headers for the cached entry of *url*."""
+        meta = self._meta(url) or {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def revalidated(self, url: str) -> list[dict]:
+        """Mark the entry of *url* fresh again (after a 304) and return it."""
+        meta = self._meta(url)
+        meta["fetched_at"] = time.time()
+        self._write_meta(url, meta)
+        return self._load(url)
+
+    def store(self, url: str, content: bytes, headers) -> bool:
+        """Store a 200 response; return False if the body was unchanged."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        body = self._paths(url)[0]
+        digest = hashlib.sha256(content).hexdigest()
+        old = self._meta(url)
+        changed = old is None or old["sha256"] != digest
+        if changed:
+            tmp = body.with_suffix(".tmp")
+            tmp.write_bytes(content)
+            tmp.replace(body)
+        self._write_meta(url, {
+            "url": url,
+            "fetched_at": time.time(),
+            "sha256": digest,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+        })
+        return changed
+
+
+def make_session(pool_size: int = FETCH_WORKERS) -> requests.Session:
+    """A keep-alive session whose connection pool fits *pool_size* threads."""
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                            pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 def fetch_table(tabla_id: int, start_year: int, end_year: int,
-                max_retries: int = 3, backoff: float = 2.0) -> list[dict]:
-    """Fetch a single table from the INE API with retry logic."""
-    url = build_url(tabla_id, start_year, end_year)
+                max_retries: int = 3, backoff: float = 2.0,
+                session: requests.Session | None = None,
+                limiter: TokenBucket | None = None,
+                cache: ResponseCache | None = None,
+                since: str | None = None) -> list[dict]:
+    """Fetch a single table from the INE API with retry logic.
+
+    Requests go through *session* (pooled connections) when given, and
+    every attempt, retries included, first takes a token from *limiter*.
+    With a *cache*, fresh responses are reused and stale ones revalidated.
+    *since* narrows the request to the periods from that date on.
+    """
+    import requests
+
+    url = build_url(tabla_id, start_year, end_year, since)
+    http = session or requests
+
+    headers = {}
+    if cache is not None:
+        data = cache.get(url)
+        if data is not None:
+            print(f"  [{tabla_id}] Cache HTTP: "
+                  f"{'offline' if cache.offline else 'vigente'}")
+            return data
+        if cache.offline:
+            raise RuntimeError(
+                f"Modo offline: tabla {tabla_id} no esta en la cache HTTP "
+                f"({url})")
+        headers = cache.validators(url)
 
     for attempt in range(1, max_retries + 1):
         try:
-            resp = requests.get(url, timeout=120)
+            if limiter is not None:
+                limiter.acquire()
+            resp = http.get(url, timeout=120, headers=headers)
+            if resp.status_code == 304 and cache is not None:
+                print(f"  [{tabla_id}] Cache HTTP: sin cambios (304)")
+                return cache.revalidated(url)
             resp.raise_for_status()
             data = resp.json()
 
-            if not data:
-                print(f"  AVISO: Tabla {tabla_id} devolvio 0 series para "
-                      f"{start_year}-{end_year}.")
-                return []
-
-            if not isinstance(data, list) or "Data" not in data[0]:
+            if data and (not isinstance(data, list) or "Data" not in data[0]):
                 raise ValueError(
                     f"Respuesta inesperada para tabla {tabla_id}: "
                     f"type={type(data).__name__}")
 
+            if cache is not None and not cache.store(url, resp.content, resp.headers):
+                print(f"  [{tabla_id}] Cache HTTP: sin cambios (mismo contenido)")
+
+            if not data:
+                print(f"  AVISO: Tabla {tabla_id} devolvio 0 series para "
+                      f"{start_year}-{end_year}.")
             return data
 
         except requests.exceptions.RequestException as exc:
             if attempt < max_retries:
                 wait = backoff ** attempt
-                print(f"  Error intento {attempt}/{max_retries}: {exc}")
-                print(f"  Reintentando en {wait:.0f}s ...")
+                print(f"  [{tabla_id}] Error intento {attempt}/{max_retries}: {exc}")
+                print(f"  [{tabla_id}] Reintentando en {wait:.0f}s ...")
                 time.sleep(wait)
             else:
                 raise RuntimeError(
@@ -122,13 +293,85 @@ def fetch_table(tabla_id: int, start_year: int, end_year: int,
                     f"{max_retries} intentos: {exc}") from exc
 
 
+def fetch_tables(tabla_ids, start_year: int, end_year: int,
+                 max_workers: int = FETCH_WORKERS, rate: float = FETCH_RATE,
+                 since: dict[int, str] | None = None, **fetch_kw):
+    """Fetch several tables concurrently, yielding ``(tabla_id, data)`` in order.
+
+    Downloads share one pooled session and one token bucket; results are
+    yielded in the order of *tabla_ids* as soon as each one is ready, so the
+    total time approaches that of the slowest table.  A table that still
+    fails after its retries raises and cancels the pending downloads.
+    *since* maps table ids to the start date of an incremental request.
+    """
+    since = since or {}
+    tabla_ids = list(tabla_ids)
+    max_workers = max(1, min(max_workers, len(tabla_ids)))
+    limiter = TokenBucket(rate, burst=max_workers)
+    with make_session(max_workers) as session, \
+            ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(fetch_table, tabla_id, start_year, end_year,
+                               session=session, limiter=limiter,
+                               since=since.get(tabla_id), **fetch_kw)
+                   for tabla_id in tabla_ids]
+        try:
+            for tabla_id, future in zip(tabla_ids, futures):
+                yield tabla_id, future.result()
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+
+# ---------------------------------------------------------------------------
+# Incremental updates
+# ---------------------------------------------------------------------------
+
+
+def next_fetch_date(series_list: list[dict]) -> str | None:
+    """``YYYYMMDD`` of the day after the latest period in *series_list*.
+
+    ``Fecha`` is the start of the period in Madrid local time, so requesting
+    from the following day returns only newer periods.  None if empty.
+    """
+    import pandas as pd
+
+    latest = max((dp["Fecha"] for serie in series_list
+                  for dp in serie.get("Data", [])), default=None)
+    if latest is None:
+        return None
+    day = pd.Timestamp(latest, unit="ms", tz="UTC").tz_convert("Europe/Madrid")
+    return (day + pd.Timedelta(days=1)).strftime("%Y%m%d")
+
+
+def merge_series(old: Iterable[dict], new: list[dict]) -> Iterator[dict]:
+    """Merge the series of an incremental response into the stored ones.
+
+    Series are matched by ``COD`` and their data points by (Anyo,
+    FK_Periodo), newer values winning; points stay sorted newest first, as
+    INE returns them.  Series that only exist in *new* are appended.  *old*
+    is consumed lazily, so it can be streamed from the stored JSON.
+    """
+    updates = {serie["COD"]: serie for serie in new}
+    for serie in old:
+        update = updates.pop(serie["COD"], None)
+        if update is None:
+            yield serie
+            continue
+        points = {(dp["Anyo"], dp["FK_Periodo"]): dp
+                  for dp in serie.get("Data", [])}
+        points.update({(dp["Anyo"], dp["FK_Periodo"]): dp
+                       for dp in update.get("Data", [])})
+        yield {**serie, "Data": sorted(points.values(),
+                                       key=lambda dp: dp["Fecha"], reverse=True)}
+    yield from updates.values()
+
+
 # ---------------------------------------------------------------------------
 # JSON → DataFrame
 # ---------------------------------------------------------------------------
 
 
 def flatten_table_json(tabla_id: int,
-                       series_list: list[dict]) -> pd.DataFrame:
+                       series_list: Iterable[dict]) -> pd.DataFrame:
     """Flatten an INE JSON response into a tabular DataFrame.
 
     Each element in *series_list* has:
@@ -136,22 +379,11 @@ def flatten_table_json(tabla_id: int,
       Nombre   — series name (e.g. "Total Nacional. Ambos sexos. ...")
       Data     — list of {Fecha, FK_Periodo, Anyo, Valor, Secreto, ...}
     """
-    rows = []
-    for serie in series_list:
-        cod = serie["COD"]
-        nombre = serie["Nombre"].strip()
-        for dp in serie.get("Data", []):
-            rows.append({
-                "tabla": tabla_id,
-                "serie_cod": cod,
-                "serie_nombre": nombre,
-                "fecha_ms": dp["Fecha"],
-                "anyo": dp["Anyo"],
-                "periodo_id": dp["FK_Periodo"],
-                "valor": dp["Valor"],
-                "secreto": dp["Secreto"],
-            })
-    return pd.DataFrame(rows, columns=RAW_CSV_COLUMNS)
+    from src.io import flatten_series
+
+    df = flatten_series(series_list)
+    df.insert(0, "tabla", tabla_id)
+    return df[RAW_CSV_COLUMNS]
 
 
 # ---------------------------------------------------------------------------
@@ -159,7 +391,13 @@ def flatten_table_json(tabla_id: int,
 # ---------------------------------------------------------------------------
 
 
-def make_dirty(df_raw: pd.DataFrame, seed: int = 42) -> pd.DataFrame:
+# Date formats of the dirty "Fecha " column, cycled row by row; None keeps
+# the raw epoch milliseconds
+DIRTY_DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d", "%b %d, %Y", None]
+
+
+def make_dirty(df_raw: pd.DataFrame, seed: int = 42,
+               compat: bool = False) -> pd.DataFrame:
     """Apply intentional data-quality issues to the raw DataFrame.
 
     Transformations (deterministic via *seed*):
@@ -169,12 +407,79 @@ def make_dirty(df_raw: pd.DataFrame, seed: int = 42) -> pd.DataFrame:
       - 5 different date formats (from fecha_ms)
       - ~5 %   UPPERCASED serie_nombre
       - 20 duplicate rows
+
+    Rows are sampled with a numpy Generator and formatted with vectorized
+    pandas operations.  *compat* reproduces the row-by-row implementation
+    of earlier versions, byte for byte for a given *seed* (much slower).
     """
+    if compat:
+        return _make_dirty_compat(df_raw, seed)
+
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    n = len(df_raw)
+
+    def sample(k: int) -> np.ndarray:
+        return rng.choice(n, size=k, replace=False)
+
+    def factorize(col: str) -> tuple[np.ndarray, pd.Index]:
+        # Every value is formatted once per distinct value (-1 = missing)
+        codes, uniques = pd.factorize(df_raw[col])
+        return codes, pd.Index(uniques)
+
+    # -- Fecha: convert ms → 5 mixed human-readable formats --
+    codes, uniques = factorize("fecha_ms")
+    days = pd.to_datetime(uniques, unit="ms")
+    style = np.arange(n) % len(DIRTY_DATE_FORMATS)
+    fechas = np.full(n, "", dtype=object)
+    for i, fmt in enumerate(DIRTY_DATE_FORMATS):
+        labels = (uniques.astype("int64").astype(str) if fmt is None
+                  else days.strftime(fmt))
+        rows = (style == i) & (codes >= 0)
+        fechas[rows] = labels.to_numpy(dtype=object)[codes[rows]]
+
+    # -- Valor: ~10 % comma decimals, ~3 % nulls --
+    codes, uniques = factorize("valor")
+    labels = np.append(uniques.astype(str).to_numpy(dtype=object), "nan")  # [-1] -> nan
+    valor = labels[codes]
+    rows = sample(int(n * 0.10))
+    valor[rows] = np.char.replace(labels.astype(str), ".", ",").astype(object)[codes[rows]]
+    valor[sample(int(n * 0.03))] = ""
+
+    # -- Serie_nombre: ~5 % uppercased --
+    codes, uniques = factorize("serie_nombre")
+    nombres = df_raw["serie_nombre"].to_numpy(dtype=object, copy=True)
+    rows = sample(int(n * 0.05))
+    nombres[rows] = uniques.str.upper().to_numpy(dtype=object)[codes[rows]]
+
+    # -- Assemble with dirty column names --
+    dirty = pd.DataFrame({
+        "Tabla": df_raw["tabla"].to_numpy(),
+        "Serie_Cod": df_raw["serie_cod"].to_numpy(),
+        "Serie Nombre": nombres,
+        "Anyo": df_raw["anyo"].to_numpy(),
+        "Periodo_ID": df_raw["periodo_id"].to_numpy(),
+        " Valor": valor,
+        "Secreto": df_raw["secreto"].to_numpy(),
+        "Fecha ": fechas,
+    })
+
+    # -- Add 20 duplicate rows, then shuffle --
+    rows = np.concatenate([np.arange(n), sample(20)])
+    return dirty.iloc[rng.permutation(rows)].reset_index(drop=True)
+
+
+def _make_dirty_compat(df_raw: pd.DataFrame, seed: int) -> pd.DataFrame:
+    """Row-by-row make_dirty of earlier versions (``compat=True``)."""
+    import pandas as pd
+
     rng = random.Random(seed)
     n = len(df_raw)
 
     # -- Fecha: convert ms → 5 mixed human-readable formats --
-    date_fmts = ["%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d", "%b %d, %Y", None]
+    date_fmts = DIRTY_DATE_FORMATS
 
     def format_fecha(ms_val, fmt):
         if pd.isna(ms_val):
@@ -225,18 +530,101 @@ def make_dirty(df_raw: pd.DataFrame, seed: int = 42) -> pd.DataFrame:
 # ---------------------------------------------------------------------------
 
 
+def write_outputs(frames: dict[int, pd.DataFrame], output_dir: Path,
+                  create_dirty: bool = True, fmt: str = "both",
+                  dirty_compat: bool = False) -> None:
+    """Write the combined raw/dirty CSV and/or Parquet files from *frames*.
+
+    *frames* maps every table id of MAIN_TABLES and EXTRA_TABLES to its
+    flattened DataFrame (see flatten_table_json).  *dirty_compat* is passed
+    to make_dirty as ``compat``.
+    """
+    import pandas as pd
+
+    from src.io import save_parquet
+
+    write_csv = fmt in ("csv", "both")
+    write_parquet = fmt in ("parquet", "both")
+
+    # -- Flatten main tables into combined raw CSV ---------------------------
+    print("\nCombinando tablas principales en CSV ...")
+    for tabla_id in MAIN_TABLES:
+        print(f"  Tabla {tabla_id}: {len(frames[tabla_id]):,} filas")
+
+    df_raw = pd.concat([frames[t] for t in MAIN_TABLES], ignore_index=True)
+    if write_csv:
+        raw_path = output_dir / "epa_mercado_laboral_raw.csv"
+        df_raw.to_csv(raw_path, index=False)
+        print(f"  -> {raw_path.name}  ({df_raw.shape[0]:,} filas x "
+              f"{df_raw.shape[1]} columnas)")
+
+    if write_parquet:
+        extra = [frames[tabla_id] for tabla_id in EXTRA_TABLES]
+        df_tables = pd.concat([df_raw, *extra], ignore_index=True)
+        tables_path = output_dir / "epa_tablas_raw.parquet"
+        save_parquet(df_tables, tables_path)
+        print(f"  -> {tables_path.name}  ({df_tables.shape[0]:,} filas, "
+              f"{len(frames)} tablas)")
+
+    # -- Dirty CSV -----------------------------------------------------------
+    if create_dirty:
+        print("\nGenerando CSV con suciedad intencional ...")
+        df_dirty = make_dirty(df_raw, compat=dirty_compat)
+        if write_csv:
+            dirty_path = output_dir / "epa_mercado_laboral_dirty.csv"
+            df_dirty.to_csv(dirty_path, index=False)
+            print(f"  -> {dirty_path.name}  ({df_dirty.shape[0]:,} filas)")
+        if write_parquet:
+            dirty_parquet = output_dir / "epa_mercado_laboral_dirty.parquet"
+            save_parquet(df_dirty, dirty_parquet, group_by=())
+            print(f"  -> {dirty_parquet.name}  ({df_dirty.shape[0]:,} filas)")
+        print("     ~10% comas decimales | ~3% nulls | 5 formatos de fecha "
+              "| ~5% MAYUSCULAS | 20 duplicados")
+
+
 def fetch_all(start_year: int, end_year: int, output_dir: Path,
-              create_dirty: bool = True) -> None:
-    """Download all EPA tables and produce raw + dirty CSVs."""
+              create_dirty: bool = True, fmt: str = "both",
+              max_workers: int = FETCH_WORKERS, rate: float = FETCH_RATE,
+              cache: ResponseCache | None = None,
+              incremental: bool = False, dirty_compat: bool = False) -> None:
+    """Download all EPA tables and produce raw + dirty CSVs and/or Parquet.
+
+    Tables are downloaded concurrently (*max_workers* in flight, at most
+    *rate* requests per second, see fetch_tables), through the response
+    *cache* when given.  With *incremental*, tables whose JSON is already in
+    *output_dir* only request the periods after the latest one stored
+    (*start_year* is then ignored for them) and the new points are merged
+    into it; the CSV/Parquet outputs are regenerated from the merged data.
+    *fmt* is ``"csv"``, ``"parquet"`` or ``"both"``.  The Parquet output adds
+    ``epa_tablas_raw.parquet`` with all six tables flattened and typed, so a
+    single table or year can be loaded without parsing the JSON.
+    *dirty_compat* selects the slower make_dirty of earlier versions.
+    """
+    from src.io import iter_json_series, write_json_series
+
+    all_tables = {**MAIN_TABLES, **EXTRA_TABLES}
+
+    # Stored JSON is the base of an incremental update
+    stored: set[int] = set()
+    since: dict[int, str] = {}
+    if incremental:
+        for tabla_id, meta in all_tables.items():
+            json_path = output_dir / f"{meta['name']}_raw.json"
+            if json_path.exists():
+                stored.add(tabla_id)
+                date = next_fetch_date(iter_json_series(json_path))
+                if date is not None:
+                    since[tabla_id] = date
+
     # Clean previous data files before downloading
     if output_dir.exists():
-        for ext in ("*.json", "*.csv"):
+        exts = ("*.csv", "*.parquet") if incremental else ("*.json", "*.csv", "*.parquet")
+        for ext in exts:
             for f in output_dir.glob(ext):
                 f.unlink()
         print(f"Limpiados datos anteriores en {output_dir}")
 
     output_dir.mkdir(parents=True, exist_ok=True)
-    all_tables = {**MAIN_TABLES, **EXTRA_TABLES}
 
     print("=" * 60)
     print(f"EPA Data Fetch: {start_year}–{end_year}")
@@ -244,45 +632,35 @@ def fetch_all(start_year: int, end_year: int, output_dir: Path,
     print("=" * 60)
 
     # -- Fetch & save JSON ---------------------------------------------------
-    json_data: dict[int, list[dict]] = {}
-    for tabla_id, meta in all_tables.items():
-        print(f"\n[{tabla_id}] Descargando: {meta['description']} ...")
-        data = fetch_table(tabla_id, start_year, end_year)
-        json_data[tabla_id] = data
-
+    print(f"\nDescargando {len(all_tables)} tablas "
+          f"({max_workers} en paralelo, {rate:g} peticiones/s) ...")
+    # Each table is flattened as soon as it arrives and its tree released
+    frames: dict[int, pd.DataFrame] = {}
+    for tabla_id, data in fetch_tables(all_tables, start_year, end_year,
+                                       max_workers=max_workers, rate=rate,
+                                       cache=cache, since=since):
+        meta = all_tables[tabla_id]
+        print(f"\n[{tabla_id}] {meta['description']}")
         json_path = output_dir / f"{meta['name']}_raw.json"
-        with open(json_path, "w", encoding="utf-8") as fh:
-            json.dump(data, fh, ensure_ascii=False, indent=2)
-
-        total_dp = sum(len(s.get("Data", [])) for s in data)
-        print(f"  -> {json_path.name}  ({len(data)} series, "
-              f"{total_dp} data points)")
-
-        time.sleep(1)  # API courtesy delay
-
-    # -- Flatten main tables into combined raw CSV ---------------------------
-    print("\nCombinando tablas principales en CSV ...")
-    frames = []
-    for tabla_id in MAIN_TABLES:
-        df_t = flatten_table_json(tabla_id, json_data[tabla_id])
-        frames.append(df_t)
-        print(f"  Tabla {tabla_id}: {len(df_t):,} filas")
-
-    df_raw = pd.concat(frames, ignore_index=True)
-    raw_path = output_dir / "epa_mercado_laboral_raw.csv"
-    df_raw.to_csv(raw_path, index=False)
-    print(f"  -> {raw_path.name}  ({df_raw.shape[0]:,} filas x "
-          f"{df_raw.shape[1]} columnas)")
-
-    # -- Dirty CSV -----------------------------------------------------------
-    if create_dirty:
-        print("\nGenerando CSV con suciedad intencional ...")
-        df_dirty = make_dirty(df_raw)
-        dirty_path = output_dir / "epa_mercado_laboral_dirty.csv"
-        df_dirty.to_csv(dirty_path, index=False)
-        print(f"  -> {dirty_path.name}  ({df_dirty.shape[0]:,} filas)")
-        print("     ~10% comas decimales | ~3% nulls | 5 formatos de fecha "
-              "| ~5% MAYUSCULAS | 20 duplicados")
+        if tabla_id in stored:
+            new_dp = sum(len(s.get("Data", [])) for s in data)
+            print(f"  Incremental desde {since.get(tabla_id)}: "
+                  f"{new_dp} data points nuevos")
+            tmp_path = json_path.with_suffix(".tmp")
+            n_series = write_json_series(
+                tmp_path, merge_series(iter_json_series(json_path), data))
+            tmp_path.replace(json_path)
+            data = iter_json_series(json_path)
+        else:
+            n_series = write_json_series(json_path, data)
+
+        frames[tabla_id] = flatten_table_json(tabla_id, data)
+        del data
+        print(f"  -> {json_path.name}  ({n_series} series, "
+              f"{len(frames[tabla_id])} data points)")
+
+    write_outputs(frames, output_dir, create_dirty=create_dirty, fmt=fmt,
+                  dirty_compat=dirty_compat)
 
     print(f"\n{'=' * 60}")
     print("Descarga completada.")
@@ -310,6 +688,27 @@ def parse_args() -> argparse.Namespace:
                    help="Generar CSV con suciedad (default: True)")
     p.add_argument("-o", "--output-dir", type=Path, default=None,
                    help="Directorio de salida (default: data/raw/)")
+    p.add_argument("--format", choices=("csv", "parquet", "both"),
+                   default="both",
+                   help="Formato de los ficheros tabulares (default: both)")
+    p.add_argument("-j", "--workers", type=int, default=FETCH_WORKERS,
+                   help=f"Descargas simultaneas (default: {FETCH_WORKERS})")
+    p.add_argument("--rate", type=float, default=FETCH_RATE,
+                   help=f"Peticiones por segundo a la API (default: {FETCH_RATE:g})")
+    p.add_argument("--http-cache", action=argparse.BooleanOptionalAction,
+                   default=True,
+                   help="Reutilizar respuestas de la API en data/http_cache (default: True)")
+    p.add_argument("--ttl", type=float, default=HTTP_CACHE_TTL / 3600,
+                   help=f"Horas antes de revalidar la cache HTTP "
+                        f"(default: {HTTP_CACHE_TTL / 3600:g})")
+    p.add_argument("--offline", action="store_true",
+                   help="Servir todas las tablas desde la cache HTTP, sin red")
+    p.add_argument("--incremental", action="store_true",
+                   help="Descargar solo los periodos posteriores a los JSON "
+                        "ya guardados y fusionarlos")
+    p.add_argument("--dirty-compat", action="store_true",
+                   help="CSV sucio identico byte a byte al de versiones "
+                        "anteriores (generacion fila a fila, mas lenta)")
     return p.parse_args()
 
 
@@ -327,4 +726,9 @@ if __name__ == "__main__":
     from src.config import DATA_RAW
     out_dir = args.output_dir or DATA_RAW
 
-    fetch_all(args.start, args.end, out_dir, create_dirty=args.dirty)
+    cache = (ResponseCache(ttl=args.ttl * 3600, offline=args.offline)
+             if args.http_cache or args.offline else None)
+    fetch_all(args.start, args.end, out_dir, create_dirty=args.dirty,
+              fmt=args.format, max_workers=args.workers, rate=args.rate,
+              cache=cache, incremental=args.incremental,
+              dirty_compat=args.dirty_compat)
@@ -1,12 +1,73 @@
 import argparse
+import os
+import sys
 from datetime import datetime
+from pathlib import Path
 
-from src.config import ROOT, DATA_RAW, DATA_PROCESSED, CHARTS_DIR, RAW_PATH, OUT_PATH
-from src.io import load_csv
-from src.cleaning import clean
-from src.features import build_features
-from src.utils import validate_clean
-from src.viz import generate_all_charts
+# Only the stdlib and src.config are imported up front, so --help and the
+# argument checks are instant; each stage imports pandas, matplotlib, etc.
+# when it runs (--no-charts never loads matplotlib).
+from src.config import (DATA_RAW, DATA_PROCESSED, CHARTS_DIR, RAW_PATH, OUT_PATH,
+                        RAW_PARQUET_PATH, OUT_PARQUET_PATH, HTTP_CACHE_TTL,
+                        STAR_SERIES_PATH, STAR_QUARTERS_PATH, STAR_FACTS_PATH,
+                        DENSE_PATH, DENSE_LABELS_PATH, AGG_QUARTERS_PATH, AGG_YEARS_PATH,
+                        AGG_QUARTERS_COVERAGE_PATH, AGG_YEARS_COVERAGE_PATH,
+                        PERIODS_DATA_DIR, PERIODS_CHARTS_DIR, SQLITE_PATH, PROFILE_DIR)
+from src.profiling import Profiler, stage
+
+
+def agg_paths():
+    """The rollup arrays of src/aggregates.py and their coverage shares."""
+    return (AGG_QUARTERS_PATH, AGG_YEARS_PATH, AGG_QUARTERS_COVERAGE_PATH,
+            AGG_YEARS_COVERAGE_PATH)
+
+
+def load_featured(raw_path, cache, keys):
+    """Load → clean → validate → features, reusing cached stage outputs."""
+    from src.cleaning import clean
+    from src.features import build_features
+    from src.io import load_data
+    from src.utils import validate_clean
+
+    df = cache.get_frame(keys["features"])
+    if df is not None:
+        print(f"Features: reutilizando cache ({df.shape})")
+        return df
+
+    df = cache.get_frame(keys["clean"])
+    if df is not None:
+        print(f"Limpieza: reutilizando cache ({df.shape})")
+    else:
+        print(f"Cargando datos desde {raw_path} ...")
+        with stage("load"):
+            df = load_data(raw_path)
+        print(f"  Shape raw: {df.shape}")
+
+        print("Limpiando datos ...")
+        with stage("clean"):
+            df = clean(df)
+        print(f"  Shape clean: {df.shape}")
+        cache.put_frame(keys["clean"], df)
+    with stage("validate"):
+        validate_clean(df)
+
+    print("Generando features ...")
+    with stage("features"):
+        df = build_features(df)
+    print(f"  Shape final: {df.shape}")
+    cache.put_frame(keys["features"], df)
+    return df
+
+
+def period_window(text):
+    """argparse type of a --periods window: 'INICIO-FIN' -> (start, end)."""
+    try:
+        start, end = (int(year) for year in text.split("-"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"periodo no valido: {text!r} (usa INICIO-FIN)")
+    if start > end:
+        raise argparse.ArgumentTypeError(f"periodo no valido: {text!r} (INICIO > FIN)")
+    return start, end
 
 
 def main():
@@ -18,44 +79,268 @@ def main():
                         help="Año de inicio (requiere --fetch)")
     parser.add_argument("-e", "--end", type=int, default=None,
                         help="Año de fin (requiere --fetch)")
+    parser.add_argument("--format", choices=("csv", "parquet", "both"), default="both",
+                        help="Formato de salida de los datos (default: both)")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Procesar el CSV en bloques de N filas (memoria acotada)")
+    parser.add_argument("--force", action="store_true",
+                        help="Recalcular todas las etapas ignorando la cache")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="No leer ni escribir la cache de etapas")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Con --fetch, descargar solo los trimestres nuevos")
+    parser.add_argument("--offline", action="store_true",
+                        help="Con --fetch, servir las tablas desde la cache HTTP sin red")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="Procesos para generar los graficos (default: nucleos de CPU)")
+    parser.add_argument("--sqlite", action="store_true",
+                        help="Guardar tambien los datos en SQLite con indices "
+                             "(data/processed/epa_mercado_laboral.sqlite), actualizando "
+                             "solo las filas nuevas o cambiadas")
+    parser.add_argument("--render", choices=("publication", "preview"), default="publication",
+                        help="Calidad de los graficos: publication (150 dpi, la del informe) "
+                             "o preview (rapida, para CI y pruebas) (default: publication)")
+    parser.add_argument("--chart-format", choices=("png", "webp", "svg", "pdf"), default="png",
+                        help="Formato de los graficos: png, webp (comprimido) o "
+                             "vectorial svg/pdf (default: png)")
+    parser.add_argument("--periods", nargs="+", type=period_window, default=None,
+                        metavar="INICIO-FIN",
+                        help="Ademas, datos y graficos de cada periodo (p. ej. 2002-2007 "
+                             "2008-2013) en data/processed/periodos/ y charts/periodos/, "
+                             "a partir de una sola limpieza del rango completo")
+    charts = parser.add_mutually_exclusive_group()
+    charts.add_argument("--no-charts", action="store_true",
+                        help="Solo datos: no generar graficos (no carga matplotlib)")
+    charts.add_argument("--only-charts", action="store_true",
+                        help="Solo graficos, a partir de los datos ya procesados")
+    parser.add_argument("--profile", nargs="?", type=Path, const=True, default=None,
+                        metavar="JSON",
+                        help="Guardar tiempos y memoria por etapa en un informe JSON "
+                             "(default: data/profiles/profile_<fecha>.json)")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="Con --profile, medir tambien la memoria asignada por etapa "
+                             "(tracemalloc; ralentiza la ejecucion)")
+    parser.add_argument("--cprofile", action="store_true",
+                        help="Con --profile, volcar cProfile de la etapa mas lenta (.prof)")
     args = parser.parse_args()
+    if args.only_charts and (args.fetch or args.chunksize or args.sqlite):
+        parser.error("--only-charts no admite --fetch, --chunksize ni --sqlite")
 
-    # Clean previous outputs before starting
-    for d in (DATA_PROCESSED, CHARTS_DIR):
-        if d.exists():
-            for f in d.iterdir():
-                if f.is_file():
-                    f.unlink()
-    print("Limpiados datos procesados y graficos anteriores.")
+    if not args.profile:
+        run(args)
+        return
+    profiler = Profiler(memory=args.profile_memory, cprofile=args.cprofile)
+    with profiler.activate():
+        run(args)
+    path = args.profile if args.profile is not True else (
+        PROFILE_DIR / f"profile_{datetime.now():%Y%m%d_%H%M%S}.json")
+    profiler.write(path, argv=sys.argv[1:])
+    print(f"Perfil guardado en {path}")
 
-    if args.fetch:
-        from fetch_data import fetch_all
-        start = args.start or (datetime.now().year - 5)
-        end = args.end or datetime.now().year
-        fetch_all(start, end, DATA_RAW)
-        print()
 
-    print(f"Cargando datos desde {RAW_PATH} ...")
-    df = load_csv(RAW_PATH)
-    print(f"  Shape raw: {df.shape}")
+def stage_keys(raw_path, fmt):
+    """Cache keys of the data stages: input content hash + code version,
+    chained stage to stage."""
+    from src import aggregates, cleaning, dense, features, schema, star
+    from src import io as src_io
+    from src.cache import code_digest, file_digest, stage_key
 
-    print("Limpiando datos ...")
-    df = clean(df)
-    print(f"  Shape clean: {df.shape}")
-    validate_clean(df)
+    keys = {"clean": stage_key("clean", file_digest(raw_path),
+                               code_digest(cleaning, schema))}
+    keys["features"] = stage_key("features", keys["clean"], code_digest(features, schema))
+    keys["export"] = stage_key("export", keys["features"], fmt,
+                               code_digest(src_io, star, dense, aggregates))
+    return keys
 
-    print("Generando features ...")
-    df = build_features(df)
-    print(f"  Shape final: {df.shape}")
 
+def process(args, raw_path, cache, keys):
+    """Clean + features + export to data/processed/; return the features
+    DataFrame when it was computed in memory (None otherwise)."""
+    from src import dense
+    from src.aggregates import rollup, save_aggregates
+    from src.io import save_parquet
+    from src.star import StarBuilder, save_star, write_star
+
+    def save_cubes(build):
+        with stage("dense"):
+            cube = build()
+            dense.save_dense(cube, DENSE_PATH)
+        with stage("aggregates"):
+            save_aggregates(rollup(cube), DATA_PROCESSED)
+
+    out_parquet = OUT_PARQUET_PATH if args.format in ("parquet", "both") else None
+    out_csv = OUT_PATH if args.format in ("csv", "both") else None
+    # The Parquet output also gets the star-schema files (src/star.py), the
+    # dense cube (src/dense.py) and its CCAA/national rollups (src/aggregates.py)
+    derived = [STAR_SERIES_PATH, STAR_QUARTERS_PATH, STAR_FACTS_PATH,
+               DENSE_PATH, DENSE_LABELS_PATH,
+               *(p for agg in agg_paths() for p in (agg, agg.with_suffix(".json")))]
+    outputs = [p for p in (out_parquet, out_csv) if p] + (derived if out_parquet else [])
     OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(OUT_PATH, index=False)
-    print(f"Guardado en {OUT_PATH}")
 
+    df = None
+    if cache.restore_files(keys["export"], DATA_PROCESSED):
+        print("Datos procesados: reutilizando cache")
+    elif args.chunksize:
+        from src.streaming import run_streaming
+        print(f"Procesando {raw_path} en bloques de {args.chunksize:,} filas ...")
+        # The star schema and the cube are collected chunk by chunk, not read back
+        star, cube = (StarBuilder(), dense.DenseBuilder()) if out_parquet else (None, None)
+        with stage("streaming"):
+            rows = run_streaming(raw_path, args.chunksize, out_csv, out_parquet,
+                                 sinks=[star, cube] if out_parquet else [])
+        print(f"  Filas finales: {rows:,}")
+        if out_parquet:
+            with stage("star"):
+                write_star(star.build(), DATA_PROCESSED)
+            save_cubes(cube.build)
+        cache.put_files(keys["export"], outputs)
+    else:
+        df = load_featured(raw_path, cache, keys)
+        with stage("export"):
+            if out_parquet:
+                save_parquet(df, out_parquet)
+            if out_csv:
+                df.to_csv(out_csv, index=False)
+        if out_parquet:
+            with stage("star"):
+                save_star(df, DATA_PROCESSED)
+            save_cubes(lambda: dense.build_dense(df))
+        cache.put_files(keys["export"], outputs)
+    for path in outputs:
+        print(f"Guardado en {path}")
+
+    # The SQLite store is updated in place, so it is not part of the cached
+    # outputs; its source tag tells whether it already holds these features
+    if args.sqlite:
+        from src.io import load_processed, save_sqlite, sqlite_source
+        if not args.force and sqlite_source(SQLITE_PATH) == keys["features"]:
+            print(f"SQLite: {SQLITE_PATH} ya esta al dia")
+        else:
+            if df is None:
+                df = load_processed(outputs[0])
+            with stage("sqlite"):
+                changed = save_sqlite(df, SQLITE_PATH, source=keys["features"],
+                                      rebuild=args.force)
+            print(f"Guardado en {SQLITE_PATH} ({changed:,} filas nuevas o cambiadas)")
+    return df
+
+
+def processed_frame(cache, keys):
+    """The features DataFrame from the cache or else data/processed/."""
+    from src.io import load_processed
+
+    df = cache.get_frame(keys["features"])
+    if df is None:
+        df = load_processed(OUT_PARQUET_PATH if OUT_PARQUET_PATH.exists() else OUT_PATH)
+    return df
+
+
+def render_charts(args, cache, keys, df=None):
+    """Generate the charts into charts/ from *df* or the processed data."""
+    from src import aggregates, dense, query, viz
+    from src.cache import code_digest, file_digest, stage_key
+
+    key = stage_key("charts", keys["features"], code_digest(viz, query, dense, aggregates),
+                    args.render, args.chart_format,
+                    *(file_digest(p) for p in viz.chart_inputs(DATA_RAW)))
     print("\nGenerando graficos ...")
-    generate_all_charts(df, DATA_RAW, CHARTS_DIR)
+    if cache.restore_files(key, CHARTS_DIR):
+        print("  Reutilizando graficos de la cache")
+    else:
+        if df is None:
+            df = processed_frame(cache, keys)
+        # The memory-mapped cube and rollups, when written, save rebuilding
+        # them from df
+        cube = dense.load_dense(DENSE_PATH) if DENSE_PATH.exists() else None
+        aggs = (aggregates.load_aggregates(DATA_PROCESSED)
+                if all(path.exists() for path in agg_paths()) else None)
+        with stage("charts"):
+            failed = viz.generate_all_charts(df, DATA_RAW, CHARTS_DIR, workers=args.workers,
+                                             dense=cube, aggregates=aggs,
+                                             reuse=not args.force, render=args.render,
+                                             fmt=args.chart_format)
+        if not failed:
+            cache.put_files(key, [*sorted(CHARTS_DIR.glob(f"*.{args.chart_format}")),
+                                  CHARTS_DIR / viz.MANIFEST])
     print("Graficos guardados en charts/")
 
 
+def render_periods(args, cache, keys, df=None):
+    """Processed slice and charts of every --periods window, all from the
+    full-range features (cleaned once)."""
+    from src.periods import run_periods, window_name
+
+    if df is None:
+        df = processed_frame(cache, keys)
+    chart_opts = {} if args.no_charts else dict(render=args.render, fmt=args.chart_format,
+                                                reuse=not args.force)
+    print(f"\nGenerando {len(args.periods)} periodos ...")
+    with stage("periods"):
+        results = run_periods(df, args.periods, PERIODS_DATA_DIR,
+                              None if args.no_charts else PERIODS_CHARTS_DIR, DATA_RAW,
+                              data_format=None if args.only_charts else args.format,
+                              workers=args.workers, **chart_opts)
+    for window, (rows, failed) in results.items():
+        print(f"  {window_name(window)}: {rows:,} filas"
+              + (f", graficos fallidos: {', '.join(failed)}" if failed else ""))
+    print("Periodos guardados en " + " y ".join(
+        str(d) for d, skip in ((PERIODS_DATA_DIR, args.only_charts),
+                               (PERIODS_CHARTS_DIR, args.no_charts)) if not skip))
+
+
+def run(args):
+    """Run the pipeline for the parsed command-line *args*."""
+    from src.cache import StageCache
+
+    if args.only_charts and not (OUT_PARQUET_PATH.exists() or OUT_PATH.exists()):
+        print("Error: no hay datos procesados en data/processed/; "
+              "ejecuta antes main.py sin --only-charts")
+        sys.exit(1)
+
+    # Clean previous processed outputs unless only charts are drawn (the
+    # SQLite store is kept: reruns upsert into it).  charts/ is not wiped:
+    # generate_all_charts keeps the charts whose inputs did not change.
+    if not args.only_charts:
+        if DATA_PROCESSED.exists():
+            for f in DATA_PROCESSED.iterdir():
+                if f.is_file() and f != SQLITE_PATH:
+                    f.unlink()
+        print("Limpiados datos procesados anteriores.")
+
+    if args.fetch:
+        from fetch_data import ResponseCache, fetch_all
+        start = args.start or (datetime.now().year - 5)
+        end = args.end or datetime.now().year
+        http_cache = None
+        if not args.no_cache or args.offline:
+            # --force revalidates every table with the API
+            http_cache = ResponseCache(ttl=0 if args.force else HTTP_CACHE_TTL,
+                                       offline=args.offline)
+        with stage("fetch"):
+            fetch_all(start, end, DATA_RAW, fmt=args.format, cache=http_cache,
+                      incremental=args.incremental)
+        print()
+
+    raw_path = RAW_PARQUET_PATH if RAW_PARQUET_PATH.exists() else RAW_PATH
+    cache = StageCache(enabled=not args.no_cache, force=args.force)
+    if args.only_charts:
+        # Only data/processed/ is read (the raw file may be gone): the
+        # charts are keyed off the processed output instead
+        from src.cache import file_digest, stage_key
+        processed = OUT_PARQUET_PATH if OUT_PARQUET_PATH.exists() else OUT_PATH
+        keys = {"features": stage_key("processed", file_digest(processed))}
+    else:
+        keys = stage_keys(raw_path, args.format)
+
+    df = None
+    if not args.only_charts:
+        df = process(args, raw_path, cache, keys)
+    if not args.no_charts:
+        render_charts(args, cache, keys, df)
+    if args.periods:
+        render_periods(args, cache, keys, df)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,147 @@
+"""Materialized CCAA and national rollups of the EPA indicators.
+
+Province values of the dense cube (src/dense.py) are rolled up to their
+comunidad autonoma (features.CCAA_MAP) and to the national total, per
+quarter and per year, for every indicador and sexo, in one pass of matrix
+products, so aggregated views never scan the fact rows again.
+
+Levels (thousands of persons) are summed over provinces, and a year is
+the mean of its quarters (EPA levels are stocks, not flows); a level is
+NaN when any member province or quarter is missing, never the total of
+the members that happen to be there.  Rates (``tasa_*``) are averaged over
+the members that report one, weighted by their base level (RATE_BASE:
+activos for the unemployment rate, the 16+ population for the others),
+a missing base being filled with the member's mean base over all
+quarters.  Every aggregate comes with a ``cobertura_*`` array: the share
+of the group's members (provinces, or quarters for a year) that entered
+each value, so consumers can mask thin groups.  The national rollup is
+computed from the provinces; INE's own national series stay in the cube
+as provincia 'Total Nacional'.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import (AGG_QUARTERS_COVERAGE_PATH, AGG_QUARTERS_PATH,
+                        AGG_YEARS_COVERAGE_PATH, AGG_YEARS_PATH)
+from src.dense import LabelledArray, load_dense, save_dense
+from src.features import CCAA_MAP
+
+
+NACIONAL = 'Total Nacional'
+
+# The level each rate is a share of (``total`` is the 16+ population)
+RATE_BASE = {'tasa_paro': 'activos', 'tasa_actividad': 'total', 'tasa_empleo': 'total'}
+
+FILES = {'trimestre': AGG_QUARTERS_PATH.name, 'anyo': AGG_YEARS_PATH.name,
+         'cobertura_trimestre': AGG_QUARTERS_COVERAGE_PATH.name,
+         'cobertura_anyo': AGG_YEARS_COVERAGE_PATH.name}
+
+
+def is_rate(indicador: str) -> bool:
+    return indicador.startswith('tasa_')
+
+
+def _membership(members: pd.Index, groups: pd.Series) -> tuple[pd.Index, np.ndarray]:
+    """Group labels and the (group × member) 0/1 matrix of *groups*."""
+    labels = pd.Index(sorted(groups.dropna().unique()))
+    matrix = (labels.to_numpy()[:, None] == groups.reindex(members).to_numpy()[None, :])
+    return labels, matrix.astype('float64')
+
+
+def _group_sum(values: np.ndarray, matrix: np.ndarray, axis: int) -> np.ndarray:
+    """Sum *values* (NaN-free) over the groups of *matrix* along *axis*."""
+    return np.moveaxis(np.tensordot(matrix, values, axes=([1], [axis])), 0, axis)
+
+
+def _shares(used: np.ndarray, matrix: np.ndarray, axis: int) -> np.ndarray:
+    """Share of each group's members that are *used*."""
+    sizes = matrix.sum(axis=1).reshape([-1 if i == axis else 1 for i in range(used.ndim)])
+    return _group_sum(used.astype('float64'), matrix, axis) / sizes
+
+
+def _weights(values: np.ndarray, indicadores: pd.Index) -> np.ndarray:
+    """Weight of every cell (axis 0 = indicador, axis 3 = periodo): the base
+    level for a rate, a missing one filled with its mean over all periods
+    (NaN if the cube lacks the base), 1 for a level."""
+    weights = np.ones_like(values)
+    for i, indicador in enumerate(indicadores):
+        if not is_rate(indicador):
+            continue
+        base = RATE_BASE.get(indicador)
+        if base not in indicadores:
+            weights[i] = np.nan
+            continue
+        level = values[indicadores.get_loc(base)]
+        present = ~np.isnan(level)
+        counts = present.sum(axis=-1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(present, level, 0).sum(axis=-1, keepdims=True) / counts
+        weights[i] = np.where(present, level, mean)
+    return weights
+
+
+def _reduce(values: np.ndarray, rates: np.ndarray, indicadores: pd.Index,
+            matrix: np.ndarray, axis: int, mean: bool) -> tuple[np.ndarray, np.ndarray]:
+    """Roll *values* up over the groups of *matrix* along *axis*: levels
+    summed (or, with *mean*, averaged), NaN unless every member is present;
+    rates (where *rates*) weighted by their base over the members that have
+    both.  Returns (aggregate, coverage share)."""
+    weights = _weights(values, indicadores)
+    used = ~np.isnan(values) & ~np.isnan(weights)
+    total = _group_sum(np.where(used, values * weights, 0), matrix, axis)
+    weight = _group_sum(np.where(used, weights, 0), matrix, axis)
+    coverage = _shares(used, matrix, axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = np.where(weight > 0, total / weight, np.nan)
+        level = np.where(coverage == 1, total / (weight if mean else 1), np.nan)
+    return np.where(rates, rate, level), coverage
+
+
+def rollup(cube: LabelledArray) -> dict[str, LabelledArray]:
+    """CCAA + national aggregates of *cube* per 'trimestre' and per 'anyo'.
+
+    Each is an indicador × ambito × sexo × periodo array, ``ambito`` being
+    the CCAA names plus NACIONAL; 'cobertura_trimestre' and
+    'cobertura_anyo' hold the share of members behind each value.
+    """
+    provincias = cube.coords['provincia']
+    ccaa = pd.Series({p: CCAA_MAP.get(p) for p in provincias if p != NACIONAL}, dtype=object)
+    ccaa = ccaa.reindex(provincias)
+    labels, matrix = _membership(provincias, ccaa)
+    # The national row sums every province that belongs to a CCAA
+    ambitos = labels.append(pd.Index([NACIONAL])).rename('ambito')
+    matrix = np.vstack([matrix, matrix.sum(axis=0, keepdims=True)])
+
+    indicadores = cube.coords['indicador']
+    rates = np.array([is_rate(i) for i in indicadores])[:, None, None, None]
+    values = np.asarray(cube.values, dtype='float64')
+    quarters, quarters_coverage = _reduce(values, rates, indicadores, matrix, 1, mean=False)
+
+    trimestres = cube.coords['trimestre']
+    anyos, by_year = _membership(trimestres, pd.Series(trimestres.str[:4], index=trimestres))
+    years, years_coverage = _reduce(quarters, rates, indicadores, by_year, 3, mean=True)
+
+    coords = {'indicador': cube.coords['indicador'], 'ambito': ambitos,
+              'sexo': cube.coords['sexo']}
+    quarter_coords = {**coords, 'trimestre': trimestres}
+    year_coords = {**coords, 'anyo': anyos.rename('anyo')}
+    return {
+        'trimestre': LabelledArray(quarters, quarter_coords),
+        'anyo': LabelledArray(years, year_coords),
+        'cobertura_trimestre': LabelledArray(quarters_coverage.astype('float32'), quarter_coords),
+        'cobertura_anyo': LabelledArray(years_coverage.astype('float32'), year_coords),
+    }
+
+
+def save_aggregates(aggregates: dict[str, LabelledArray], out_dir: str | Path) -> list[Path]:
+    """Write each aggregate array (and its label sidecar) to *out_dir*."""
+    return [path for freq, agg in aggregates.items()
+            for path in save_dense(agg, Path(out_dir) / FILES[freq])]
+
+
+def load_aggregates(out_dir: str | Path) -> dict[str, LabelledArray]:
+    """Memory-map the aggregates saved in *out_dir*."""
+    return {freq: load_dense(Path(out_dir) / name) for freq, name in FILES.items()}
@@ -0,0 +1,121 @@
+"""Content-addressed cache of pipeline stage outputs.
+
+Each stage output is stored under a key derived from the content hash of
+its inputs plus the source of the code that produces it, so a rerun with
+unchanged data and code reuses the cached artifact instead of recomputing
+it.  The cache is bounded in size and evicts least-recently-used entries.
+"""
+
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from src.config import CACHE_DIR, CACHE_MAX_BYTES
+from src.io import load_parquet, save_parquet
+
+
+def file_digest(path: str | Path) -> str:
+    """SHA-256 of a file's content."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def code_digest(*modules) -> str:
+    """SHA-256 of the source files of *modules* (the code version of a stage)."""
+    h = hashlib.sha256()
+    for module in modules:
+        h.update(Path(module.__file__).read_bytes())
+    return h.hexdigest()
+
+
+def stage_key(stage: str, *parts) -> str:
+    """Cache key for *stage* given the digests/parameters it depends on."""
+    h = hashlib.sha256(stage.encode())
+    for part in parts:
+        h.update(b'\0' + str(part).encode())
+    return f'{stage}-{h.hexdigest()[:32]}'
+
+
+class StageCache:
+    """On-disk stage cache: one directory per key, LRU eviction by total size.
+
+    ``enabled=False`` turns every lookup into a miss and skips writes;
+    ``force=True`` ignores existing entries but still refreshes them.
+    """
+
+    FRAME = 'frame.parquet'
+
+    def __init__(self, root: str | Path = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES,
+                 enabled: bool = True, force: bool = False):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.force = force
+
+    def _entry(self, key: str) -> Path | None:
+        if not self.enabled or self.force:
+            return None
+        entry = self.root / key
+        if not entry.is_dir():
+            return None
+        os.utime(entry)  # mark as recently used
+        return entry
+
+    def _store(self, key: str, files: dict[str, Path] | None = None,
+               frame: pd.DataFrame | None = None) -> None:
+        if not self.enabled:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f'.{key}.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        if frame is not None:
+            save_parquet(frame, tmp / self.FRAME, group_by=())
+        for name, src in (files or {}).items():
+            shutil.copy2(src, tmp / name)
+        entry = self.root / key
+        shutil.rmtree(entry, ignore_errors=True)
+        tmp.rename(entry)
+        self.evict()
+
+    def get_frame(self, key: str) -> pd.DataFrame | None:
+        """Return the cached DataFrame for *key*, or None on a miss."""
+        entry = self._entry(key)
+        if entry is None or not (entry / self.FRAME).exists():
+            return None
+        return load_parquet(entry / self.FRAME)
+
+    def put_frame(self, key: str, df: pd.DataFrame) -> None:
+        self._store(key, frame=df)
+
+    def restore_files(self, key: str, dest: str | Path) -> list[Path] | None:
+        """Copy the files cached under *key* into *dest*; None on a miss."""
+        entry = self._entry(key)
+        if entry is None:
+            return None
+        dest = Path(dest)
+        dest.mkdir(parents=True, exist_ok=True)
+        return [Path(shutil.copy2(f, dest / f.name)) for f in sorted(entry.iterdir())]
+
+    def put_files(self, key: str, paths: list[Path]) -> None:
+        self._store(key, files={Path(p).name: Path(p) for p in paths})
+
+    def evict(self) -> None:
+        """Remove least-recently-used entries until the cache fits max_bytes."""
+        entries = []
+        for entry in self.root.iterdir():
+            if entry.is_dir() and not entry.name.startswith('.'):
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
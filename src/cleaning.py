@@ -1,5 +1,10 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from functools import lru_cache
+
+from src.profiling import stage
+from src.schema import CLEAN_SCHEMA, apply_schema
 
 
 # Province canonical names (fixes for UPPERCASED variants)
@@ -26,13 +31,18 @@ PROVINCIA_FIXES = {
     'zamora': 'Zamora', 'zaragoza': 'Zaragoza', 'ávila': 'Ávila',
 }
 
+# Composite key identifying one data point
+DEDUP_KEYS = ['tabla', 'serie_cod', 'anyo', 'periodo_id']
+
 SEXO_CANONICAL = {'ambos sexos': 'Ambos sexos', 'hombres': 'Hombres', 'mujeres': 'Mujeres'}
 
 
+@lru_cache(maxsize=None)
 def canon_prov(s: str) -> str:
     return PROVINCIA_FIXES.get(s.lower().strip(), s.strip().title())
 
 
+@lru_cache(maxsize=None)
 def canon_sexo(s: str) -> str:
     return SEXO_CANONICAL.get(s.lower().strip(), s.strip().title())
 
@@ -60,6 +70,54 @@ def parse_fecha(val) -> pd.Timestamp | None:
         return None
 
 
+# Date shapes recognised by parse_fechas, in parse_fecha's strptime order
+DATE_SHAPES = [
+    (r'\d{4}-\d{1,2}-\d{1,2}', '%Y-%m-%d'),
+    (r'\d{1,2}/\d{1,2}/\d{4}', '%d/%m/%Y'),
+    (r'\d{4}/\d{1,2}/\d{1,2}', '%Y/%m/%d'),
+    (r'[A-Za-z]{3} \d{1,2}, \d{4}', '%b %d, %Y'),
+]
+
+
+def parse_fechas(values: pd.Series) -> pd.Series:
+    """Vectorized parse_fecha for a whole column.
+
+    Each distinct raw value is parsed once.  Values are classified by shape
+    (ms epoch, ISO, dd/mm/yyyy, yyyy/mm/dd, textual) and every class is
+    converted with a single pd.to_datetime call; only values that match no
+    shape, or fail their shape's format, go through parse_fecha.
+    """
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+    raw = pd.Series(uniques, dtype=object)
+    text = raw.astype(str).str.strip()
+
+    parsed = pd.Series(pd.NaT, index=raw.index, dtype='datetime64[ns]')
+    pending = ~raw.eq('<NA>')
+
+    is_ms = text.str.isdigit() & text.str.len().between(11, 18)
+    if is_ms.any():
+        parsed[is_ms] = pd.to_datetime(text[is_ms].astype('int64'), unit='ms')
+        pending &= ~is_ms
+
+    for pattern, fmt in DATE_SHAPES:
+        shape = pending & text.str.fullmatch(pattern)
+        if not shape.any():
+            continue
+        converted = pd.to_datetime(text[shape], format=fmt, errors='coerce')
+        ok = converted.notna()
+        parsed[ok[ok].index] = converted[ok]
+        pending[ok[ok].index] = False
+
+    if pending.any():
+        fallback = [parse_fecha(v) for v in raw[pending]]
+        parsed[pending] = pd.to_datetime(pd.Series(fallback, index=raw[pending].index))
+
+    result = parsed.to_numpy()[codes]
+    result[codes == -1] = np.datetime64('NaT')
+    return pd.Series(result, index=values.index, name=values.name)
+
+
 def _parse_serie_65345(nombre_lower: str) -> dict:
     parts = [p.strip() for p in nombre_lower.split('. ') if p.strip()]
     if parts[0] == 'total nacional':
@@ -97,8 +155,34 @@ def _parse_serie_65354(nombre_lower: str) -> dict:
     return {'provincia': provincia, 'sexo': 'Ambos sexos', 'actividad': f'Ocupados - {sector}'}
 
 
+SERIE_PARSERS = {65345: _parse_serie_65345, 65349: _parse_serie_65349, 65354: _parse_serie_65354}
+
+SERIES_ATTRS = ['provincia', 'sexo', 'actividad']
+
+
+def _parse_serie(tabla_id, nombre_lower) -> dict:
+    parser = SERIE_PARSERS.get(tabla_id)
+    if parser is None:
+        return {'provincia': 'Desconocida', 'sexo': 'Desconocido', 'actividad': 'Desconocida'}
+    try:
+        return parser(nombre_lower)
+    except Exception:
+        return {'provincia': 'Error', 'sexo': 'Error', 'actividad': 'Error'}
+
+
+def parse_series(df: pd.DataFrame) -> pd.DataFrame:
+    """Series dimension: parse each distinct (tabla, serie_nombre_lower) pair once.
+
+    Returns one row per distinct pair with the parsed provincia, sexo and
+    actividad, ready to be merged back onto the fact rows.
+    """
+    dim = df[['tabla', 'serie_nombre_lower']].drop_duplicates().reset_index(drop=True)
+    records = [_parse_serie(t, n) for t, n in zip(dim['tabla'], dim['serie_nombre_lower'])]
+    return pd.concat([dim, pd.DataFrame(records, columns=SERIES_ATTRS)], axis=1)
+
+
 def clean(df: pd.DataFrame) -> pd.DataFrame:
-    """Full cleaning pipeline: column names, types, parsing, dedup."""
+    """Full cleaning pipeline: column names, types, parsing, dedup, compact dtypes."""
     out = df.copy()
 
     # 1) Column names
@@ -109,31 +193,23 @@ def clean(df: pd.DataFrame) -> pd.DataFrame:
         out = out.rename(columns={'fecha_ms': 'fecha'})
 
     # 2) Numeric: valor
-    out['valor'] = out['valor'].astype('string').str.replace(',', '.', regex=False)
-    out['valor'] = pd.to_numeric(out['valor'], errors='coerce')
+    with stage('valor'):
+        out['valor'] = out['valor'].astype('string').str.replace(',', '.', regex=False)
+        out['valor'] = pd.to_numeric(out['valor'], errors='coerce')
 
     # 3) serie_nombre: strip, lowercase helper
-    out['serie_nombre'] = out['serie_nombre'].astype('string').str.strip()
-    out['serie_nombre_lower'] = out['serie_nombre'].str.lower()
-
-    # 4) Parse serie_nombre into provincia, sexo, actividad
-    parsers = {65345: _parse_serie_65345, 65349: _parse_serie_65349, 65354: _parse_serie_65354}
-    records = []
-    for _, row in out.iterrows():
-        tabla_id: int = row['tabla']  # type: ignore[assignment]
-        nombre: str = row['serie_nombre_lower']  # type: ignore[assignment]
-        parser = parsers.get(tabla_id)
-        try:
-            parsed = parser(nombre) if parser else {
-                'provincia': 'Desconocida', 'sexo': 'Desconocido', 'actividad': 'Desconocida'}
-        except Exception:
-            parsed = {'provincia': 'Error', 'sexo': 'Error', 'actividad': 'Error'}
-        records.append(parsed)
-    out = pd.concat([out, pd.DataFrame(records)], axis=1)
-
-    # 5) Dates — list comprehension + pd.to_datetime ensures datetime64[ns] dtype
-    parsed = [parse_fecha(x) for x in out['fecha']]
-    out['fecha'] = pd.to_datetime(pd.Series(parsed))
+    # 4) Parse serie_nombre into provincia, sexo, actividad (once per distinct series)
+    with stage('parse_names'):
+        out['serie_nombre'] = out['serie_nombre'].astype('string').str.strip()
+        out['serie_nombre_lower'] = out['serie_nombre'].str.lower()
+        keys = ['tabla', 'serie_nombre_lower']
+        dim = parse_series(out[keys])
+        parsed = out[keys].merge(dim, on=keys, how='left').set_axis(out.index)
+        out = pd.concat([out, parsed[SERIES_ATTRS]], axis=1)
+
+    # 5) Dates — bulk multi-format parse, one conversion per date shape
+    with stage('parse_dates'):
+        out['fecha'] = parse_fechas(out['fecha'])
 
     # 6) Normalize sexo
     out['sexo'] = out['sexo'].str.strip().replace(SEXO_CANONICAL)
@@ -141,9 +217,12 @@ def clean(df: pd.DataFrame) -> pd.DataFrame:
     out['actividad'] = out['actividad'].str.strip()
 
     # 7) Dedup
-    out = out.drop_duplicates(subset=['tabla', 'serie_cod', 'anyo', 'periodo_id'])
+    with stage('dedup'):
+        out = out.drop_duplicates(subset=DEDUP_KEYS)
 
     # 8) Drop helper columns
     out = out.drop(columns=['serie_nombre_lower', 'secreto'], errors='ignore')
 
-    return out
+    # 9) Compact dtypes
+    with stage('schema'):
+        return apply_schema(out, CLEAN_SCHEMA)
@@ -10,3 +10,51 @@ CHARTS_DIR = ROOT / "charts"
 
 RAW_PATH = DATA_RAW / "epa_mercado_laboral_dirty.csv"
 OUT_PATH = DATA_PROCESSED / "epa_mercado_laboral_clean.csv"
+
+# Columnar (Parquet) copies: typed, compressed, prunable by tabla/anyo
+RAW_PARQUET_PATH = DATA_RAW / "epa_mercado_laboral_dirty.parquet"
+RAW_TABLES_PATH = DATA_RAW / "epa_tablas_raw.parquet"
+OUT_PARQUET_PATH = DATA_PROCESSED / "epa_mercado_laboral_clean.parquet"
+
+# Star schema (src/star.py): series and quarter dimensions + narrow facts
+STAR_SERIES_PATH = DATA_PROCESSED / "epa_dim_series.parquet"
+STAR_QUARTERS_PATH = DATA_PROCESSED / "epa_dim_trimestres.parquet"
+STAR_FACTS_PATH = DATA_PROCESSED / "epa_hechos.parquet"
+
+# Dense float32 cube indicador × provincia × sexo × trimestre (src/dense.py),
+# memory-mapped on load, and its JSON label sidecar
+DENSE_PATH = DATA_PROCESSED / "epa_cubo.npy"
+DENSE_LABELS_PATH = DENSE_PATH.with_suffix(".json")
+
+# CCAA + national rollups of the cube (src/aggregates.py), per quarter and
+# per year, each with its JSON label sidecar
+AGG_QUARTERS_PATH = DATA_PROCESSED / "epa_agregados_trimestre.npy"
+AGG_YEARS_PATH = DATA_PROCESSED / "epa_agregados_anyo.npy"
+# Share of the provinces (or quarters) behind each aggregated value
+AGG_QUARTERS_COVERAGE_PATH = DATA_PROCESSED / "epa_agregados_trimestre_cobertura.npy"
+AGG_YEARS_COVERAGE_PATH = DATA_PROCESSED / "epa_agregados_anyo_cobertura.npy"
+
+# Per-window outputs of main.py --periods, one <start>_<end> subdirectory each
+PERIODS_DATA_DIR = DATA_PROCESSED / "periodos"
+PERIODS_CHARTS_DIR = CHARTS_DIR / "periodos"
+
+# Indexed SQLite copy of the featured dataset (main.py --sqlite, src/io.py),
+# upserted on reruns
+SQLITE_PATH = DATA_PROCESSED / "epa_mercado_laboral.sqlite"
+
+# Stage cache (content-addressed, LRU-evicted beyond CACHE_MAX_BYTES)
+CACHE_DIR = ROOT / "data" / "cache"
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# INE API response cache (fetch_data.ResponseCache): reused without any
+# request for HTTP_CACHE_TTL seconds, then revalidated
+HTTP_CACHE_DIR = ROOT / "data" / "http_cache"
+HTTP_CACHE_TTL = 24 * 3600
+
+# Synthetic INE datasets (synthetic_data.py), one directory per scale, and
+# the benchmark history appended by benchmark.py
+SYNTHETIC_DIR = ROOT / "data" / "synthetic"
+BENCH_RESULTS_PATH = ROOT / "data" / "bench" / "results.jsonl"
+
+# Reports written by main.py --profile (src/profiling.py), one per run
+PROFILE_DIR = ROOT / "data" / "profiles"
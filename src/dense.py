@@ -0,0 +1,193 @@
+"""Dense, memory-mapped indicator cube of the featured EPA dataset.
+
+``valor`` is stored as a float32 array indicador × provincia × sexo ×
+trimestre (NaN where there is no data) in a ``.npy`` file, with the labels
+of each axis in a small JSON sidecar.  ``load_dense`` memory-maps the file
+instead of reading it, so opening is instant and only the pages of the
+slices actually used are read; ``sel`` with single labels or label ranges
+returns views of the mapping, never copies.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.query import indicador_code
+
+
+DIMS = ('indicador', 'provincia', 'sexo', 'trimestre')
+
+
+class LabelledArray:
+    """A numpy array with one label index per axis (see ``sel``).
+
+    ``attrs`` carries extra labels, e.g. ``attrs['ccaa']`` maps every
+    provincia to its comunidad autonoma.
+    """
+
+    def __init__(self, values: np.ndarray, coords: dict[str, pd.Index],
+                 attrs: dict | None = None):
+        if values.shape != tuple(len(labels) for labels in coords.values()):
+            raise ValueError(f'Shape {values.shape} does not match the labels')
+        self.values = values
+        self.coords = coords
+        self.attrs = attrs or {}
+
+    @property
+    def dims(self) -> tuple[str, ...]:
+        return tuple(self.coords)
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self.values.shape
+
+    def __repr__(self) -> str:
+        axes = ', '.join(f'{dim}: {len(labels)}' for dim, labels in self.coords.items())
+        return f'<LabelledArray {self.values.dtype} ({axes})>'
+
+    def sel(self, **where) -> 'LabelledArray':
+        """Select along dimensions by label.
+
+        A single label drops its dimension, a ``(first, last)`` tuple keeps
+        the inclusive range and a list picks those labels in that order.
+        Labels and ranges give views (no copy); lists copy the selection.
+        """
+        for dim in where:
+            if dim not in self.coords:
+                raise KeyError(f'Unknown dimension: {dim}')
+        index, coords = [], {}
+        for dim, labels in self.coords.items():
+            if dim not in where:
+                index.append(slice(None))
+                coords[dim] = labels
+                continue
+            value = where[dim]
+            if isinstance(value, tuple):
+                start, stop = labels.get_loc(value[0]), labels.get_loc(value[1]) + 1
+                index.append(slice(start, stop))
+                coords[dim] = labels[start:stop]
+            elif isinstance(value, (list, np.ndarray, pd.Index)):
+                positions = labels.get_indexer_for(value)
+                if (positions < 0).any():
+                    raise KeyError(f'Unknown {dim} labels in {list(value)}')
+                index.append(positions)
+                coords[dim] = labels[positions]
+            else:
+                index.append(labels.get_loc(value))
+        # Basic indexing (a view) first, then each label list along its axis
+        values = self.values[tuple(slice(None) if isinstance(i, np.ndarray) else i
+                                   for i in index)]
+        axes = [i for i in index if not isinstance(i, (int, np.integer))]
+        for axis, positions in enumerate(axes):
+            if isinstance(positions, np.ndarray):
+                values = np.take(values, positions, axis=axis)
+        return LabelledArray(values, coords, self.attrs)
+
+    def to_frame(self) -> pd.DataFrame:
+        """A 2-d selection as a DataFrame (rows: first dimension)."""
+        if self.values.ndim != 2:
+            raise ValueError(f'to_frame needs 2 dimensions, not {self.dims}')
+        rows, cols = self.coords.values()
+        return pd.DataFrame(self.values, index=rows, columns=cols, copy=False)
+
+
+class DenseBuilder:
+    """Builds the dense cube from featured chunks (``add`` each, then
+    ``build``), so streaming mode never holds the whole dataset.
+
+    Axes grow as new labels appear; a cell given twice, within a chunk or
+    across chunks, raises ValueError instead of overwriting the first value.
+    """
+
+    def __init__(self):
+        self._labels = {dim: {} for dim in DIMS}
+        self._values = np.full([0] * len(DIMS), np.nan, dtype='float32')
+        self._filled = np.zeros(self._values.shape, dtype=bool)
+        self._ccaa = {}
+
+    def _codes(self, dim: str, key: pd.Series) -> np.ndarray:
+        labels = self._labels[dim]
+        present = key.notna().to_numpy()
+        key = key[present].astype(str)
+        for label in key.unique():
+            labels.setdefault(label, len(labels))
+        codes = np.full(len(present), -1, dtype='int64')
+        codes[present] = pd.Index(list(labels)).get_indexer(key)
+        return codes
+
+    def _grow(self) -> None:
+        shape = tuple(len(self._labels[dim]) for dim in DIMS)
+        pad = [(0, new - old) for new, old in zip(shape, self._values.shape)]
+        if any(after for _, after in pad):
+            self._values = np.pad(self._values, pad, constant_values=np.nan)
+            self._filled = np.pad(self._filled, pad, constant_values=False)
+
+    def add(self, df: pd.DataFrame) -> 'DenseBuilder':
+        actividad = df['actividad'].astype('category')
+        keys = {
+            'indicador': actividad.map({cat: indicador_code(cat)
+                                        for cat in actividad.cat.categories}),
+            'provincia': df['provincia'],
+            'sexo': df['sexo'],
+            'trimestre': df['trimestre'],
+        }
+        codes = [self._codes(dim, keys[dim]) for dim in DIMS]
+        self._grow()
+        rows = np.all([c >= 0 for c in codes], axis=0)
+        cells = np.ravel_multi_index(tuple(c[rows] for c in codes), self._values.shape)
+        unique, counts = np.unique(cells, return_counts=True)
+        duplicated = unique[counts > 1]
+        if not len(duplicated):
+            duplicated = unique[self._filled.flat[unique]]
+        if len(duplicated):
+            position = np.unravel_index(duplicated[0], self._values.shape)
+            cell = tuple(list(self._labels[dim])[i] for dim, i in zip(DIMS, position))
+            raise ValueError(f'{len(duplicated)} duplicate cube cells, e.g. {cell}')
+        self._values.flat[cells] = df['valor'].to_numpy(dtype='float32')[rows]
+        self._filled.flat[cells] = True
+
+        ccaa = df[['provincia', 'ccaa']].drop_duplicates('provincia').astype(str)
+        for provincia, comunidad in zip(ccaa['provincia'], ccaa['ccaa']):
+            self._ccaa.setdefault(provincia, comunidad)
+        return self
+
+    def build(self) -> LabelledArray:
+        """The cube with every axis in sorted label order."""
+        order, coords = [], {}
+        for dim in DIMS:
+            labels = pd.Index(list(self._labels[dim]), name=dim)
+            positions = np.argsort(labels.to_numpy(), kind='stable')
+            order.append(positions)
+            coords[dim] = labels[positions]
+        return LabelledArray(self._values[np.ix_(*order)], coords, {'ccaa': dict(self._ccaa)})
+
+
+def build_dense(df: pd.DataFrame) -> LabelledArray:
+    """The dense cube of a featured DataFrame (in memory)."""
+    return DenseBuilder().add(df).build()
+
+
+def _labels_path(path: Path) -> Path:
+    return path.with_suffix('.json')
+
+
+def save_dense(cube: LabelledArray, path: str | Path) -> list[Path]:
+    """Write *cube* as ``path`` (.npy) plus its ``.json`` label sidecar."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.save(path, np.ascontiguousarray(cube.values))
+    labels = {'dims': list(cube.dims),
+              'coords': {dim: labels.tolist() for dim, labels in cube.coords.items()},
+              'attrs': cube.attrs}
+    _labels_path(path).write_text(json.dumps(labels, ensure_ascii=False), encoding='utf-8')
+    return [path, _labels_path(path)]
+
+
+def load_dense(path: str | Path) -> LabelledArray:
+    """Memory-map the cube saved at *path* (read-only, nothing read yet)."""
+    path = Path(path)
+    labels = json.loads(_labels_path(path).read_text(encoding='utf-8'))
+    coords = {dim: pd.Index(labels['coords'][dim], name=dim) for dim in labels['dims']}
+    return LabelledArray(np.load(path, mmap_mode='r'), coords, labels['attrs'])
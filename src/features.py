@@ -1,5 +1,7 @@
 import pandas as pd
 
+from src.schema import FEATURES_SCHEMA, apply_schema
+
 
 CCAA_MAP = {
     'Almería': 'Andalucía', 'Cádiz': 'Andalucía', 'Córdoba': 'Andalucía',
@@ -38,23 +40,26 @@ PERIODO_MAP = {19: 'T4', 20: 'T1', 21: 'T2', 22: 'T3'}
 TABLA_MAP = {65345: 'Poblacion', 65349: 'Tasas', 65354: 'Ocupados por sector'}
 
 
-def build_features(df: pd.DataFrame) -> pd.DataFrame:
-    """Add derived features: temporal, CCAA mapping, flags."""
-    out = df.copy()
-
-    # Temporal
-    out['trimestre'] = out['fecha'].dt.to_period('Q').astype('string')
-    out['mes'] = out['fecha'].dt.month
-    out['year'] = out['fecha'].dt.year
-    out['trimestre_label'] = out['periodo_id'].map(PERIODO_MAP).fillna('Otro')
+def time_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Temporal features (quarter, month, year, quarter label) of each row."""
+    return pd.DataFrame({
+        'trimestre': df['fecha'].dt.to_period('Q').astype('string'),
+        'mes': df['fecha'].dt.month,
+        'year': df['fecha'].dt.year,
+        'trimestre_label': df['periodo_id'].map(PERIODO_MAP).fillna('Otro'),
+    }, index=df.index)
 
-    # Source table
-    out['fuente'] = out['tabla'].map(TABLA_MAP)
 
-    # National flag
-    out['es_nacional'] = out['provincia'].str.lower().str.contains('total nacional', na=False)
+def series_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-series features (source table, national flag, CCAA) of each row."""
+    return pd.DataFrame({
+        'fuente': df['tabla'].map(TABLA_MAP),
+        'es_nacional': df['provincia'].str.lower().str.contains('total nacional', na=False),
+        'ccaa': df['provincia'].map(CCAA_MAP).astype('object').fillna('Desconocida'),
+    }, index=df.index)
 
-    # CCAA
-    out['ccaa'] = out['provincia'].map(CCAA_MAP).fillna('Desconocida')
 
-    return out
+def build_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Add derived features: temporal, CCAA mapping, flags."""
+    out = pd.concat([df, time_features(df), series_features(df)], axis=1)
+    return apply_schema(out, FEATURES_SCHEMA)
@@ -1,7 +1,405 @@
+import json
+import sqlite3
+from operator import itemgetter
 from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
 import pandas as pd
 
+from src.schema import FEATURES_SCHEMA, apply_schema
+
+
+# Parquet files are written with one row group per (tabla, anyo) so that
+# loading a single table or year only reads those row groups.
+ROW_GROUP_KEYS = ('tabla', 'anyo')
+
 
 def load_csv(path: str | Path) -> pd.DataFrame:
     """Load a CSV file into a DataFrame."""
     return pd.read_csv(path)
+
+
+class ParquetAppender:
+    """Write DataFrame chunks to a single zstd-compressed Parquet file.
+
+    Each chunk is stably sorted by *group_by* and every distinct key gets its
+    own row group, whose min/max statistics let load_parquet skip the rest.
+    Categorical columns are stored with int32 dictionary indices so chunks
+    with different category sets share one file schema.
+    """
+
+    def __init__(self, path: str | Path, group_by: tuple[str, ...] = ROW_GROUP_KEYS):
+        self.path = Path(path)
+        self.group_by = group_by
+        self._writer = None
+        self._schema = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        keys = [c for c in self.group_by if c in df.columns]
+        if keys:
+            df = df.sort_values(keys, kind='stable')
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        if self._writer is None:
+            self._schema = pa.schema([
+                f.with_type(pa.dictionary(pa.int32(), f.type.value_type, f.type.ordered))
+                if pa.types.is_dictionary(f.type) else f
+                for f in table.schema
+            ], metadata=table.schema.metadata)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression='zstd')
+        table = table.cast(self._schema)
+
+        if keys and len(df):
+            key_values = df[keys].to_numpy()
+            changed = np.any(key_values[1:] != key_values[:-1], axis=1)
+            bounds = [0, *(np.flatnonzero(changed) + 1).tolist(), len(df)]
+        else:
+            bounds = [0, len(df)]
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            self._writer.write_table(table.slice(start, stop - start))
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def save_parquet(df: pd.DataFrame, path: str | Path,
+                 group_by: tuple[str, ...] = ROW_GROUP_KEYS) -> None:
+    """Save a DataFrame as Parquet, keeping dtypes (see ParquetAppender)."""
+    with ParquetAppender(path, group_by) as writer:
+        writer.write(df)
+
+
+def load_parquet(path: str | Path, columns: list[str] | None = None,
+                 tabla: int | list[int] | None = None,
+                 anyo: int | list[int] | None = None) -> pd.DataFrame:
+    """Load a Parquet file, reading only the requested columns and row groups."""
+    filters = []
+    for col, value in (('tabla', tabla), ('anyo', anyo)):
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            filters.append((col, 'in', list(value)))
+        else:
+            filters.append((col, '==', value))
+    return pd.read_parquet(path, columns=columns, filters=filters or None)
+
+
+def load_data(path: str | Path, **kwargs) -> pd.DataFrame:
+    """Load a CSV or Parquet file, chosen by its suffix."""
+    if Path(path).suffix == '.parquet':
+        return load_parquet(path, **kwargs)
+    return load_csv(path)
+
+
+def iter_chunks(path: str | Path, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Yield a CSV or Parquet file as DataFrames of at most *chunksize* rows.
+
+    Chunks keep a running index, as if the whole file had been loaded.
+    """
+    if Path(path).suffix != '.parquet':
+        yield from pd.read_csv(path, chunksize=chunksize)
+        return
+
+    import pyarrow.parquet as pq
+
+    start = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk
+
+
+def iter_json_series(path: str | Path, chunk_size: int = 1 << 16) -> Iterator[dict]:
+    """Yield the elements of a JSON array file (INE series) one at a time.
+
+    The file is read in pieces of at least *chunk_size* characters and each
+    series is decoded as soon as it is complete, so only one series is held
+    in memory at once.  A series larger than the buffer doubles it, keeping
+    the number of decode attempts logarithmic in its size.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as fh:
+        buf, pos = '', 0
+
+        def fill() -> bool:
+            nonlocal buf, pos
+            chunk = fh.read(max(chunk_size, len(buf) - pos))
+            buf, pos = buf[pos:] + chunk, 0
+            return bool(chunk)
+
+        def peek() -> str:
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\n\r':
+                    pos += 1
+                if pos < len(buf) or not fill():
+                    return buf[pos:pos + 1]
+
+        if peek() != '[':
+            raise ValueError(f'{path}: expected a JSON array')
+        pos += 1
+        if peek() == ']':
+            return
+        while True:
+            peek()
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                    if end < len(buf):
+                        break
+                except json.JSONDecodeError:
+                    pass
+                if not fill():
+                    item, end = decoder.raw_decode(buf, pos)
+                    break
+            yield item
+            pos = end
+            sep = peek()
+            if sep == ']':
+                return
+            if sep != ',':
+                raise ValueError(f'{path}: expected "," or "]" after a series')
+            pos += 1
+
+
+def write_json_series(path: str | Path, series: Iterable[dict]) -> int:
+    """Write *series* as a JSON array one element at a time; return the count.
+
+    The output is identical to ``json.dump(list(series), indent=2,
+    ensure_ascii=False)`` without building the whole document first.
+    """
+    count = 0
+    with open(path, 'w', encoding='utf-8') as fh:
+        for serie in series:
+            text = json.dumps(serie, ensure_ascii=False, indent=2)
+            fh.write(',\n  ' if count else '[\n  ')
+            fh.write(text.replace('\n', '\n  '))
+            count += 1
+        fh.write('\n]' if count else '[]')
+    return count
+
+
+# Data-point fields of an INE series: output column -> (JSON key, dtype)
+POINT_FIELDS = {
+    'fecha_ms': ('Fecha', 'int64'),
+    'anyo': ('Anyo', 'int64'),
+    'periodo_id': ('FK_Periodo', 'int64'),
+    'valor': ('Valor', 'float64'),
+    'secreto': ('Secreto', 'bool'),
+}
+
+
+def flatten_series(series_list: Iterable[dict], fields: list[str] | None = None,
+                   parse_nombre=None) -> pd.DataFrame:
+    """Flatten INE series into one row per data point, column by column.
+
+    Point *fields* (keys of POINT_FIELDS, default all) are gathered straight
+    into typed arrays.  Series attributes (``serie_cod``, ``serie_nombre`` and
+    the dict returned by *parse_nombre* for the stripped name) are stored
+    once per series and repeated by index.  Series for which *parse_nombre*
+    returns None are skipped.  *series_list* may be a stream.
+    """
+    fields = list(POINT_FIELDS) if fields is None else fields
+    getters = {col: itemgetter(POINT_FIELDS[col][0]) for col in fields}
+    values = {col: [] for col in fields}
+    cods, nombres, attrs, counts = [], [], [], []
+    for serie in series_list:
+        nombre = serie['Nombre'].strip()
+        if parse_nombre is not None:
+            parsed = parse_nombre(nombre)
+            if parsed is None:
+                continue
+            attrs.append(parsed)
+        data = serie.get('Data', [])
+        cods.append(serie['COD'])
+        nombres.append(nombre)
+        counts.append(len(data))
+        for col, getter in getters.items():
+            values[col].extend(map(getter, data))
+
+    index = np.repeat(np.arange(len(counts)), counts)
+    out = pd.DataFrame({'serie_cod': np.array(cods, dtype=object)[index],
+                        'serie_nombre': np.array(nombres, dtype=object)[index]})
+    if parse_nombre is not None:
+        per_serie = pd.DataFrame(attrs, index=range(len(attrs)))
+        for col in per_serie.columns:
+            out[col] = per_serie[col].to_numpy()[index]
+    for col in fields:
+        out[col] = np.array(values[col], dtype=POINT_FIELDS[col][1])
+    return out
+
+
+def load_processed(path: str | Path) -> pd.DataFrame:
+    """Load the processed dataset (CSV or Parquet) with its schema dtypes."""
+    if Path(path).suffix == '.parquet':
+        return load_parquet(path)
+    return apply_schema(pd.read_csv(path, parse_dates=['fecha']), FEATURES_SCHEMA)
+
+
+# ---------------------------------------------------------------------------
+# SQLite store: the featured dataset in one table, indexed for point and
+# range queries, updated in place (upsert) on reruns
+# ---------------------------------------------------------------------------
+
+SQLITE_TABLE = 'epa'
+SQLITE_KEY = ('tabla', 'serie_cod', 'anyo', 'periodo_id')
+SQLITE_INDEXES = {
+    'idx_epa_tabla_serie': ('tabla', 'serie_cod'),
+    'idx_epa_provincia_trimestre': ('provincia', 'trimestre'),
+    'idx_epa_actividad_sexo': ('actividad', 'sexo'),
+}
+_SQL_TYPES = {'int': 'INTEGER', 'Int': 'INTEGER', 'bool': 'INTEGER', 'float': 'REAL'}
+
+
+def _sql_type(dtype) -> str:
+    return next((t for prefix, t in _SQL_TYPES.items() if str(dtype).startswith(prefix)),
+                'TEXT')
+
+
+def _sql_param(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return str(value)
+    return value
+
+
+def _connect_ro(path: str | Path) -> sqlite3.Connection:
+    """Open the SQLite database at *path* read-only.
+
+    The path goes into a ``file:`` URI, escaped by as_uri, so characters
+    such as '?', '#' or '%' in a directory name are taken literally.
+    """
+    return sqlite3.connect(Path(path).resolve().as_uri() + '?mode=ro', uri=True)
+
+
+def sqlite_source(path: str | Path) -> str | None:
+    """The *source* tag stored by the last save_sqlite, or None."""
+    if not Path(path).exists():
+        return None
+    # A connection's context manager only commits; it never closes
+    conn = _connect_ro(path)
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def save_sqlite(df: pd.DataFrame, path: str | Path, source: str | None = None,
+                rebuild: bool = False) -> int:
+    """Upsert the featured *df* into the SQLite database at *path*.
+
+    Rows are keyed by SQLITE_KEY: existing keys are updated, new ones
+    inserted, and rows absent from *df* are kept (*rebuild* recreates the
+    table first).  *source* is stored as a tag (see sqlite_source), e.g.
+    the stage key of *df*.  Returns the number of rows inserted or changed.
+    """
+    cols = [col for col in FEATURES_SCHEMA if col in df.columns]
+    data = df[cols].copy()
+    if 'fecha' in data:
+        # Few distinct dates: format each once
+        codes, uniques = pd.factorize(data['fecha'])
+        labels = np.append(uniques.strftime('%Y-%m-%d %H:%M:%S').to_numpy(dtype=object), None)
+        data['fecha'] = labels[codes]
+    for col in cols:
+        if str(FEATURES_SCHEMA[col]).startswith('float'):
+            data[col] = data[col].astype('float64')
+    # Python scalars (sqlite3 does not adapt numpy types), NULL for missing
+    data = data.astype(object).where(data.notna(), None)
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            if rebuild:
+                conn.execute(f'DROP TABLE IF EXISTS {SQLITE_TABLE}')
+            new = not conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?",
+                                   (SQLITE_TABLE,)).fetchone()
+            insert = (f'INSERT INTO {SQLITE_TABLE} ({", ".join(cols)}) '
+                      f'VALUES ({", ".join("?" * len(cols))})')
+            if new:
+                # Bulk load first, index after: much faster than indexing row by row
+                conn.execute(
+                    f'CREATE TABLE {SQLITE_TABLE} ('
+                    + ', '.join(f'{col} {_sql_type(FEATURES_SCHEMA[col])}' for col in cols)
+                    + ')')
+            else:
+                # Upsert; unchanged rows are left alone (no page or index writes)
+                values = [col for col in cols if col not in SQLITE_KEY]
+                insert += (f' ON CONFLICT ({", ".join(SQLITE_KEY)}) DO UPDATE SET '
+                           + ', '.join(f'{col} = excluded.{col}' for col in values)
+                           + ' WHERE ' + ' OR '.join(f'{col} IS NOT excluded.{col}'
+                                                     for col in values))
+            changes = conn.total_changes
+            conn.executemany(insert, data.itertuples(index=False, name=None))
+            changes = conn.total_changes - changes
+            conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_epa_key '
+                         f'ON {SQLITE_TABLE} ({", ".join(SQLITE_KEY)})')
+            for name, index_cols in SQLITE_INDEXES.items():
+                conn.execute(f'CREATE INDEX IF NOT EXISTS {name} '
+                             f'ON {SQLITE_TABLE} ({", ".join(index_cols)})')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (source,))
+        if changes:
+            conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    return changes
+
+
+def load_sqlite(path: str | Path, columns: list[str] | None = None,
+                **where) -> pd.DataFrame:
+    """Load rows of the SQLite store, filtered inside SQLite.
+
+    *where* filters on any column: a value, a list of values, or a
+    ``(first, last)`` tuple for an inclusive range, e.g.
+    ``provincia='Jaén', trimestre=('2012Q1', '2014Q4')``.  Only matching
+    rows are read, through the indexes in SQLITE_INDEXES.
+    """
+    columns = list(FEATURES_SCHEMA) if columns is None else columns
+    for col in [*columns, *where]:
+        if col not in FEATURES_SCHEMA:
+            raise KeyError(f'Unknown column: {col}')
+    clauses, params = [], []
+    for col, value in where.items():
+        if isinstance(value, tuple):
+            clauses.append(f'{col} BETWEEN ? AND ?')
+            params += [_sql_param(v) for v in value]
+        elif isinstance(value, (list, set, np.ndarray, pd.Index)):
+            values = list(value)
+            clauses.append(f'{col} IN ({", ".join("?" * len(values))})')
+            params += [_sql_param(v) for v in values]
+        else:
+            clauses.append(f'{col} = ?')
+            params.append(_sql_param(value))
+    sql = f'SELECT {", ".join(columns)} FROM {SQLITE_TABLE}'
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+
+    conn = _connect_ro(path)
+    try:
+        df = pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+    if 'fecha' in df:
+        df['fecha'] = pd.to_datetime(df['fecha'])
+    if 'es_nacional' in df:
+        df['es_nacional'] = df['es_nacional'].astype(bool)
+    return apply_schema(df, FEATURES_SCHEMA)
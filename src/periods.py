@@ -0,0 +1,97 @@
+"""Batch outputs for several period windows of one featured dataset.
+
+The full range is cleaned and featurized once; each window ``(start, end)``
+(years, inclusive) then gets its slice of the processed data and its own
+charts, whose titles show the window.  Windows run in a process pool that
+inherits the parent's DataFrame (fork, copy-on-write): each worker only
+copies the rows of its own window.
+"""
+
+import multiprocessing as mp
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from src.io import save_parquet
+from src.profiling import stage
+
+# The featured DataFrame shared with the window workers
+_SHARED = {}
+
+
+def window_name(window: tuple[int, int]) -> str:
+    start, end = window
+    return f'{start}_{end}'
+
+
+def window_slice(df: pd.DataFrame, window: tuple[int, int]) -> pd.DataFrame:
+    """The rows of *df* whose year is within *window*."""
+    start, end = window
+    return df[df['year'].between(start, end)].reset_index(drop=True)
+
+
+def run_window(df, window, data_dir, charts_dir=None, raw_dir=None, data_format='both',
+               **chart_opts):
+    """Write the slice of *df* for *window* under *data_dir*
+    (as 'csv', 'parquet' or 'both'; None writes no data) and, with
+    *charts_dir*, its charts
+    (*chart_opts* go to generate_all_charts, e.g. ``render``, ``fmt``).
+
+    Returns (rows, failed chart filenames).
+    """
+    from src.config import OUT_PARQUET_PATH, OUT_PATH
+
+    part = window_slice(df, window)
+    if data_format:
+        out = Path(data_dir) / window_name(window)
+        shutil.rmtree(out, ignore_errors=True)
+        out.mkdir(parents=True)
+        if data_format in ('parquet', 'both'):
+            save_parquet(part, out / OUT_PARQUET_PATH.name)
+        if data_format in ('csv', 'both'):
+            part.to_csv(out / OUT_PATH.name, index=False)
+    failed = []
+    if charts_dir is not None and not part.empty:
+        from src.viz import generate_all_charts
+        failed = generate_all_charts(part, raw_dir, Path(charts_dir) / window_name(window),
+                                     years=window, **chart_opts)
+    return len(part), failed
+
+
+def _init_worker(df):
+    _SHARED['df'] = df
+
+
+def _run_window(args):
+    window, kwargs = args
+    return run_window(_SHARED['df'], window, **kwargs)
+
+
+def run_periods(df, windows, data_dir, charts_dir=None, raw_dir=None, data_format='both',
+                workers=1, **chart_opts):
+    """Run every window of *windows* over *df* (see run_window); with
+    ``workers > 1`` in a process pool sharing *df*.
+
+    Returns {window: (rows, failed chart filenames)}.
+    """
+    kwargs = dict(data_dir=data_dir, charts_dir=charts_dir, raw_dir=raw_dir,
+                  data_format=data_format, **chart_opts)
+    jobs = [(tuple(window), kwargs) for window in windows]
+    if workers > 1 and len(jobs) > 1:
+        if charts_dir is not None:
+            import src.viz  # imported once here rather than in every worker
+        ctx = mp.get_context('fork' if sys.platform == 'linux' else 'spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=ctx,
+                                 initializer=_init_worker, initargs=(df,)) as pool:
+            results = list(pool.map(_run_window, jobs))
+    else:
+        _init_worker(df)
+        results = []
+        for job in jobs:
+            with stage(window_name(job[0])):
+                results.append(_run_window(job))
+        _SHARED.clear()
+    return dict(zip((job[0] for job in jobs), results))
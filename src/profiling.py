@@ -0,0 +1,204 @@
+"""Per-stage wall time, CPU time and memory of a pipeline run.
+
+A ``Profiler`` records every ``stage`` entered while it is active; stages
+nest ('clean/parse_dates') and repeated stages (one per chunk in
+streaming mode) are accumulated.  Library code marks its steps with the
+module-level ``stage()``, a no-op unless a profiler is active, so it costs
+nothing in normal runs.
+"""
+
+import cProfile
+import io
+import json
+import platform
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows: psutil, if installed, reports the peak instead
+    resource = None
+psutil = None
+if resource is None:
+    try:
+        import psutil
+    except ImportError:
+        pass
+
+_MB = 2**20
+
+_active = None
+
+
+def stage(name: str):
+    """Context manager timing *name* on the active profiler, if any."""
+    return _active.stage(name) if _active is not None else nullcontext()
+
+
+def current() -> 'Profiler | None':
+    """The active profiler, or None."""
+    return _active
+
+
+def add_stages(records: dict[str, dict]) -> None:
+    """Add stages measured in another process under the current stage."""
+    if _active is None:
+        return
+    prefix = ''.join(frame['name'] + '/' for frame in _active._stack)
+    for path, record in records.items():
+        _active.add(prefix + path, record)
+
+
+def _rss_mb() -> float | None:
+    """Peak resident set size of this process so far (None if unknown)."""
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / _MB if sys.platform == 'darwin' else rss / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / _MB
+    return None
+
+
+class Profiler:
+    """Collect per-stage timings and memory while active (see ``activate``).
+
+    With *memory*, tracemalloc reports each stage's peak and net allocated
+    Python/NumPy memory; it slows every allocation down, so it is off by
+    default and times are best read from a run without it.  The process
+    peak RSS is recorded where it is known (``resource``, or psutil on
+    Windows if installed).
+    With *cprofile*, each top-level stage runs under cProfile and the
+    hottest one (by CPU time in this process) is kept for ``write``.
+    """
+
+    def __init__(self, memory: bool = False, cprofile: bool = False):
+        self.memory = memory
+        self.cprofile = cprofile
+        self.stages: dict[str, dict] = {}
+        self._stack: list[dict] = []
+        self._profiles: dict[str, cProfile.Profile] = {}
+        self._started = time.perf_counter()
+        self._started_cpu = time.process_time()
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+
+    @contextmanager
+    def activate(self):
+        """Make this the profiler that ``stage()`` reports to."""
+        global _active
+        previous, _active = _active, self
+        tracing = self.memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        try:
+            yield self
+        finally:
+            if tracing:
+                tracemalloc.stop()
+            _active = previous
+
+    @contextmanager
+    def stage(self, name: str):
+        path = '/'.join([*(frame['name'] for frame in self._stack), name])
+        self.stages.setdefault(path, {})    # report parents before their sub-stages
+        frame = {'name': name, 'peak': 0}
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            frame['start_mem'] = current
+        profile = None
+        if self.cprofile and not self._stack:
+            profile = self._profiles.setdefault(path, cProfile.Profile())
+            profile.enable()
+        self._stack.append(frame)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            self._stack.pop()
+            if profile is not None:
+                profile.disable()
+            record = {'wall_s': wall, 'cpu_s': cpu}
+            if 'start_mem' in frame:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(frame['peak'], peak)
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+                record['peak_mb'] = (peak - frame['start_mem']) / _MB
+                record['allocated_mb'] = (current - frame['start_mem']) / _MB
+            rss = _rss_mb()
+            if rss is not None:
+                record['rss_mb'] = rss
+            self.add(path, record)
+
+    def add(self, path: str, record: dict) -> None:
+        """Accumulate *record* into stage *path* (also for stages measured elsewhere)."""
+        total = self.stages.get(path)
+        if not total:
+            self.stages[path] = {**record, 'calls': record.get('calls', 1)}
+            return
+        total['calls'] += record.get('calls', 1)
+        for key in ('wall_s', 'cpu_s', 'allocated_mb'):
+            if key in record:
+                total[key] = total.get(key, 0) + record[key]
+        for key in ('peak_mb', 'rss_mb'):
+            if key in record:
+                total[key] = max(total.get(key, 0), record[key])
+
+    def hottest(self) -> str | None:
+        """The top-level stage that used the most CPU time in this process."""
+        top = [p for p in self.stages if '/' not in p and self.stages[p]]
+        return max(top, key=lambda p: self.stages[p]['cpu_s'], default=None)
+
+    def report(self, **meta) -> dict:
+        """JSON-serializable report: run metadata, totals and stages in order."""
+        stages = {path: {k: round(v, 4) if isinstance(v, float) else v
+                         for k, v in rec.items()}
+                  for path, rec in self.stages.items()}
+        total = {'wall_s': round(time.perf_counter() - self._started, 4),
+                 'cpu_s': round(time.process_time() - self._started_cpu, 4)}
+        rss = _rss_mb()
+        if rss is not None:
+            total['rss_mb'] = round(rss, 1)
+        return {
+            'started': self.started_at,
+            'python': platform.python_version(),
+            **meta,
+            'total': total,
+            'memory_traced': self.memory,
+            'stages': stages,
+        }
+
+    def write(self, path: str | Path, top: int = 25, **meta) -> Path:
+        """Write the report to *path*; with cprofile, also ``<path>.prof``.
+
+        The .prof dump (for pstats/snakeviz) is of the hottest stage, whose
+        *top* functions by cumulative time are also listed in the report.
+        """
+        path = Path(path)
+        report = self.report(**meta)
+        hottest = self.hottest()
+        if hottest in self._profiles:
+            prof_path = path.with_suffix('.prof')
+            stats = pstats.Stats(self._profiles[hottest], stream=io.StringIO())
+            stats.dump_stats(prof_path)
+            stats.sort_stats('cumulative')
+            report['cprofile'] = {
+                'stage': hottest,
+                'path': str(prof_path),
+                'top': [{'function': f'{file}:{line}({func})', 'calls': nc,
+                         'tottime_s': round(tt, 4), 'cumtime_s': round(ct, 4)}
+                        for (file, line, func), (_, nc, tt, ct, _)
+                        in ((fn, stats.stats[fn]) for fn in stats.fcn_list[:top])],
+            }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        return path
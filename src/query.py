@@ -0,0 +1,140 @@
+"""Indexed slice queries over the featured EPA dataset.
+
+``EpaCube`` sorts the rows once by (tabla, indicador, sexo, ambito,
+trimestre) and keeps the offsets of every (tabla, indicador, sexo, ambito)
+group, so ``select`` jumps straight to the matching rows instead of
+re-scanning the whole frame with boolean masks.  String predicates on
+``actividad`` are resolved once per category into short indicator codes.
+"""
+
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+
+GROUP_KEYS = ('tabla', 'indicador', 'sexo', 'ambito')
+
+
+def _slug(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', text.lower()).strip('_')
+
+
+def indicador_code(actividad: str) -> str:
+    """Short code for an ``actividad`` label.
+
+    'Tasa de paro de la poblacion' -> 'tasa_paro', 'Ocupados - Construcción'
+    -> 'sector_construccion', 'Ocupados' -> 'ocupados'.
+    """
+    label = actividad.strip().lower()
+    if label.startswith('ocupados - '):
+        return 'sector_' + _slug(label.removeprefix('ocupados - '))
+    if label.startswith('tasa de '):
+        return 'tasa_' + _slug(label.removeprefix('tasa de ').split(' de la ')[0])
+    return _slug(label)
+
+
+def _as_list(value) -> list:
+    return list(value) if isinstance(value, (list, set, np.ndarray, pd.Index)) else [value]
+
+
+class EpaCube:
+    """Featured EPA rows indexed for fast slicing (see ``select``).
+
+    ``frame`` is the original DataFrame; selections are returned in its row
+    order, so they match what the equivalent boolean mask would give.
+    ``dense`` is the same data as a labelled indicador × provincia × sexo ×
+    trimestre array (src/dense.py): the one given, typically memory-mapped
+    from disk, or else built from ``frame`` on first use.  ``aggregates``
+    are its CCAA and national rollups (src/aggregates.py), likewise given
+    or computed from ``dense`` on first use.
+    """
+
+    def __init__(self, df: pd.DataFrame, dense=None, aggregates=None):
+        self.frame = df
+        self._dense = dense
+        self._aggregates = aggregates
+        actividad = df['actividad'].astype('category')
+        codes = {cat: indicador_code(cat) for cat in actividad.cat.categories}
+        keys = pd.DataFrame({
+            'tabla': df['tabla'].to_numpy(),
+            'indicador': actividad.map(codes).astype(object).fillna('').to_numpy(),
+            'sexo': df['sexo'].astype(object).fillna('').to_numpy(),
+            'ambito': np.where(df['es_nacional'], 'nacional', 'provincial'),
+            'periodo': df['trimestre'].astype('category').cat.codes.to_numpy(),
+        })
+        order = keys.sort_values(list(GROUP_KEYS) + ['periodo'], kind='stable').index.to_numpy()
+        self._order = order
+        self._periodo = keys['periodo'].to_numpy()[order]
+        self._periodos = df['trimestre'].astype('category').cat.categories
+
+        sorted_keys = keys.iloc[order][list(GROUP_KEYS)]
+        bounds = np.flatnonzero(sorted_keys.ne(sorted_keys.shift()).any(axis=1).to_numpy())
+        stops = np.append(bounds[1:], len(order))
+        self._groups = {tuple(sorted_keys.iloc[start]): (start, stop)
+                        for start, stop in zip(bounds, stops)}
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    @property
+    def dense(self):
+        if self._dense is None:
+            from src.dense import build_dense
+            self._dense = build_dense(self.frame)
+        return self._dense
+
+    @property
+    def aggregates(self):
+        if self._aggregates is None:
+            from src.aggregates import rollup
+            self._aggregates = rollup(self.dense)
+        return self._aggregates
+
+    @property
+    def indicadores(self) -> list[str]:
+        return sorted({key[1] for key in self._groups})
+
+    def _periodo_range(self, value, start: int, stop: int) -> list[tuple[int, int]]:
+        """Sub-ranges of group [start, stop) whose trimestre matches *value*."""
+        codes = self._periodo[start:stop]
+        if isinstance(value, tuple):
+            lo, hi = (self._periodos.searchsorted(value[0], 'left'),
+                      self._periodos.searchsorted(value[1], 'right') - 1)
+            return [(start + codes.searchsorted(lo, 'left'),
+                     start + codes.searchsorted(hi, 'right'))]
+        ranges = []
+        for periodo in _as_list(value):
+            if periodo not in self._periodos:
+                continue
+            code = self._periodos.get_loc(periodo)
+            ranges.append((start + codes.searchsorted(code, 'left'),
+                           start + codes.searchsorted(code, 'right')))
+        return ranges
+
+    def select(self, tabla=None, indicador=None, sexo=None, ambito=None,
+               periodo=None) -> pd.DataFrame:
+        """Rows matching every given criterion, in the frame's original order.
+
+        Each criterion is a value or a list of values; ``ambito`` is
+        'nacional' or 'provincial' and ``periodo`` a trimestre label
+        ('2012Q1'), a list of labels or a ``(first, last)`` tuple (inclusive
+        range).  Cost is proportional to the number of groups and rows
+        returned, not to the size of the dataset.
+        """
+        wanted = [None if v is None else set(_as_list(v))
+                  for v in (tabla, indicador, sexo, ambito)]
+        ranges = []
+        for key, (start, stop) in self._groups.items():
+            if all(w is None or k in w for k, w in zip(key, wanted)):
+                if periodo is None:
+                    ranges.append((start, stop))
+                else:
+                    ranges.extend(self._periodo_range(periodo, start, stop))
+        if not ranges:
+            return self.frame.iloc[:0]
+        rows = np.concatenate([self._order[a:b] for a, b in ranges])
+        rows.sort()
+        return self.frame.iloc[rows]
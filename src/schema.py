@@ -0,0 +1,70 @@
+"""Declared dtypes for the cleaned and featured EPA DataFrames.
+
+Low-cardinality text columns are categoricals, keys and calendar fields
+are small ints and ``valor`` is float32.  float32 does not hold
+two-decimal values exactly (1234.56 is stored as 1234.5600586), but with
+INE's at most two decimals and EPA levels well below 1e5 the nearest
+float32 rounds back to the published value, so written CSVs are
+unchanged.  Arithmetic on it is not: sums and means differ from float64
+in the last digits, which shifts a few anti-aliased pixels in the charts.
+"""
+
+import pandas as pd
+
+
+# Quarter labels ('2012Q1', ...) sort chronologically, so min/max/sort work
+ORDERED_CATEGORY = pd.CategoricalDtype(ordered=True)
+
+CLEAN_SCHEMA = {
+    'tabla': 'int32',
+    'serie_cod': 'category',
+    'serie_nombre': 'category',
+    'anyo': 'int16',
+    'periodo_id': 'int8',
+    'valor': 'float32',
+    'fecha': 'datetime64[ns]',
+    'provincia': 'category',
+    'sexo': 'category',
+    'actividad': 'category',
+}
+
+FEATURES_SCHEMA = {
+    **CLEAN_SCHEMA,
+    'trimestre': ORDERED_CATEGORY,
+    'mes': 'Int8',
+    'year': 'Int16',
+    'trimestre_label': 'category',
+    'fuente': 'category',
+    'es_nacional': 'bool',
+    'ccaa': 'category',
+}
+
+
+def _matches(actual, expected) -> bool:
+    if isinstance(expected, pd.CategoricalDtype):
+        return isinstance(actual, pd.CategoricalDtype) and actual.ordered == expected.ordered
+    return str(actual) == expected
+
+
+def apply_schema(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """Cast the columns of *df* present in *schema* to their declared dtype.
+
+    Categoricals always get object-backed categories (as after a Parquet
+    round trip), whether the source column was object or string dtype.
+    """
+    casts = {col: dtype for col, dtype in schema.items()
+             if col in df.columns and not _matches(df[col].dtype, dtype)}
+    if not casts:
+        return df
+    as_object = {col: object for col, dtype in casts.items()
+                 if str(dtype) == 'category' and isinstance(df[col].dtype, pd.StringDtype)}
+    if as_object:
+        df = df.astype(as_object)
+    return df.astype(casts)
+
+
+def check_schema(df: pd.DataFrame, schema: dict) -> list[str]:
+    """Return a description of every column whose dtype differs from *schema*."""
+    return [f'{col}: {df[col].dtype} != {dtype}'
+            for col, dtype in schema.items()
+            if col in df.columns and not _matches(df[col].dtype, dtype)]
@@ -0,0 +1,175 @@
+"""Normalized (star-schema) storage of the EPA dataset.
+
+The wide processed table repeats every series attribute on each of its ~96
+quarterly rows.  Here they are stored once: a ``series`` dimension (one row
+per ``serie_cod``, with its parsed and derived attributes), a ``quarters``
+dimension (one row per (anyo, periodo_id)) and a narrow fact table of
+(series_key, quarter_key, valor).  Loaders filter the small dimensions
+first and join only the requested columns back onto the matching facts.
+
+Any INE table whose series names can be parsed into attributes fits the
+same model: new tables only add rows to the series dimension.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.config import STAR_FACTS_PATH, STAR_QUARTERS_PATH, STAR_SERIES_PATH
+from src.features import series_features, time_features
+from src.io import save_parquet
+from src.schema import FEATURES_SCHEMA, apply_schema
+
+
+SERIES_COLS = ['tabla', 'serie_cod', 'serie_nombre', 'provincia', 'sexo', 'actividad']
+
+
+def _most_common(counts: pd.Series, keys: list[str]) -> pd.DataFrame:
+    """The most frequent last level of *counts* per *keys* (ties: first in
+    sort order); *counts* are row counts indexed by (*keys*, value)."""
+    counts = counts.sort_index().reset_index(name='n')
+    counts = counts.sort_values('n', ascending=False, kind='stable')
+    return counts.drop_duplicates(keys).drop(columns='n').reset_index(drop=True)
+
+
+class StarBuilder:
+    """Collect the star schema of a frame chunk by chunk (``add``), then
+    ``build`` it; ``build_star(df)`` is ``StarBuilder().add(df).build()``.
+
+    Only what the dimensions need (row counts per series name and per
+    quarter date, the first attributes of each series) and the narrow fact
+    columns (a series id, anyo, periodo_id, valor: 11 bytes per row) are
+    kept, never the wide rows, so streaming mode can build it in bounded
+    memory.
+    """
+
+    def __init__(self):
+        self._names = None      # rows per (serie_cod, serie_nombre)
+        self._dates = None      # rows per (anyo, periodo_id, fecha)
+        self._attrs = []        # attributes of each serie_cod, first seen
+        self._ids: dict[str, int] = {}
+        self._facts = []
+
+    @staticmethod
+    def _count(total, df: pd.DataFrame, cols: list[str]) -> pd.Series:
+        """*total* plus the rows of *df* per *cols* (categories as plain values)."""
+        counts = df.groupby(cols, observed=True, sort=False).size()
+        counts.index = counts.index.set_levels(
+            [level.astype(object) if isinstance(level.dtype, pd.CategoricalDtype) else level
+             for level in counts.index.levels])
+        return counts if total is None else total.add(counts, fill_value=0).astype('int64')
+
+    def add(self, df: pd.DataFrame) -> 'StarBuilder':
+        """Add the rows of a cleaned (or featured) chunk."""
+        self._names = self._count(self._names, df, ['serie_cod', 'serie_nombre'])
+        self._dates = self._count(self._dates, df, ['anyo', 'periodo_id', 'fecha'])
+
+        attrs = df[SERIES_COLS].drop(columns='serie_nombre').drop_duplicates('serie_cod')
+        attrs = attrs.astype({'serie_cod': object})
+        new = attrs[~attrs['serie_cod'].isin(list(self._ids))]
+        for cod in new['serie_cod']:
+            self._ids[cod] = len(self._ids)
+        self._attrs.append(new)
+
+        serie = df['serie_cod'].astype('category').cat
+        ids = np.array([self._ids.get(cod, -1) for cod in serie.categories], dtype='int32')
+        codes = serie.codes.to_numpy()
+        self._facts.append(pd.DataFrame({'serie_id': np.where(codes >= 0, ids[codes], -1),
+                                         'anyo': df['anyo'].to_numpy(),
+                                         'periodo_id': df['periodo_id'].to_numpy(),
+                                         'valor': df['valor'].to_numpy()}))
+        return self
+
+    def build(self) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """The (series, quarters, facts) tables of all the rows added."""
+        series = _most_common(self._names, ['serie_cod'])
+        attrs = pd.concat(self._attrs, ignore_index=True)
+        series = (attrs.merge(series, on='serie_cod')[SERIES_COLS]
+                  .sort_values('serie_cod').reset_index(drop=True))
+        series = pd.concat([series, series_features(series)], axis=1)
+        series.insert(0, 'series_key', np.arange(len(series), dtype='int32'))
+
+        quarters = _most_common(self._dates, ['anyo', 'periodo_id'])
+        quarters = quarters.sort_values('fecha', kind='stable').reset_index(drop=True)
+        quarters = pd.concat([quarters, time_features(quarters)], axis=1)
+        quarters.insert(0, 'quarter_key', np.arange(len(quarters), dtype='int16'))
+
+        # Keys are positions in the dimensions
+        series_key = np.empty(len(self._ids), dtype='int32')
+        series_key[[self._ids[cod] for cod in series['serie_cod']]] = series['series_key']
+        facts = pd.concat(self._facts, ignore_index=True)
+        facts = facts[facts['serie_id'] >= 0]
+        facts = facts.assign(series_key=series_key[facts['serie_id'].to_numpy()])
+        facts = facts.merge(quarters[['anyo', 'periodo_id', 'quarter_key']],
+                            on=['anyo', 'periodo_id'])
+        facts = (facts[['series_key', 'quarter_key', 'valor']]
+                 .sort_values(['series_key', 'quarter_key']).reset_index(drop=True))
+        return (apply_schema(series, FEATURES_SCHEMA),
+                apply_schema(quarters, FEATURES_SCHEMA),
+                apply_schema(facts, FEATURES_SCHEMA))
+
+
+def build_star(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Split a cleaned (or featured) frame into (series, quarters, facts).
+
+    Series attributes are taken once per ``serie_cod``; ``serie_nombre`` is
+    its most frequent spelling and each quarter's ``fecha`` its most
+    frequent date.  Features are computed on the dimensions, so once per
+    series and once per quarter.  Keys are positions in the dimensions.
+    """
+    return StarBuilder().add(df).build()
+
+
+def write_star(tables: tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame],
+               out_dir: str | Path) -> list[Path]:
+    """Write the (series, quarters, facts) *tables* as three Parquet files."""
+    out_dir = Path(out_dir)
+    paths = [out_dir / p.name for p in (STAR_SERIES_PATH, STAR_QUARTERS_PATH, STAR_FACTS_PATH)]
+    for frame, path in zip(tables, paths):
+        save_parquet(frame, path, group_by=())
+    return paths
+
+
+def save_star(df: pd.DataFrame, out_dir: str | Path) -> list[Path]:
+    """Build the star schema of *df* and write its three Parquet files."""
+    return write_star(build_star(df), out_dir)
+
+
+def load_star(star_dir: str | Path, columns: list[str] | None = None,
+              **where) -> pd.DataFrame:
+    """Load facts joined with the requested dimension *columns*.
+
+    *where* filters on any dimension column, e.g. ``tabla=65349`` or
+    ``provincia=['Jaén', 'Madrid']``; it is applied to the dimensions and
+    only the facts of the matching keys are read.  By default every
+    column of the wide processed table is returned.
+    """
+    star_dir = Path(star_dir)
+    series = pd.read_parquet(star_dir / STAR_SERIES_PATH.name)
+    quarters = pd.read_parquet(star_dir / STAR_QUARTERS_PATH.name)
+
+    # Filters select keys on the small dimensions; facts are read for those only
+    keys = {'series_key': series, 'quarter_key': quarters}
+    for col, value in where.items():
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        key = 'series_key' if col in series.columns else 'quarter_key'
+        if col not in keys[key].columns:
+            raise KeyError(f'Unknown star column: {col}')
+        keys[key] = keys[key][keys[key][col].isin(values)]
+    filters = [(key, 'in', dim[key].tolist()) for key, dim in keys.items()
+               if len(dim) < len(series if key == 'series_key' else quarters)]
+    facts = pd.read_parquet(star_dir / STAR_FACTS_PATH.name, filters=filters or None)
+
+    # Keys are row positions in the dimensions: joining is a take()
+    out = {}
+    for col in list(FEATURES_SCHEMA) if columns is None else columns:
+        if col in facts.columns:
+            out[col] = facts[col]
+        elif col in series.columns:
+            out[col] = series[col].take(facts['series_key']).reset_index(drop=True)
+        elif col in quarters.columns:
+            out[col] = quarters[col].take(facts['quarter_key']).reset_index(drop=True)
+        else:
+            raise KeyError(f'Unknown star column: {col}')
+    return apply_schema(pd.DataFrame(out), FEATURES_SCHEMA)
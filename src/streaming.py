@@ -0,0 +1,98 @@
+"""Chunked clean + features pipeline for inputs larger than memory."""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.cleaning import DEDUP_KEYS, clean
+from src.features import build_features
+from src.io import ParquetAppender, iter_chunks
+from src.profiling import stage
+from src.utils import validate_clean
+
+
+class KeyIndex:
+    """Compact index of the dedup keys already emitted by earlier chunks.
+
+    Each DEDUP_KEYS tuple is packed exactly into one 64-bit integer: an id
+    per distinct (tabla, serie_cod) series, then anyo (16 bits) and
+    periodo_id (8 bits).  Keys are kept as a sorted array of those (8 bytes
+    per kept row, plus one dict entry per series), so memory grows with the
+    number of distinct data points rather than with the size of the input,
+    and distinct keys never compare equal.
+    """
+
+    def __init__(self):
+        self._keys = np.empty(0, dtype=np.int64)
+        self._series: dict[tuple, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _pack(self, df: pd.DataFrame) -> np.ndarray:
+        codes, uniques = pd.factorize(pd.MultiIndex.from_arrays(
+            [df['tabla'].astype('int64'), df['serie_cod'].astype(str)]))
+        ids = np.array([self._series.setdefault(key, len(self._series)) for key in uniques],
+                       dtype=np.int64)
+        return ((ids[codes] << 24)
+                | ((df['anyo'].to_numpy().astype(np.int64) & 0xFFFF) << 8)
+                | (df['periodo_id'].to_numpy().astype(np.int64) & 0xFF))
+
+    def drop_seen(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Drop rows whose key was already seen and record the new keys."""
+        keys = self._pack(df)
+        pos = np.searchsorted(self._keys, keys)
+        seen = np.zeros(len(keys), dtype=bool)
+        inside = pos < len(self._keys)
+        seen[inside] = self._keys[pos[inside]] == keys[inside]
+        self._keys = np.union1d(self._keys, keys[~seen])
+        return df[~seen]
+
+
+def iter_featured(raw_path: str | Path, chunksize: int):
+    """Yield cleaned + featured chunks of *raw_path*, deduplicated across chunks.
+
+    clean() keeps the first occurrence of each key within a chunk and the
+    KeyIndex drops keys already emitted by earlier chunks, so the
+    concatenated output equals clean() + build_features() on the whole file.
+    """
+    keys = KeyIndex()
+    for chunk in iter_chunks(raw_path, chunksize):
+        with stage('clean'):
+            df = keys.drop_seen(clean(chunk))
+        with stage('validate'):
+            validate_clean(df, verbose=False)
+        with stage('features'):
+            df = build_features(df)
+        yield df
+
+
+def run_streaming(raw_path: str | Path, chunksize: int,
+                  csv_path: str | Path | None = None,
+                  parquet_path: str | Path | None = None, sinks=()) -> int:
+    """Stream *raw_path* through clean + features, appending to the outputs.
+
+    Each featured chunk is also passed to ``sink.add`` for every sink, e.g.
+    a star.StarBuilder, so derived outputs are built without reading the
+    processed data back.  Peak memory is bounded by *chunksize* plus the
+    KeyIndex (and whatever the sinks keep).  Returns the number of rows
+    written.
+    """
+    rows = 0
+    parquet = ParquetAppender(parquet_path) if parquet_path else None
+    try:
+        for df in iter_featured(raw_path, chunksize):
+            if csv_path:
+                df.to_csv(csv_path, index=False, mode='w' if rows == 0 else 'a',
+                          header=rows == 0)
+            if parquet:
+                parquet.write(df)
+            with stage('collect'):
+                for sink in sinks:
+                    sink.add(df)
+            rows += len(df)
+    finally:
+        if parquet:
+            parquet.close()
+    return rows
@@ -1,5 +1,7 @@
 import pandas as pd
 
+from src.schema import CLEAN_SCHEMA, check_schema
+
 
 def assert_columns(df: pd.DataFrame, required: list[str]):
     """Raise if required columns are missing."""
@@ -8,7 +10,7 @@ def assert_columns(df: pd.DataFrame, required: list[str]):
         raise ValueError(f'Missing columns: {missing}')
 
 
-def validate_clean(df: pd.DataFrame):
+def validate_clean(df: pd.DataFrame, verbose: bool = True):
     """Basic validations on the cleaned DataFrame."""
     assert_columns(df, ['tabla', 'serie_cod', 'anyo', 'periodo_id', 'valor',
                         'fecha', 'provincia', 'sexo', 'actividad'])
@@ -20,4 +22,7 @@ def validate_clean(df: pd.DataFrame):
         'fecha is not datetime!'
     assert df['sexo'].isin(['Ambos sexos', 'Hombres', 'Mujeres']).all(), \
         f'sexo has unexpected values: {df["sexo"].unique()}'
-    print('All validations passed.')
+    mismatches = check_schema(df, CLEAN_SCHEMA)
+    assert not mismatches, f'dtypes do not match the schema: {mismatches}'
+    if verbose:
+        print('All validations passed.')
@@ -1,6 +1,14 @@
+import hashlib
+import inspect
 import json
+import multiprocessing as mp
 import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
 from pathlib import Path
+from typing import NamedTuple
 
 import numpy as np
 import pandas as pd
@@ -10,6 +18,17 @@ import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
 import seaborn as sns
 
+import src.aggregates
+import src.dense
+import src.io
+import src.query
+from src.config import RAW_TABLES_PATH
+from src import profiling
+from src.cache import code_digest, file_digest
+from src.dense import LabelledArray
+from src.io import flatten_series, iter_json_series, load_parquet
+from src.query import EpaCube
+
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -19,26 +38,141 @@ def _period_label(df):
     return f"{int(df['year'].min())}–{int(df['year'].max())}"
 
 
-def _load_json(path):
-    with open(path, encoding='utf-8') as f:
-        return json.load(f)
+# How charts are saved: 'publication' is the report quality; 'preview' is
+# for CI and notebook iteration (low dpi, no tight-bbox layout pass and a
+# plain heatmap).  quality applies to the lossy webp output.
+RENDER_PROFILES = {
+    'publication': {'dpi': 150, 'bbox_inches': 'tight', 'simple_heatmap': False, 'quality': 90},
+    'preview': {'dpi': 60, 'bbox_inches': None, 'simple_heatmap': True, 'quality': 75},
+}
+
+# Output formats: raster (png, or the much smaller lossy webp) or vector
+# (svg, pdf).  jpg is not offered: on these flat-colour charts it is
+# larger than png.
+FORMATS = ('png', 'webp', 'svg', 'pdf')
+
+
+def chart_filename(filename, fmt='png'):
+    """The file name of chart *filename* saved as *fmt*."""
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown chart format: {fmt}')
+    return Path(filename).with_suffix(f'.{fmt}').name
+
+
+def _save(fig, save_path, render='publication'):
+    """Save *fig* to *save_path* (format from its suffix) with the *render*
+    profile, if a path is given, and close it."""
+    settings = RENDER_PROFILES[render]
+    if save_path:
+        kwargs = {}
+        if Path(save_path).suffix == '.webp':
+            kwargs['pil_kwargs'] = {'quality': settings['quality']}
+        fig.savefig(save_path, dpi=settings['dpi'], bbox_inches=settings['bbox_inches'],
+                    **kwargs)
+    plt.close(fig)
+
+
+def _cube(df, dense=None, aggregates=None):
+    """The EpaCube for *df* (plot functions accept either; build it once and reuse).
+
+    *dense* is the dense cube of *df* and *aggregates* its rollups, if
+    already available (see src/dense.py and src/aggregates.py).
+    """
+    return df if isinstance(df, EpaCube) else EpaCube(df, dense=dense, aggregates=aggregates)
+
+
+def _provincial(frame):
+    """Rows of a provincia- or ambito-indexed slice, without Total Nacional."""
+    return frame[frame.index != 'Total Nacional']
 
 
 def _json_to_df(series_list, parse_nombre):
-    """Flatten JSON series into a DataFrame using a custom nombre parser."""
-    rows = []
-    for serie in series_list:
-        nombre = serie['Nombre'].strip()
-        parsed = parse_nombre(nombre)
-        if parsed is None:
-            continue
-        for dp in serie.get('Data', []):
-            row = {**parsed,
-                   'fecha': pd.Timestamp(dp['Fecha'], unit='ms'),
-                   'anyo': dp['Anyo'],
-                   'valor': dp['Valor']}
-            rows.append(row)
-    return pd.DataFrame(rows)
+    """Flatten JSON series into a DataFrame using a custom nombre parser.
+
+    *series_list* may be a stream (see io.iter_json_series); see
+    io.flatten_series for the columnar layout.
+    """
+    out = flatten_series(series_list, fields=['fecha_ms', 'anyo', 'valor'],
+                         parse_nombre=parse_nombre)
+    if out.empty:
+        return pd.DataFrame()
+    out['fecha'] = pd.to_datetime(out['fecha_ms'], unit='ms')
+    attrs = out.columns[2:-4].tolist()
+    return out[attrs + ['fecha', 'anyo', 'valor']]
+
+
+# Parsed raw tables kept per process; at most this many (file, table) pairs
+RAW_TABLE_CACHE_SIZE = 8
+
+
+@lru_cache(maxsize=RAW_TABLE_CACHE_SIZE)
+def _read_raw_table(path, mtime_ns, size, tabla_id, parse_nombre):
+    """Parse one extra INE table from *path* (Parquet or JSON).
+
+    Memoized on the file's identity (path, mtime, size): a file that
+    changes on disk gets a new key, so stale entries are never returned.
+    """
+    if path.suffix != '.parquet':
+        return _json_to_df(iter_json_series(path), parse_nombre)
+
+    data = load_parquet(path, tabla=tabla_id,
+                        columns=['serie_nombre', 'fecha_ms', 'anyo', 'valor'])
+    nombres = data['serie_nombre'].str.strip()
+    parsed = {n: parse_nombre(n) for n in nombres.unique()}
+    parsed = {n: p for n, p in parsed.items() if p is not None}
+    data = data[nombres.isin(list(parsed))]
+    if data.empty:
+        return pd.DataFrame()
+    attrs = pd.DataFrame.from_dict(parsed, orient='index')
+    out = attrs.loc[data['serie_nombre'].str.strip()].reset_index(drop=True)
+    out['fecha'] = pd.to_datetime(data['fecha_ms'].to_numpy(), unit='ms')
+    out['anyo'] = data['anyo'].to_numpy()
+    out['valor'] = data['valor'].to_numpy()
+    return out
+
+
+class RawWindow(NamedTuple):
+    """The raw tables of *raw_dir* restricted to the years *start*..*end*
+    (what the raw-table charts receive for a period window)."""
+    raw_dir: Path
+    start: int
+    end: int
+
+
+def _raw_window(raw_dir):
+    """(raw directory, (start, end) years or None) of a dir or RawWindow."""
+    if isinstance(raw_dir, RawWindow):
+        return Path(raw_dir.raw_dir), (raw_dir.start, raw_dir.end)
+    return Path(raw_dir), None
+
+
+def _raw_table_path(raw_dir, json_name):
+    """The file an extra INE table is read from: the Parquet copy if any."""
+    path = Path(raw_dir) / RAW_TABLES_PATH.name
+    return path if path.exists() else Path(raw_dir) / json_name
+
+
+def _load_raw_table(raw_dir, tabla_id, json_name, parse_nombre):
+    """Load one extra INE table as a DataFrame, preferring the Parquet copy.
+
+    Reads only the table's row groups from ``epa_tablas_raw.parquet`` when it
+    exists, parsing each distinct serie name once; otherwise flattens the
+    raw JSON file.  Each table is parsed once per process while its file is
+    unchanged (see raw_table_cache_info); callers get their own copy.
+    *raw_dir* may be a RawWindow, which keeps only the rows of its years.
+    """
+    raw_dir, years = _raw_window(raw_dir)
+    path = _raw_table_path(raw_dir, json_name)
+    stat = path.stat()
+    data = _read_raw_table(path, stat.st_mtime_ns, stat.st_size, tabla_id, parse_nombre)
+    if years is not None and not data.empty:
+        return data[data['anyo'].between(*years)].reset_index(drop=True)
+    return data.copy()
+
+
+def raw_table_cache_info():
+    """Hit/miss counts of the raw-table cache (functools ``CacheInfo``)."""
+    return _read_raw_table.cache_info()
 
 
 def _parse_edad(nombre_lower):
@@ -58,49 +192,37 @@ def _parse_edad(nombre_lower):
 # Chart 1 — Tasa de paro por provincia
 # ---------------------------------------------------------------------------
 
-def plot_paro_por_provincia(df, trimestre=None, save_path=None):
+def plot_paro_por_provincia(df, trimestre=None, save_path=None, render='publication'):
     """Horizontal bar chart of unemployment rate by province."""
-    period = _period_label(df)
-    mask = (
-        (df['tabla'] == 65349) &
-        (df['actividad'].str.contains('paro', case=False, na=False)) &
-        (df['sexo'] == 'Ambos sexos') &
-        (~df['es_nacional'])
-    )
-    data = df[mask].copy()
+    cube = _cube(df)
+    period = _period_label(cube.frame)
+    paro = _provincial(cube.dense.sel(indicador='tasa_paro', sexo='Ambos sexos').to_frame())
     if trimestre is None:
-        trimestre = data['trimestre'].dropna().max()
-    data = data[data['trimestre'] == trimestre].dropna(subset=['valor'])
-    data = data.sort_values('valor', ascending=True)
+        trimestre = paro.columns[paro.notna().any()].max()
+    data = paro[trimestre].dropna().sort_values(ascending=True)
 
     fig, ax = plt.subplots(figsize=(10, 14))
-    median_val = data['valor'].median()
-    colors = ['#e74c3c' if v > median_val else '#2ecc71' for v in data['valor'].values]
-    ax.barh(data['provincia'], data['valor'], color=colors)
+    median_val = data.median()
+    colors = ['#e74c3c' if v > median_val else '#2ecc71' for v in data.values]
+    ax.barh(data.index, data.values, color=colors)
     ax.set_xlabel('Tasa de paro (%)')
     ax.set_title(f'Tasa de paro por provincia — {trimestre} ({period})\n(rojo = por encima de la mediana)')
     ax.axvline(median_val, color='gray', linestyle='--', alpha=0.7, label='Mediana')
     ax.legend()
     plt.tight_layout()
-    if save_path:
-        fig.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close(fig)
+    _save(fig, save_path, render)
 
 
 # ---------------------------------------------------------------------------
 # Chart 2 — Brecha de genero en tasa de paro
 # ---------------------------------------------------------------------------
 
-def plot_brecha_genero(df, save_path=None):
+def plot_brecha_genero(df, save_path=None, render='publication'):
     """Line chart of unemployment rate by sex over time."""
-    period = _period_label(df)
-    mask = (
-        (df['tabla'] == 65349) &
-        (df['actividad'].str.contains('paro', case=False, na=False)) &
-        (df['sexo'].isin(['Hombres', 'Mujeres'])) &
-        (df['es_nacional'])
-    )
-    data = df[mask].sort_values('fecha')
+    cube = _cube(df)
+    period = _period_label(cube.frame)
+    data = cube.select(tabla=65349, indicador='tasa_paro', sexo=['Hombres', 'Mujeres'],
+                       ambito='nacional').sort_values('fecha')
 
     fig, ax = plt.subplots(figsize=(12, 5))
     for sexo, color in [('Hombres', '#3498db'), ('Mujeres', '#e74c3c')]:
@@ -112,24 +234,19 @@ def plot_brecha_genero(df, save_path=None):
     ax.legend()
     ax.grid(True, alpha=0.3)
     plt.tight_layout()
-    if save_path:
-        fig.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close(fig)
+    _save(fig, save_path, render)
 
 
 # ---------------------------------------------------------------------------
 # Chart 3 — Empleo por sector economico
 # ---------------------------------------------------------------------------
 
-def plot_empleo_por_sector(df, save_path=None):
+def plot_empleo_por_sector(df, save_path=None, render='publication'):
     """Line chart of employment by economic sector."""
-    period = _period_label(df)
-    mask = (
-        (df['tabla'] == 65354) &
-        (df['es_nacional']) &
-        (~df['actividad'].str.contains('Total', case=False, na=False))
-    )
-    data = df[mask].copy()
+    cube = _cube(df)
+    period = _period_label(cube.frame)
+    sectores = [i for i in cube.indicadores if 'total' not in i]
+    data = cube.select(tabla=65354, indicador=sectores, ambito='nacional').copy()
     data['sector'] = data['actividad'].str.replace('Ocupados - ', '', regex=False)
     data = data.sort_values('fecha')
 
@@ -146,26 +263,19 @@ def plot_empleo_por_sector(df, save_path=None):
     ax.legend()
     ax.grid(True, alpha=0.3)
     plt.tight_layout()
-    if save_path:
-        fig.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close(fig)
+    _save(fig, save_path, render)
 
 
 # ---------------------------------------------------------------------------
 # Chart 4 — Distribucion de ocupados por provincia
 # ---------------------------------------------------------------------------
 
-def plot_distribucion_ocupados(df, save_path=None):
+def plot_distribucion_ocupados(df, save_path=None, render='publication'):
     """Horizontal bar chart of average occupied population by province."""
-    period = _period_label(df)
-    mask = (
-        (df['tabla'] == 65345) &
-        (df['actividad'].str.lower() == 'ocupados') &
-        (df['sexo'] == 'Ambos sexos') &
-        (~df['es_nacional'])
-    )
-    data = df[mask].dropna(subset=['valor']).copy()
-    avg = data.groupby('provincia')['valor'].mean().sort_values(ascending=True)
+    cube = _cube(df)
+    period = _period_label(cube.frame)
+    ocupados = cube.dense.sel(indicador='ocupados', sexo='Ambos sexos').to_frame()
+    avg = _provincial(ocupados).mean(axis=1).dropna().sort_values(ascending=True)
 
     fig, ax = plt.subplots(figsize=(10, 14))
     colors = ['#2980b9' if v < avg.median() else '#e67e22' for v in avg.values]
@@ -173,25 +283,19 @@ def plot_distribucion_ocupados(df, save_path=None):
     ax.set_xlabel('Ocupados (miles, media del periodo)')
     ax.set_title(f'Distribucion media de ocupados por provincia ({period})')
     plt.tight_layout()
-    if save_path:
-        fig.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close(fig)
+    _save(fig, save_path, render)
 
 
 # ---------------------------------------------------------------------------
 # Chart 5 — Evolucion del empleo total
 # ---------------------------------------------------------------------------
 
-def plot_evolucion_empleo_total(df, save_path=None):
+def plot_evolucion_empleo_total(df, save_path=None, render='publication'):
     """Line chart of total employment evolution (national)."""
-    period = _period_label(df)
-    mask = (
-        (df['tabla'] == 65345) &
-        (df['actividad'].str.lower() == 'ocupados') &
-        (df['sexo'] == 'Ambos sexos') &
-        (df['es_nacional'])
-    )
-    data = df[mask].dropna(subset=['valor']).sort_values('fecha')
+    cube = _cube(df)
+    period = _period_label(cube.frame)
+    data = cube.select(tabla=65345, indicador='ocupados', sexo='Ambos sexos',
+                       ambito='nacional').dropna(subset=['valor']).sort_values('fecha')
 
     vmin, vmax = data['valor'].min(), data['valor'].max()
     buffer = (vmax - vmin) * 0.10
@@ -206,42 +310,43 @@ def plot_evolucion_empleo_total(df, save_path=None):
     ax.set_title(f'Evolucion del empleo total — Total Nacional ({period})')
     ax.grid(True, alpha=0.3)
     plt.tight_layout()
-    if save_path:
-        fig.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close(fig)
+    _save(fig, save_path, render)
 
 
 # ---------------------------------------------------------------------------
 # Chart 6 — Heatmap de paro por CCAA
 # ---------------------------------------------------------------------------
 
-def plot_heatmap_paro_ccaa(df, save_path=None):
-    """Heatmap of unemployment rate by CCAA and quarter."""
-    period = _period_label(df)
-    mask = (
-        (df['tabla'] == 65349) &
-        (df['actividad'].str.contains('paro', case=False, na=False)) &
-        (df['sexo'] == 'Ambos sexos') &
-        (~df['es_nacional']) &
-        (df['ccaa'] != 'Desconocida')
-    )
-    data = df[mask].dropna(subset=['valor']).copy()
-    data['valor'] = data['valor'].astype(float)
-
-    pivot = data.pivot_table(values='valor', index='ccaa', columns='trimestre', aggfunc='mean')
+def plot_heatmap_paro_ccaa(df, save_path=None, render='publication'):
+    """Heatmap of unemployment rate by CCAA and quarter: the rate of the
+    provinces that report one, weighted by their activos."""
+    cube = _cube(df)
+    period = _period_label(cube.frame)
+    # Precomputed in the rollups (src/aggregates.py)
+    paro = cube.aggregates['trimestre'].sel(indicador='tasa_paro', sexo='Ambos sexos')
+    pivot = _provincial(paro.to_frame())
+    pivot = pivot.dropna(how='all').dropna(axis=1, how='all')
     pivot = pivot.loc[pivot.mean(axis=1).sort_values(ascending=False).index]
 
     fig, ax = plt.subplots(figsize=(14, 10))
-    sns.heatmap(pivot, annot=False, cmap='RdYlGn_r', ax=ax,
-                linewidths=0.5, cbar_kws={'label': 'Tasa de paro (%)'})
-    ax.set_title(f'Tasa de paro media por CCAA y trimestre ({period})')
+    if RENDER_PROFILES[render]['simple_heatmap']:
+        # One image instead of a bordered patch per cell
+        image = ax.imshow(pivot.to_numpy(), cmap='RdYlGn_r', aspect='auto',
+                          interpolation='nearest')
+        fig.colorbar(image, ax=ax, label='Tasa de paro (%)')
+        step = max(1, len(pivot.columns) // 24)
+        ax.set_xticks(np.arange(0, len(pivot.columns), step),
+                      pivot.columns[::step])
+        ax.set_yticks(np.arange(len(pivot.index)), pivot.index)
+    else:
+        sns.heatmap(pivot, annot=False, cmap='RdYlGn_r', ax=ax,
+                    linewidths=0.5, cbar_kws={'label': 'Tasa de paro (%)'})
+    ax.set_title(f'Tasa de paro por CCAA y trimestre, ponderada por activos ({period})')
     ax.set_xlabel('Trimestre')
     ax.set_ylabel('Comunidad Autonoma')
     plt.xticks(rotation=45, ha='right')
     plt.tight_layout()
-    if save_path:
-        fig.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close(fig)
+    _save(fig, save_path, render)
 
 
 # ---------------------------------------------------------------------------
@@ -265,11 +370,10 @@ def _parse_nombre_65219(nombre):
     return {'sexo': sexo, 'edad': edad}
 
 
-def plot_paro_por_edad(raw_dir, save_path=None):
+def plot_paro_por_edad(raw_dir, save_path=None, render='publication'):
     """Grouped bar chart of unemployment rate by age group and sex (latest quarter)."""
-    raw_dir = Path(raw_dir)
-    data = _json_to_df(_load_json(raw_dir / 'epa_tasas_paro_edad_raw.json'),
-                       _parse_nombre_65219)
+    data = _load_raw_table(raw_dir, 65219, 'epa_tasas_paro_edad_raw.json',
+                           _parse_nombre_65219)
     if data.empty:
         return
 
@@ -307,20 +411,17 @@ def plot_paro_por_edad(raw_dir, save_path=None):
     ax.legend()
     ax.grid(True, alpha=0.3)
     plt.tight_layout()
-    if save_path:
-        fig.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close(fig)
+    _save(fig, save_path, render)
 
 
 # ---------------------------------------------------------------------------
 # Chart 8 — Evolucion del paro juvenil vs total (from JSON table 65219)
 # ---------------------------------------------------------------------------
 
-def plot_paro_juvenil_evolucion(raw_dir, save_path=None):
+def plot_paro_juvenil_evolucion(raw_dir, save_path=None, render='publication'):
     """Line chart of youth unemployment (16-19, 20-24) vs total over time."""
-    raw_dir = Path(raw_dir)
-    data = _json_to_df(_load_json(raw_dir / 'epa_tasas_paro_edad_raw.json'),
-                       _parse_nombre_65219)
+    data = _load_raw_table(raw_dir, 65219, 'epa_tasas_paro_edad_raw.json',
+                           _parse_nombre_65219)
     if data.empty:
         return
 
@@ -355,9 +456,7 @@ def plot_paro_juvenil_evolucion(raw_dir, save_path=None):
     ax.legend(fontsize=11)
     ax.grid(True, alpha=0.3)
     plt.tight_layout()
-    if save_path:
-        fig.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close(fig)
+    _save(fig, save_path, render)
 
 
 # ---------------------------------------------------------------------------
@@ -393,14 +492,12 @@ def _parse_nombre_nac(nombre):
     return {'sexo': 'Ambos sexos', 'edad': edad, 'nacionalidad': nac}
 
 
-def plot_paro_edad_nacionalidad(raw_dir, save_path=None):
+def plot_paro_edad_nacionalidad(raw_dir, save_path=None, render='publication'):
     """Grouped bar chart of unemployment rate by age and nationality."""
-    raw_dir = Path(raw_dir)
-    activos_json = _load_json(raw_dir / 'epa_activos_nacionalidad_edad_raw.json')
-    ocupados_json = _load_json(raw_dir / 'epa_ocupados_nacionalidad_edad_raw.json')
-
-    df_act = _json_to_df(activos_json, _parse_nombre_nac)
-    df_ocu = _json_to_df(ocupados_json, _parse_nombre_nac)
+    df_act = _load_raw_table(raw_dir, 65086, 'epa_activos_nacionalidad_edad_raw.json',
+                             _parse_nombre_nac)
+    df_ocu = _load_raw_table(raw_dir, 65112, 'epa_ocupados_nacionalidad_edad_raw.json',
+                             _parse_nombre_nac)
 
     if df_act.empty or df_ocu.empty:
         return
@@ -454,46 +551,250 @@ def plot_paro_edad_nacionalidad(raw_dir, save_path=None):
     ax.yaxis.set_major_formatter(mticker.FuncFormatter(lambda v, _: f'{v:.0f}%'))
     ax.grid(True, alpha=0.3, axis='y')
     plt.tight_layout()
-    if save_path:
-        fig.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close(fig)
+    _save(fig, save_path, render)
 
 
 # ---------------------------------------------------------------------------
 # Orchestration
 # ---------------------------------------------------------------------------
 
-def generate_all_charts(df, raw_dir, charts_dir):
-    """Generate all 9 charts and save to charts_dir."""
+# Raw files read by the JSON-based charts (7-9); the Parquet copy is preferred
+RAW_CHART_FILES = [
+    RAW_TABLES_PATH.name,
+    'epa_tasas_paro_edad_raw.json',
+    'epa_activos_nacionalidad_edad_raw.json',
+    'epa_ocupados_nacionalidad_edad_raw.json',
+]
+
+
+def chart_inputs(raw_dir):
+    """Raw files in *raw_dir* that the charts may read."""
+    return [Path(raw_dir) / name for name in RAW_CHART_FILES
+            if (Path(raw_dir) / name).exists()]
+
+
+CHARTS = [
+    ("01_tasa_paro_por_provincia.png", plot_paro_por_provincia, 'df'),
+    ("02_brecha_genero_paro.png", plot_brecha_genero, 'df'),
+    ("03_empleo_por_sector.png", plot_empleo_por_sector, 'df'),
+    ("04_distribucion_ocupados.png", plot_distribucion_ocupados, 'df'),
+    ("05_evolucion_empleo_total.png", plot_evolucion_empleo_total, 'df'),
+    ("06_heatmap_paro_ccaa.png", plot_heatmap_paro_ccaa, 'df'),
+    ("07_paro_por_edad.png", plot_paro_por_edad, 'raw'),
+    ("08_paro_juvenil_evolucion.png", plot_paro_juvenil_evolucion, 'raw'),
+    ("09_paro_edad_nacionalidad.png", plot_paro_edad_nacionalidad, 'raw'),
+]
+
+# The input slice of each chart: what it reads from the EpaCube ('df'
+# charts) or the raw table(s) it reads from raw_dir ('raw' charts)
+CHART_INPUTS = {
+    "01_tasa_paro_por_provincia.png":
+        lambda cube: cube.dense.sel(indicador='tasa_paro', sexo='Ambos sexos'),
+    "02_brecha_genero_paro.png":
+        lambda cube: cube.select(tabla=65349, indicador='tasa_paro', sexo=['Hombres', 'Mujeres'],
+                                 ambito='nacional')[['fecha', 'sexo', 'valor']],
+    "03_empleo_por_sector.png":
+        lambda cube: cube.select(tabla=65354, ambito='nacional',
+                                 indicador=[i for i in cube.indicadores if 'total' not in i]
+                                 )[['fecha', 'actividad', 'valor']],
+    "04_distribucion_ocupados.png":
+        lambda cube: cube.dense.sel(indicador='ocupados', sexo='Ambos sexos'),
+    "05_evolucion_empleo_total.png":
+        lambda cube: cube.select(tabla=65345, indicador='ocupados', sexo='Ambos sexos',
+                                 ambito='nacional')[['fecha', 'valor']],
+    "06_heatmap_paro_ccaa.png":
+        lambda cube: cube.aggregates['trimestre'].sel(indicador='tasa_paro', sexo='Ambos sexos'),
+    "07_paro_por_edad.png":
+        lambda raw_dir: _raw_table_slice(raw_dir, 65219, 'epa_tasas_paro_edad_raw.json'),
+    "08_paro_juvenil_evolucion.png":
+        lambda raw_dir: _raw_table_slice(raw_dir, 65219, 'epa_tasas_paro_edad_raw.json'),
+    "09_paro_edad_nacionalidad.png":
+        lambda raw_dir: (
+            _raw_table_slice(raw_dir, 65086, 'epa_activos_nacionalidad_edad_raw.json'),
+            _raw_table_slice(raw_dir, 65112, 'epa_ocupados_nacionalidad_edad_raw.json')),
+}
+
+# Library versions that change the rendered charts without changing code or data
+RENDER_PARAMS = {'matplotlib': matplotlib.__version__, 'seaborn': sns.__version__}
+
+# Digest of each chart's inputs last rendered into a charts directory
+MANIFEST = 'manifest.json'
+
+
+def _raw_table_slice(raw_dir, tabla_id, json_name):
+    """The rows of one extra INE table (its whole file when JSON), and the
+    years of the window if *raw_dir* is a RawWindow."""
+    raw_dir, years = _raw_window(raw_dir)
+    path = _raw_table_path(raw_dir, json_name)
+    if path.suffix != '.parquet':
+        return years, file_digest(path)
+    return years, load_parquet(path, tabla=tabla_id,
+                               columns=['serie_nombre', 'fecha_ms', 'anyo', 'valor'])
+
+
+def _digest(*parts) -> str:
+    """SHA-256 of frames, labelled arrays and plain values."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, tuple):
+            h.update(_digest(*part).encode())
+        elif isinstance(part, LabelledArray):
+            h.update(np.ascontiguousarray(part.values).tobytes())
+            h.update(repr({dim: labels.tolist() for dim, labels in part.coords.items()}).encode())
+        elif isinstance(part, pd.DataFrame):
+            h.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+            h.update(repr(part.columns.tolist()).encode())
+        else:
+            h.update(repr(part).encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def _code_versions():
+    """Code version of each chart: its plot function plus the code shared
+    by all of them (the rest of this module and the data modules)."""
+    shared = Path(__file__).read_text(encoding='utf-8')
+    plots = {filename: inspect.getsource(plot_fn) for filename, plot_fn, _ in CHARTS}
+    for source in plots.values():
+        shared = shared.replace(source, '')
+    shared += code_digest(src.query, src.dense, src.aggregates, src.io)
+    return {filename: _digest(shared, source) for filename, source in plots.items()}
+
+
+def chart_digests(df, raw_dir, render='publication', fmt='png') -> dict[str, str | None]:
+    """Digest of each chart's input slice, code version and render params
+    (the *render* profile and output *fmt*), by CHARTS filename.
+
+    A chart whose digest is unchanged would be drawn identically.  None
+    where the slice cannot be read (the chart is then always rendered).
+    """
+    cube = _cube(df)
+    code = _code_versions()
+    digests = {}
+    for filename, _, source in CHARTS:
+        try:
+            if source == 'df':
+                data = (_period_label(cube.frame), CHART_INPUTS[filename](cube))
+            else:
+                data = CHART_INPUTS[filename](raw_dir)
+        except Exception:
+            digests[filename] = None
+            continue
+        digests[filename] = _digest(code[filename], RENDER_PARAMS, RENDER_PROFILES[render],
+                                    fmt, data)
+    return digests
+
+
+def _read_manifest(charts_dir) -> dict[str, str]:
+    try:
+        return json.loads((Path(charts_dir) / MANIFEST).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+# Inputs shared with chart worker processes (set once per worker)
+_SHARED = {}
+
+
+def _init_worker(df, raw_dir, profile=None, render='publication', fmt='png'):
+    _SHARED['df'] = df
+    _SHARED['raw'] = raw_dir
+    _SHARED['profile'] = profile
+    _SHARED['render'] = render
+    _SHARED['fmt'] = fmt
+
+
+def _render_chart(index, charts_dir):
+    """Render CHARTS[index] from the shared inputs (and render settings).
+
+    Returns (error message or None, profiled stages or None).  The chart is
+    a stage of the active profiler; in a worker of a profiled run it gets a
+    profiler of its own, whose stages the caller merges into its own.
+    """
+    filename, plot_fn, source = CHARTS[index]
+    profiler = (profiling.Profiler(memory=_SHARED['profile'])
+                if _SHARED.get('profile') is not None else None)
+    error = None
+    with profiler.activate() if profiler else nullcontext():
+        with profiling.stage(Path(filename).stem):
+            try:
+                plot_fn(_SHARED[source], render=_SHARED['render'],
+                        save_path=Path(charts_dir) / chart_filename(filename, _SHARED['fmt']))
+            except Exception as exc:
+                error = str(exc)
+    return error, profiler.stages if profiler else None
+
+
+def generate_all_charts(df, raw_dir, charts_dir, workers=1, dense=None, aggregates=None,
+                        reuse=True, render='publication', fmt='png', years=None):
+    """Generate all 9 charts and save to charts_dir.
+
+    *df* is indexed once (EpaCube) for all charts; *dense* is its dense
+    cube, e.g. memory-mapped with dense.load_dense, and *aggregates* its
+    rollups, e.g. from aggregates.load_aggregates (both built from *df* if
+    None).  With ``workers > 1`` the charts are rendered by a process pool:
+    the cube is handed to each worker once (inherited without copying under
+    fork) and the raw-table charts only receive *raw_dir*.
+
+    *render* is a RENDER_PROFILES name and *fmt* one of FORMATS.  *years*
+    ``(start, end)`` restricts the raw-table charts to those years (the
+    df charts plot whatever period *df* covers).  With
+    *reuse*, a chart whose file exists and whose digest (see
+    chart_digests) matches the one in charts_dir's MANIFEST is kept as is.
+    Returns the filenames of the charts that failed (empty if all succeeded).
+    """
     charts_dir = Path(charts_dir)
     charts_dir.mkdir(parents=True, exist_ok=True)
-    raw_dir = Path(raw_dir)
-
-    charts = [
-        ("01_tasa_paro_por_provincia.png",
-         lambda p: plot_paro_por_provincia(df, save_path=p)),
-        ("02_brecha_genero_paro.png",
-         lambda p: plot_brecha_genero(df, save_path=p)),
-        ("03_empleo_por_sector.png",
-         lambda p: plot_empleo_por_sector(df, save_path=p)),
-        ("04_distribucion_ocupados.png",
-         lambda p: plot_distribucion_ocupados(df, save_path=p)),
-        ("05_evolucion_empleo_total.png",
-         lambda p: plot_evolucion_empleo_total(df, save_path=p)),
-        ("06_heatmap_paro_ccaa.png",
-         lambda p: plot_heatmap_paro_ccaa(df, save_path=p)),
-        ("07_paro_por_edad.png",
-         lambda p: plot_paro_por_edad(raw_dir, save_path=p)),
-        ("08_paro_juvenil_evolucion.png",
-         lambda p: plot_paro_juvenil_evolucion(raw_dir, save_path=p)),
-        ("09_paro_edad_nacionalidad.png",
-         lambda p: plot_paro_edad_nacionalidad(raw_dir, save_path=p)),
-    ]
-
-    for filename, plot_fn in charts:
-        path = charts_dir / filename
-        try:
-            plot_fn(path)
+    raw_dir = RawWindow(Path(raw_dir), *years) if years else Path(raw_dir)
+    cube = _cube(df, dense, aggregates)
+    # In a profiled run, pool workers measure their charts themselves
+    profiler = profiling.current()
+    profile = profiler.memory if profiler is not None else None
+
+    names = [chart_filename(filename, fmt) for filename, _, _ in CHARTS]
+    # Only the charts of the previous run (its MANIFEST) are ours to remove,
+    # e.g. the .png files after switching to another format
+    previous = _read_manifest(charts_dir)
+    for filename in previous.keys() - set(names):
+        (charts_dir / Path(filename).name).unlink(missing_ok=True)
+    digests = dict(zip(names, chart_digests(cube, raw_dir, render, fmt).values()))
+    manifest = previous if reuse else {}
+    indices = [i for i, filename in enumerate(names)
+               if digests[filename] is None or manifest.get(filename) != digests[filename]
+               or not (charts_dir / filename).exists()]
+    for i in indices:
+        (charts_dir / names[i]).unlink(missing_ok=True)
+
+    if workers > 1 and len(indices) > 1:
+        cube.aggregates  # build them (if needed) once, before forking the workers
+        ctx = mp.get_context('fork' if sys.platform == 'linux' else 'spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(indices)), mp_context=ctx,
+                                 initializer=_init_worker,
+                                 initargs=(cube, raw_dir, profile, render, fmt)) as pool:
+            results = list(pool.map(_render_chart, indices, [charts_dir] * len(indices)))
+    else:
+        _init_worker(cube, raw_dir, render=render, fmt=fmt)
+        results = [_render_chart(i, charts_dir) for i in indices]
+        _SHARED.clear()
+    results = dict(zip(indices, results))
+
+    failed = []
+    for i, filename in enumerate(names):
+        if i not in results:
+            print(f"  =  {filename} (sin cambios)")
+            continue
+        error, stages = results[i]
+        if stages:
+            profiling.add_stages(stages)
+        if error is None:
             print(f"  -> {filename}")
-        except Exception as exc:
-            print(f"  !! {filename} fallo: {exc}")
+        else:
+            print(f"  !! {filename} fallo: {error}")
+            failed.append(filename)
+
+    # Charts without a digest are listed too (a None digest is never
+    # reused), so that a later run can still remove them
+    manifest = {filename: digests[filename] for filename in names
+                if filename not in failed and (charts_dir / filename).exists()}
+    (charts_dir / MANIFEST).write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    return failed
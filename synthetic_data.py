@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+synthetic_data.py — Genera datos sinteticos de la EPA con el formato del INE.
+
+Produce los mismos ficheros que fetch_data.py (JSON crudo por tabla, CSV
+raw y dirty, Parquet) sin acceso a la red, de forma determinista (--seed)
+y a cualquier escala: --scale N repite N veces las 52 provincias de las
+tablas principales como "Albacete (2)", ... (x1 = volumen real, x10, x100;
+las tablas adicionales son solo nacionales y no cambian).  Los nombres de las
+series siguen las convenciones de cada tabla, de modo que los parsers de
+src/cleaning.py y src/viz.py los interpretan como los reales, y el CSV
+sucio usa los mismos patrones que fetch_data.make_dirty.
+
+Uso:
+    python synthetic_data.py                       # x1 en data/synthetic/x1
+    python synthetic_data.py --scale 10
+    python synthetic_data.py --scale 100 -o /tmp/epa_x100
+"""
+
+import argparse
+import json
+import shutil
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from fetch_data import EXTRA_TABLES, MAIN_TABLES, flatten_table_json, write_outputs
+from src.cleaning import PROVINCIA_FIXES
+from src.config import SYNTHETIC_DIR
+from src.io import iter_json_series, write_json_series
+
+# ---------------------------------------------------------------------------
+# Series catalogue (names as published by INE)
+# ---------------------------------------------------------------------------
+
+PROVINCIAS = [p for p in PROVINCIA_FIXES.values() if p != "Total Nacional"]
+SEXOS = {"Ambos sexos": 1.0, "Hombres": 0.52, "Mujeres": 0.48}
+ACTIVIDADES = {"Activos": 0.58, "Ocupados": 0.50, "Parados": 0.08,
+               "Inactivos": 0.42, "Total": 1.0}
+TASAS = {"Tasa de actividad": 58.0, "Tasa de paro de la población": 15.0,
+         "Tasa de empleo de la población": 50.0}
+SECTORES = {"Total CNAE": 1.0, "Agricultura": 0.04, "Industria": 0.14,
+            "Construcción": 0.07, "Servicios": 0.75}
+EDADES = {"De 16 a 19 años": (0.01, 45.0), "De 20 a 24 años": (0.06, 28.0),
+          "De 25 a 54 años": (0.75, 13.0), "55 y más años": (0.18, 11.0),
+          "16 y más años": (1.0, 15.0)}
+NACIONALIDADES = {"Total": (1.0, 1.0), "Española": (0.85, 0.9),
+                  "Extranjera: Total": (0.13, 1.6),
+                  "Extranjera: Unión Europea": (0.04, 1.3),
+                  "Doble nacionalidad": (0.02, 1.2)}
+
+# First COD of each table, as in the real API (replicas: EPA<tabla><r><i>)
+COD_BASE = {65345: 100001, 65349: 100796, 65354: 101273,
+            65219: 101538, 65086: 101553, 65112: 101628}
+
+# Tables drawn from another table's noise, so that the unemployment rate
+# derived from activos and ocupados (chart 9) stays plausible
+SHARED_NOISE = {65112: 65086}
+
+NULL_RATE = 0.002
+
+# Generation parameters, written next to the data by generate()
+MANIFEST = "synthetic.json"
+
+
+def _catalogue(tabla_id: int, places: list[str], pop: dict[str, float],
+               paro: dict[str, float]) -> list[tuple[str, float, float]]:
+    """(Nombre, base level, elasticity to the business cycle) per series.
+
+    *places* are the 'Total Nacional' and/or province names to generate,
+    *pop* their 16+ population (thousands) and *paro* a relative
+    unemployment factor.  The national-only tables ignore *places*.
+    """
+    out = []
+    if tabla_id == 65345:
+        for act, share in ACTIVIDADES.items():
+            elasticity = {"Ocupados": 1.0, "Parados": -3.0}.get(act, 0.2)
+            for sexo, sex_share in SEXOS.items():
+                for place in places:
+                    nombre = (f"Total Nacional. {sexo}. " if place == "Total Nacional"
+                              else f"{sexo}. {place}. ")
+                    level = pop[place] * sex_share * share
+                    if act == "Parados":
+                        level *= paro[place]
+                    out.append((f"{nombre}16 y más años. {act}. Personas. ",
+                                level, elasticity))
+    elif tabla_id == 65349:
+        for tasa, rate in TASAS.items():
+            is_paro = "paro" in tasa
+            for sexo in SEXOS:
+                for place in places:
+                    nombre = (f"{tasa}. {sexo}. Total Nacional. Total. "
+                              if place == "Total Nacional"
+                              else f"{tasa}. {place}. {sexo}. Total. ")
+                    level = rate * paro[place] if is_paro else rate
+                    out.append((nombre, level, -3.0 if is_paro else 0.5))
+    elif tabla_id == 65354:
+        for sector, share in SECTORES.items():
+            for place in places:
+                out.append((f"{place}. Ocupados. Ambos sexos. {sector}. Personas. ",
+                            pop[place] * 0.5 * share,
+                            2.0 if sector == "Construcción" else 1.0))
+    elif tabla_id == 65219:
+        for sexo in SEXOS:
+            for edad, (_, rate) in EDADES.items():
+                out.append((f"Total Nacional. Tasa de paro de la población. "
+                            f"{sexo}. {edad}. ", rate, -3.0))
+    elif tabla_id in (65086, 65112):
+        kind = "Activos" if tabla_id == 65086 else "Ocupados"
+        for sexo, sex_share in SEXOS.items():
+            for edad, (age_share, rate) in EDADES.items():
+                for nac, (nac_share, nac_paro) in NACIONALIDADES.items():
+                    level = pop["Total Nacional"] * 0.58 * sex_share * age_share * nac_share
+                    if kind == "Ocupados":
+                        level *= 1 - rate * nac_paro / 100
+                    out.append((f"Total Nacional. {kind}. {sexo}. {edad}. {nac}. "
+                                f"Personas. ", level, 0.3 if kind == "Ocupados" else 0.2))
+    else:
+        raise ValueError(f"Tabla sin catalogo sintetico: {tabla_id}")
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Generation
+# ---------------------------------------------------------------------------
+
+
+def _quarters(start_year: int, end_year: int) -> pd.DataFrame:
+    """Quarters of [start_year, end_year], newest first, as INE lists them."""
+    rows = []
+    for year in range(end_year, start_year - 1, -1):
+        for quarter in (4, 3, 2, 1):
+            start = pd.Timestamp(year, 3 * quarter - 2, 1, tz="Europe/Madrid")
+            rows.append((start.value // 10**6, 19 + quarter % 4, year))
+    return pd.DataFrame(rows, columns=["fecha", "periodo", "anyo"])
+
+
+def synthetic_series(tabla_id: int, scale: int = 1, start_year: int = 2002,
+                     end_year: int = 2025, seed: int = 42) -> Iterator[dict]:
+    """Yield the INE series of *tabla_id* at *scale* times the real volume.
+
+    Replica r > 0 of the provincial tables adds the 52 provinces again as
+    'Albacete (r+1)', ..., so every series keeps distinct attributes; the
+    national-only tables are not replicated.  Every series follows a
+    shared business cycle (from *seed*) scaled by its elasticity, plus its
+    own random walk.  Replica r is drawn from its own stream, so an x10
+    dataset contains the x1 one.
+    """
+    quarters = _quarters(start_year, end_year)
+    n = len(quarters)
+    base = np.random.default_rng(seed)
+    sizes = base.lognormal(np.log(300), 0.8, len(PROVINCIAS))
+    pop = {"Total Nacional": sizes.sum(), **dict(zip(PROVINCIAS, sizes))}
+    paro = {"Total Nacional": 1.0,
+            **dict(zip(PROVINCIAS, base.uniform(0.6, 1.6, len(PROVINCIAS))))}
+    # Walks run oldest to newest and are flipped to INE's newest-first order
+    cycle = np.exp(np.cumsum(base.normal(0, 0.015, n)))[::-1]
+
+    fechas = quarters["fecha"].tolist()
+    periodos = quarters["periodo"].tolist()
+    anyos = quarters["anyo"].tolist()
+    for replica in range(scale if tabla_id in MAIN_TABLES else 1):
+        if replica == 0:
+            places = ["Total Nacional", *PROVINCIAS]
+        else:
+            places = [f"{prov} ({replica + 1})" for prov in PROVINCIAS]
+            for prov, place in zip(PROVINCIAS, places):
+                pop[place], paro[place] = pop[prov], paro[prov]
+        catalogue = _catalogue(tabla_id, places, pop, paro)
+
+        rng = np.random.default_rng([seed, SHARED_NOISE.get(tabla_id, tabla_id), replica])
+        noise = np.exp(np.cumsum(rng.normal(0, 0.01, (len(catalogue), n)), axis=1))[:, ::-1]
+        missing = rng.random((len(catalogue), n)) < NULL_RATE
+        for i, (nombre, level, elasticity) in enumerate(catalogue):
+            valores = np.round(level * cycle ** elasticity * noise[i], 2).tolist()
+            for j in np.flatnonzero(missing[i]):
+                valores[j] = None
+            cod = (COD_BASE[tabla_id] + i if replica == 0
+                   else f"{tabla_id}{replica:03d}{i:04d}")
+            yield {
+                "COD": f"EPA{cod}",
+                "Nombre": nombre,
+                "FK_Unidad": 3,
+                "FK_Escala": 4,
+                "Data": [{"Fecha": f, "FK_TipoDato": 1, "FK_Periodo": p,
+                          "Anyo": a, "Valor": v, "Secreto": False}
+                         for f, p, a, v in zip(fechas, periodos, anyos, valores)],
+            }
+
+
+def generate(output_dir: Path, scale: int = 1, start_year: int = 2002,
+             end_year: int = 2025, seed: int = 42, create_dirty: bool = True,
+             fmt: str = "both") -> None:
+    """Write a synthetic copy of what fetch_all writes into *output_dir*.
+
+    Series are streamed to the JSON files and read back one at a time, so
+    only the flattened tables are held in memory.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    print(f"Generando datos sinteticos x{scale} ({start_year}–{end_year}, "
+          f"seed {seed}) en {output_dir}")
+
+    frames: dict[int, pd.DataFrame] = {}
+    for tabla_id, meta in {**MAIN_TABLES, **EXTRA_TABLES}.items():
+        json_path = output_dir / f"{meta['name']}_raw.json"
+        n_series = write_json_series(
+            json_path, synthetic_series(tabla_id, scale, start_year, end_year, seed))
+        frames[tabla_id] = flatten_table_json(tabla_id, iter_json_series(json_path))
+        print(f"  [{tabla_id}] -> {json_path.name}  ({n_series} series, "
+              f"{len(frames[tabla_id]):,} data points)")
+
+    write_outputs(frames, output_dir, create_dirty=create_dirty, fmt=fmt)
+    params = {"scale": scale, "start_year": start_year, "end_year": end_year,
+              "seed": seed, "create_dirty": create_dirty, "fmt": fmt}
+    (output_dir / MANIFEST).write_text(json.dumps(params))
+
+
+def ensure_synthetic(scale: int = 1, root: Path = SYNTHETIC_DIR, **params) -> Path:
+    """Directory with the synthetic dataset x*scale*, generated on first use.
+
+    The dataset is regenerated when *params* (see generate) differ from
+    the ones recorded in its MANIFEST by the run that wrote it.
+    """
+    output_dir = Path(root) / f"x{scale}"
+    manifest = output_dir / MANIFEST
+    if manifest.exists():
+        recorded = json.loads(manifest.read_text())
+        if all(recorded.get(k) == v for k, v in {"scale": scale, **params}.items()):
+            return output_dir
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    generate(output_dir, scale=scale, **params)
+    return output_dir
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(
+        description="Genera datos sinteticos de la EPA con el formato del INE.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    p.add_argument("--scale", type=int, default=1,
+                   help="Multiplicador del volumen real (default: 1)")
+    p.add_argument("-s", "--start", type=int, default=2002,
+                   help="Ano de inicio (default: 2002)")
+    p.add_argument("-e", "--end", type=int, default=2025,
+                   help="Ano de fin (default: 2025)")
+    p.add_argument("--seed", type=int, default=42,
+                   help="Semilla (default: 42)")
+    p.add_argument("-o", "--output-dir", type=Path, default=None,
+                   help="Directorio de salida (default: data/synthetic/x<scale>)")
+    p.add_argument("--format", choices=("csv", "parquet", "both"), default="both",
+                   help="Formato de los ficheros tabulares (default: both)")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    generate(args.output_dir or SYNTHETIC_DIR / f"x{args.scale}", scale=args.scale,
+             start_year=args.start, end_year=args.end, seed=args.seed,
+             fmt=args.format)
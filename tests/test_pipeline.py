@@ -1,8 +1,16 @@
 """Basic tests for the EPA pipeline modules."""
 
+import hashlib
+import json
+import subprocess
 import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -10,11 +18,124 @@ import pytest
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 
-from src.config import ROOT as CFG_ROOT, DATA_RAW, DATA_PROCESSED, RAW_PATH
-from src.io import load_csv
-from src.cleaning import clean
+import benchmark
+import fetch_data
+import synthetic_data
+from src.cache import StageCache, stage_key
+from src.config import (ROOT as CFG_ROOT, DATA_RAW, DATA_PROCESSED, OUT_PARQUET_PATH,
+                        RAW_PATH)
+from src.io import (SQLITE_INDEXES, SQLITE_KEY, flatten_series, iter_json_series, load_csv,
+                    load_parquet, load_processed, load_sqlite, save_parquet, save_sqlite, sqlite_source,
+                    write_json_series)
+from src.cleaning import clean, parse_fecha, parse_fechas, parse_series
+from src.aggregates import load_aggregates, rollup, save_aggregates
+from src.dense import DenseBuilder, build_dense, load_dense, save_dense
 from src.features import build_features
+from src.periods import run_periods, window_name
+from src.profiling import Profiler, stage
+from src.query import EpaCube, indicador_code
+from src.schema import FEATURES_SCHEMA, check_schema
+from src.star import StarBuilder, build_star, load_star, save_star
+from src.streaming import KeyIndex, run_streaming
 from src.utils import assert_columns, validate_clean
+from src import profiling, viz
+from src.viz import CHARTS, generate_all_charts
+
+# Without downloaded INE data the suite runs on the synthetic x1 dataset
+if not RAW_PATH.exists():
+    DATA_RAW = synthetic_data.ensure_synthetic(1)
+    RAW_PATH = DATA_RAW / RAW_PATH.name
+
+
+# ---------------------------------------------------------------------------
+# Local stand-in for the INE DATOS_TABLA API
+# ---------------------------------------------------------------------------
+
+QUARTERS = [(2020, 1), (2020, 2), (2020, 3), (2020, 4), (2021, 1), (2021, 2)]
+
+
+def _ine_point(year, quarter, valor):
+    """A data point as INE returns it: Fecha = quarter start, Madrid time."""
+    start = pd.Timestamp(year, 3 * quarter - 2, 1, tz='Europe/Madrid')
+    return {'Fecha': start.value // 10**6, 'FK_Periodo': 19 + quarter % 4,
+            'Anyo': year, 'Valor': valor, 'Secreto': False}
+
+
+def _ine_series(tabla_id, n_series=3):
+    return [{'COD': f'EPA{tabla_id}{i}', 'Nombre': f'Serie {i}. Total Nacional. ',
+             'Data': [_ine_point(y, q, 10.5 + i + q) for y, q in reversed(QUARTERS)]}
+            for i in range(n_series)]
+
+
+class FakeINE:
+    """Serve canned DATA_TABLA JSON per table id, with latency and errors."""
+
+    def __init__(self, latency=0.0, fail_first=(), etag=False):
+        self.latency = latency
+        self.fail_first = set(fail_first)   # tables whose 1st request is a 503
+        self.etag = etag                    # send ETags and answer 304
+        self.tables = {t: _ine_series(t) for t in
+                       (*fetch_data.MAIN_TABLES, *fetch_data.EXTRA_TABLES)}
+        self.requests = []
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def window(self, tabla_id, start, end):
+        """Series of *tabla_id* with only the points dated in [start, end]."""
+        def day(ms):
+            return pd.Timestamp(ms, unit='ms', tz='UTC').tz_convert(
+                'Europe/Madrid').strftime('%Y%m%d')
+        return [{**serie, 'Data': [dp for dp in serie['Data']
+                                   if start <= day(dp['Fecha']) <= end]}
+                for serie in self.tables[tabla_id]]
+
+    def handler(self):
+        ine = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path, _, query = self.path.partition('?')
+                tabla_id = int(path.rsplit('/', 1)[1])
+                start, end = query.removeprefix('date=').split(':')
+                with ine.lock:
+                    ine.requests.append(tabla_id)
+                    ine.queries.append(query)
+                    fail = tabla_id in ine.fail_first
+                    ine.fail_first.discard(tabla_id)
+                time.sleep(ine.latency)
+                if fail:
+                    self.send_error(503)
+                    return
+                body = json.dumps(ine.window(tabla_id, start, end)).encode()
+                etag = f'"{hash(body)}"'
+                if ine.etag and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                if ine.etag:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def fake_ine(monkeypatch):
+    ine = FakeINE()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ine.handler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(fetch_data, 'BASE_URL',
+                        f'http://127.0.0.1:{server.server_port}/DATOS_TABLA')
+    yield ine
+    server.shutdown()
+    server.server_close()
 
 
 # ---------------------------------------------------------------------------
@@ -29,6 +150,174 @@ def test_config_paths_exist():
     assert RAW_PATH.exists(), f"RAW_PATH {RAW_PATH} does not exist"
 
 
+# ---------------------------------------------------------------------------
+# fetch_data.py
+# ---------------------------------------------------------------------------
+
+def test_fetch_tables_concurrent_with_retry(fake_ine):
+    """Tables download in parallel, in order, and a 503 is retried."""
+    fake_ine.latency = 0.3
+    fake_ine.fail_first = {65349}
+    ids = list(fake_ine.tables)
+    t0 = time.perf_counter()
+    got = dict(fetch_data.fetch_tables(ids, 2020, 2021, max_workers=6, rate=100,
+                                       backoff=0.1))
+    elapsed = time.perf_counter() - t0
+    assert list(got) == ids
+    assert got == fake_ine.tables
+    assert fake_ine.requests.count(65349) == 2
+    assert elapsed < 0.3 * len(ids)  # sequential would be >= 7 x latency
+
+
+def test_response_cache_ttl_revalidation_and_offline(fake_ine, tmp_path):
+    """Fresh entries skip the network; stale ones revalidate; offline never asks."""
+    url = fetch_data.build_url(65345, 2020, 2021)
+    cache = fetch_data.ResponseCache(tmp_path, ttl=3600)
+    first = fetch_data.fetch_table(65345, 2020, 2021, cache=cache)
+    assert fetch_data.fetch_table(65345, 2020, 2021, cache=cache) == first
+    assert len(fake_ine.requests) == 1
+
+    # Stale, server without validators: full download, detected by hash
+    cache.ttl = 0
+    assert fetch_data.fetch_table(65345, 2020, 2021, cache=cache) == first
+    assert cache.validators(url) == {}
+    assert len(fake_ine.requests) == 2
+
+    # Stale, server with ETags: conditional request answered with 304
+    fake_ine.etag = True
+    fetch_data.fetch_table(65345, 2020, 2021, cache=cache)
+    assert 'If-None-Match' in cache.validators(url)
+    assert fetch_data.fetch_table(65345, 2020, 2021, cache=cache) == first
+    assert len(fake_ine.requests) == 4
+
+    offline = fetch_data.ResponseCache(tmp_path, ttl=0, offline=True)
+    assert fetch_data.fetch_table(65345, 2020, 2021, cache=offline) == first
+    with pytest.raises(RuntimeError, match='offline'):
+        fetch_data.fetch_table(65349, 2020, 2021, cache=offline)
+    assert len(fake_ine.requests) == 4
+
+
+def test_fetch_all_incremental_requests_only_new_quarter(fake_ine, tmp_path):
+    """An incremental fetch asks for the new quarter only and merges it."""
+    full = {t: fake_ine.window(t, '20200101', '20211231') for t in fake_ine.tables}
+    for serie_list in fake_ine.tables.values():   # 2021T2 not yet published
+        for serie in serie_list:
+            serie['Data'] = serie['Data'][1:]
+    fetch_data.fetch_all(2020, 2021, tmp_path, create_dirty=False, fmt='csv')
+    rows_before = len(pd.read_csv(tmp_path / 'epa_mercado_laboral_raw.csv'))
+
+    fake_ine.tables = {t: [dict(s) for s in series] for t, series in full.items()}
+    fake_ine.tables[65345].append({'COD': 'EPA_NEW', 'Nombre': 'Nueva serie',
+                                   'Data': [_ine_point(2021, 2, 1.0)]})
+    fake_ine.queries.clear()
+    fetch_data.fetch_all(2020, 2021, tmp_path, create_dirty=False, fmt='csv',
+                         incremental=True)
+
+    assert fake_ine.queries == ['date=20210102:20211231'] * len(full)
+    for tabla_id, meta in fetch_data.EXTRA_TABLES.items():
+        stored = json.loads((tmp_path / f"{meta['name']}_raw.json").read_text())
+        assert stored == full[tabla_id]
+    raw = pd.read_csv(tmp_path / 'epa_mercado_laboral_raw.csv')
+    assert len(raw) == rows_before + 3 * len(fetch_data.MAIN_TABLES) + 1
+
+
+def test_token_bucket_limits_rate():
+    """After the initial burst, tokens are handed out at *rate* per second."""
+    bucket = fetch_data.TokenBucket(rate=20, burst=2)
+    t0 = time.perf_counter()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.perf_counter() - t0 >= 4 / 20 * 0.9
+
+
+def _raw_frame(n=400):
+    """Flattened raw rows (as flatten_table_json gives) with one missing
+    fecha_ms and one missing valor."""
+    i = np.arange(n)
+    fecha = (pd.Timestamp('2002-01-01').value // 10**6 + i * 7_776_000_000).astype(float)
+    fecha[5] = np.nan
+    valor = np.round(i * 0.37, 2)
+    valor[7] = np.nan
+    return pd.DataFrame({'tabla': 65349, 'serie_cod': [f'EPA{k % 9}' for k in i],
+                         'serie_nombre': [f'Serie {k % 9}. Total Nacional.' for k in i],
+                         'anyo': 2002 + i // 4, 'periodo_id': 19 + i % 4, 'valor': valor,
+                         'secreto': False, 'fecha_ms': fecha})
+
+
+def test_make_dirty_compat_is_byte_identical():
+    """compat=True reproduces the seeded output of the row-by-row version."""
+    dirty = fetch_data.make_dirty(_raw_frame(), seed=7, compat=True)
+    digest = hashlib.sha256(dirty.to_csv(index=False).encode()).hexdigest()
+    assert digest == '270709e6d3a2179bd1c81ed8527d00a75a8ecdad55193a2c08f1269a223ab8c4'
+
+
+def test_make_dirty_fast_injects_the_same_issues():
+    """The vectorized default is deterministic and dirties like compat mode."""
+    raw = _raw_frame()
+    fast = fetch_data.make_dirty(raw, seed=7)
+    compat = fetch_data.make_dirty(raw, seed=7, compat=True)
+    pd.testing.assert_frame_equal(fast, fetch_data.make_dirty(raw, seed=7))
+    assert list(fast.columns) == list(compat.columns)
+    assert len(fast) == len(compat) == len(raw) + 20
+    assert len(fast.drop_duplicates()) == len(raw)
+    # Same date strings (format cycled by row), same share of each issue
+    assert set(fast['Fecha ']) == set(compat['Fecha '])
+    n = len(raw)
+    for issue, k in ((fast[' Valor'] == '', int(n * 0.03)),
+                     (fast['Serie Nombre'].str.isupper(), int(n * 0.05))):
+        assert k <= issue.sum() <= k + 20
+    assert int(n * 0.10) - int(n * 0.03) - 1 <= fast[' Valor'].str.contains(',').sum()
+
+# ---------------------------------------------------------------------------
+# synthetic_data.py / benchmark.py
+# ---------------------------------------------------------------------------
+
+def test_synthetic_series_deterministic_and_scalable():
+    """Same seed, same series; a larger scale only appends provinces."""
+    years = dict(start_year=2024, end_year=2025)
+    x1 = list(synthetic_data.synthetic_series(65349, **years))
+    assert len(x1) == 477 and len(x1[0]['Data']) == 8
+    assert x1 == list(synthetic_data.synthetic_series(65349, **years))
+    assert x1 != list(synthetic_data.synthetic_series(65349, seed=7, **years))
+
+    x3 = list(synthetic_data.synthetic_series(65349, scale=3, **years))
+    assert x3[:len(x1)] == x1
+    assert len(x3) == len(x1) + 2 * 9 * 52
+    assert len({s['COD'] for s in x3}) == len(x3)
+    assert len(list(synthetic_data.synthetic_series(65219, scale=3, **years))) == 15
+
+
+def test_synthetic_dataset_cleans_like_real_data(tmp_path):
+    """The dirty synthetic CSV goes through clean() with every name parsed."""
+    synthetic_data.generate(tmp_path, scale=2, start_year=2024, end_year=2025, fmt='csv')
+    raw = load_csv(tmp_path / 'epa_mercado_laboral_raw.csv')
+    dirty = load_csv(tmp_path / RAW_PATH.name)
+    assert len(dirty) == len(raw) + 20
+    assert raw.groupby('serie_cod')['tabla'].nunique().max() == 1
+
+    df = clean(dirty)
+    validate_clean(df, verbose=False)
+    assert not df['provincia'].isin(['Error', 'Desconocida']).any()
+    assert df['provincia'].nunique() == 1 + 2 * 52
+    assert len(df) == len(raw)
+
+
+def test_benchmark_records_every_stage_and_flags_regressions(tmp_path):
+    """Each run appends all stage timings; slower stages are reported."""
+    raw_dir = tmp_path / 'raw'
+    synthetic_data.generate(raw_dir, start_year=2024, end_year=2025, fmt='csv')
+    results = tmp_path / 'results.jsonl'
+    assert benchmark.benchmark_dataset(raw_dir, 'tiny', repeat=1, results_path=results) == []
+
+    record = benchmark.last_result('tiny', results)
+    assert list(record['stages']) == [name for name, _, _ in benchmark.stages(raw_dir, tmp_path)]
+    assert all({'seconds', 'median', 'peak_mb'} <= set(s) for s in record['stages'].values())
+
+    slow = {**record, 'stages': {**record['stages'], 'clean': {'seconds': 10.0}}}
+    assert benchmark.regressions(slow, record) == ['clean']
+    assert benchmark.regressions(record, None) == []
+
+
 # ---------------------------------------------------------------------------
 # src/io.py
 # ---------------------------------------------------------------------------
@@ -41,6 +330,127 @@ def test_load_csv_returns_dataframe():
     assert df.shape[1] == 8, f"Expected 8 columns, got {df.shape[1]}"
 
 
+def test_parquet_roundtrip_and_pruning(tmp_path):
+    """save_parquet keeps dtypes and load_parquet filters by tabla/anyo."""
+    df = pd.DataFrame({
+        'tabla': [65349, 65345, 65345, 65349],
+        'anyo': [2020, 2021, 2020, 2020],
+        'valor': [1.5, 2.5, None, 4.0],
+        'fecha': pd.to_datetime(['2020-01-01', '2021-01-01', '2020-04-01', '2020-07-01']),
+        'es_nacional': [True, False, False, True],
+    })
+    path = tmp_path / 'data.parquet'
+    save_parquet(df, path)
+    back = load_parquet(path)
+    expected = df.sort_values(['tabla', 'anyo'], kind='stable').reset_index(drop=True)
+    pd.testing.assert_frame_equal(back, expected)
+    subset = load_parquet(path, columns=['valor'], tabla=65349, anyo=2020)
+    assert subset['valor'].tolist() == [1.5, 4.0]
+
+
+def test_json_series_stream_roundtrip(tmp_path):
+    """Streamed JSON matches json.dump/json.load, whatever the chunk size."""
+    series = _ine_series(65219) + [{'COD': 'X', 'Nombre': 'Año\n"ñ"', 'Data': []}]
+    path = tmp_path / 'series.json'
+    assert write_json_series(path, iter(series)) == len(series)
+    assert path.read_text(encoding='utf-8') == json.dumps(series, ensure_ascii=False, indent=2)
+    for chunk_size in (1, 50, 1 << 16):
+        assert list(iter_json_series(path, chunk_size)) == series
+
+    write_json_series(path, [])
+    assert list(iter_json_series(path)) == []
+
+
+def test_flatten_series_columnar():
+    """One typed row per data point; series attributes repeated per point."""
+    series = _ine_series(65219, n_series=2) + [{'COD': 'Z', 'Nombre': 'skip', 'Data': []}]
+    series[0]['Data'][0]['Valor'] = None
+
+    def parse(nombre):
+        return None if nombre == 'skip' else {'serie': nombre.split('.')[0]}
+
+    out = flatten_series(series, parse_nombre=parse)
+    n = len(QUARTERS)
+    assert len(out) == 2 * n
+    assert out['serie'].tolist() == ['Serie 0'] * n + ['Serie 1'] * n
+    assert out['serie_nombre'].iloc[0] == 'Serie 0. Total Nacional.'
+    assert out['fecha_ms'].dtype == 'int64' and out['valor'].dtype == 'float64'
+    assert out['valor'].isna().sum() == 1
+    assert flatten_series([], fields=['valor']).columns.tolist() == [
+        'serie_cod', 'serie_nombre', 'valor']
+
+
+def test_sqlite_store_upserts_and_pushes_filters_down(tmp_path, monkeypatch):
+    """The SQLite store round-trips the features, filters in SQL through
+    its indexes and only rewrites changed rows on a rerun."""
+    import sqlite3
+
+    df = build_features(clean(load_csv(RAW_PATH)))
+    path = tmp_path / 'epa.sqlite'
+    assert save_sqlite(df, path, source='v1') == len(df)
+    assert sqlite_source(path) == 'v1'
+
+    # Every connection is closed once read
+    opened, connect = [], sqlite3.connect
+
+    def tracked(*args, **kwargs):
+        opened.append(connect(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(sqlite3, 'connect', tracked)
+    assert sqlite_source(path) == 'v1' and len(load_sqlite(path, provincia='Jaén'))
+    assert len(opened) == 2
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
+    monkeypatch.undo()
+
+    def by_key(frame):
+        return frame.sort_values(list(SQLITE_KEY)).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(by_key(load_sqlite(path)), by_key(df),
+                                  check_categorical=False)
+
+    query = dict(provincia='Jaén', actividad=['Parados', 'Activos'],
+                 trimestre=('2012Q1', '2014Q4'))
+    rows = load_sqlite(path, columns=['serie_cod', 'trimestre', 'valor'], **query)
+    expected = df[(df['provincia'] == 'Jaén') & df['actividad'].isin(['Parados', 'Activos'])
+                  & df['trimestre'].astype(str).between('2012Q1', '2014Q4')]
+    assert len(rows) == len(expected) > 0
+    assert rows['valor'].sum() == pytest.approx(expected['valor'].sum())
+    with sqlite3.connect(path) as conn:
+        indexes = {name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT valor FROM epa "
+                            "WHERE provincia = 'Jaén' AND trimestre = '2012Q1'").fetchall()
+    assert set(SQLITE_INDEXES) <= indexes
+    assert 'idx_epa_provincia_trimestre' in str(plan)
+    with pytest.raises(KeyError):
+        load_sqlite(path, provincia_x='Jaén')
+
+    # Rerun: unchanged rows are skipped, changed values updated in place
+    changed = df.copy()
+    rows = changed.index[changed['valor'].notna()][:3]
+    changed.loc[rows, 'valor'] += 1
+    assert save_sqlite(changed, path, source='v2') == 3
+    assert sqlite_source(path) == 'v2'
+    back = load_sqlite(path, serie_cod=changed.loc[rows, 'serie_cod'].tolist())
+    merged = back.merge(changed.loc[rows], on=list(SQLITE_KEY))
+    assert len(merged) == 3 and (merged['valor_x'] == merged['valor_y']).all()
+    assert len(load_sqlite(path, columns=['tabla'])) == len(df)
+
+
+def test_sqlite_reads_paths_with_uri_characters(tmp_path):
+    """Read-only opens escape the path, so '#', '?' and '%' in a directory
+    name do not cut it short or get decoded."""
+    df = build_features(clean(load_csv(RAW_PATH).head(500)))
+    path = tmp_path / 'datos #1 ?%41' / 'epa.sqlite'
+    save_sqlite(df, path, source='v1')
+    assert sqlite_source(path) == 'v1'
+    assert len(load_sqlite(path, columns=['tabla'])) == len(df)
+    assert [p.name for p in tmp_path.iterdir()] == ['datos #1 ?%41']
+
+
 # ---------------------------------------------------------------------------
 # src/cleaning.py
 # ---------------------------------------------------------------------------
@@ -84,6 +494,28 @@ def test_clean_sexo_canonical():
     assert len(unexpected) == 0, f"Unexpected sexo values: {unexpected}"
 
 
+def test_parse_series_one_row_per_distinct_series():
+    """parse_series parses each (tabla, serie_nombre_lower) pair exactly once."""
+    keys = pd.DataFrame({
+        'tabla': [65354, 65354, 65349, 99999],
+        'serie_nombre_lower': ['madrid. ocupados. ambos sexos. industria. personas.'] * 2
+                              + ['tasa de paro de la población. jaén. mujeres. total.', 'x'],
+    })
+    dim = parse_series(keys)
+    assert len(dim) == 3
+    assert dim.iloc[0][['provincia', 'actividad']].tolist() == ['Madrid', 'Ocupados - Industria']
+    assert dim.iloc[1][['provincia', 'sexo']].tolist() == ['Jaén', 'Mujeres']
+    assert dim.iloc[2]['provincia'] == 'Desconocida'
+
+
+def test_parse_fechas_matches_parse_fecha():
+    """parse_fechas gives the same result as parse_fecha on every dirty format."""
+    raw = pd.Series(['2014-09-30', '30/09/2014', '2014/09/30', 'Sep 30, 2014',
+                     '1412028000000', None, '<NA>', 'garbage', '30/09/2014'], dtype=object)
+    expected = pd.to_datetime(pd.Series([parse_fecha(v) for v in raw]))
+    pd.testing.assert_series_equal(parse_fechas(raw), expected, check_names=False)
+
+
 # ---------------------------------------------------------------------------
 # src/features.py
 # ---------------------------------------------------------------------------
@@ -103,6 +535,514 @@ def test_build_features_final_shape():
     assert df.shape[1] == 17, f"Expected 17 columns, got {df.shape[1]}"
 
 
+def test_build_features_matches_schema():
+    """Every featured column has its declared compact dtype."""
+    df = build_features(clean(load_csv(RAW_PATH)))
+    assert check_schema(df, FEATURES_SCHEMA) == []
+    assert set(FEATURES_SCHEMA) == set(df.columns)
+
+
+# ---------------------------------------------------------------------------
+# src/streaming.py
+# ---------------------------------------------------------------------------
+
+def test_streaming_matches_in_memory(tmp_path):
+    """Chunked clean + features writes the same CSV as the in-memory path."""
+    expected = tmp_path / 'in_memory.csv'
+    build_features(clean(load_csv(RAW_PATH))).to_csv(expected, index=False)
+    streamed = tmp_path / 'streamed.csv'
+    rows = run_streaming(RAW_PATH, 7_000, csv_path=streamed)
+    assert streamed.read_bytes() == expected.read_bytes()
+    assert rows == len(pd.read_csv(expected))
+
+
+def test_key_index_compares_exact_keys():
+    """Keys that differ in any field are kept; repeated keys are dropped."""
+    def frame(rows):
+        return pd.DataFrame(rows, columns=['tabla', 'serie_cod', 'anyo', 'periodo_id'])
+
+    index = KeyIndex()
+    first = frame([(65349, 'EPA1', 2020, 19), (65349, 'EPA2', 2020, 19)])
+    assert len(index.drop_seen(first)) == 2
+    second = frame([(65349, 'EPA1', 2020, 19), (65345, 'EPA1', 2020, 19),
+                    (65349, 'EPA1', 2021, 19), (65349, 'EPA1', 2020, 20)])
+    assert index.drop_seen(second).index.tolist() == [1, 2, 3]
+    assert len(index) == 5
+
+
+# ---------------------------------------------------------------------------
+# src/star.py
+# ---------------------------------------------------------------------------
+
+def test_star_schema_roundtrip_and_filtered_load(tmp_path):
+    """The star files rebuild the wide table; filters only read matching facts."""
+    df = build_features(clean(load_csv(RAW_PATH)))
+    series, quarters, facts = build_star(df)
+    assert len(series) == df['serie_cod'].nunique()
+    assert len(facts) == len(df)
+    assert facts.columns.tolist() == ['series_key', 'quarter_key', 'valor']
+
+    # Built chunk by chunk (streaming mode) it is the same schema
+    builder = StarBuilder()
+    for start in range(0, len(df), 7_000):
+        builder.add(df.iloc[start:start + 7_000])
+    for chunked, whole in zip(builder.build(), (series, quarters, facts)):
+        pd.testing.assert_frame_equal(chunked, whole, check_categorical=False)
+
+    save_star(df, tmp_path)
+    key = ['serie_cod', 'anyo', 'periodo_id']
+    wide = df.sort_values(key).reset_index(drop=True)
+    star = load_star(tmp_path).sort_values(key).reset_index(drop=True)
+    # serie_nombre and fecha are stored in their most common per-series/quarter form
+    same = [c for c in df.columns if c not in ('serie_nombre', 'fecha')]
+    pd.testing.assert_frame_equal(star[same], wide[same], check_categorical=False)
+
+    jaen = load_star(tmp_path, columns=['trimestre', 'valor'],
+                     provincia='Jaén', sexo='Ambos sexos', tabla=65349)
+    expected = df[(df['provincia'] == 'Jaén') & (df['sexo'] == 'Ambos sexos')
+                  & (df['tabla'] == 65349)]
+    assert len(jaen) == len(expected) > 0
+    assert jaen.columns.tolist() == ['trimestre', 'valor']
+
+
+# ---------------------------------------------------------------------------
+# src/query.py
+# ---------------------------------------------------------------------------
+
+def test_indicador_code():
+    assert indicador_code('Tasa de paro de la poblacion') == 'tasa_paro'
+    assert indicador_code('Ocupados - Construcción') == 'sector_construccion'
+    assert indicador_code('OCUPADOS') == 'ocupados'
+
+
+def test_epa_cube_select_matches_masks():
+    """Indexed selections equal the boolean-mask filters, row order included."""
+    df = build_features(clean(load_csv(RAW_PATH)))
+    cube = EpaCube(df)
+    paro = (df['tabla'] == 65349) & df['actividad'].str.contains('paro', case=False)
+
+    got = cube.select(tabla=65349, indicador='tasa_paro', sexo=['Hombres', 'Mujeres'],
+                      ambito='nacional')
+    pd.testing.assert_frame_equal(
+        got, df[paro & df['sexo'].isin(['Hombres', 'Mujeres']) & df['es_nacional']])
+
+    got = cube.select(tabla=65349, indicador='tasa_paro', ambito='provincial',
+                      periodo=('2012Q1', '2014Q4'))
+    expected = df[paro & ~df['es_nacional'] & df['trimestre'].between('2012Q1', '2014Q4')]
+    assert len(got) > 0
+    pd.testing.assert_frame_equal(got, expected)
+
+    last = df['trimestre'].max()
+    pd.testing.assert_frame_equal(cube.select(periodo=[last]), df[df['trimestre'] == last])
+    assert cube.select(indicador='no_existe').empty
+
+
+# ---------------------------------------------------------------------------
+# src/dense.py
+# ---------------------------------------------------------------------------
+
+def test_dense_cube_matches_frame_and_maps_without_copy(tmp_path):
+    """The saved cube holds every valor at its labels; loading maps the file
+    and label/range selections are views of the mapping."""
+    df = build_features(clean(load_csv(RAW_PATH)))
+    path = tmp_path / 'cubo.npy'
+    save_dense(build_dense(df), path)
+    t0 = time.perf_counter()
+    cube = load_dense(path)
+    assert time.perf_counter() - t0 < 0.5
+    assert isinstance(cube.values, np.memmap) and cube.values.dtype == 'float32'
+    assert cube.dims == ('indicador', 'provincia', 'sexo', 'trimestre')
+    assert cube.attrs['ccaa']['Jaén'] == 'Andalucía'
+
+    # Every row of the frame is one cell of the cube
+    rows = df.dropna(subset=['valor'])
+    assert np.count_nonzero(~np.isnan(cube.values)) == len(rows)
+    expected = EpaCube(df).select(tabla=65349, indicador='tasa_paro', sexo='Ambos sexos',
+                                  periodo=('2012Q1', '2014Q4'))
+    paro = cube.sel(indicador='tasa_paro', sexo='Ambos sexos', trimestre=('2012Q1', '2014Q4'))
+    assert paro.dims == ('provincia', 'trimestre') and paro.shape[1] == 12
+    assert np.shares_memory(paro.values, cube.values)
+    frame = paro.to_frame()
+    assert np.shares_memory(frame.to_numpy(), cube.values)
+    jaen = expected[expected['provincia'] == 'Jaén'].sort_values('trimestre')
+    np.testing.assert_array_equal(frame.loc['Jaén'].to_numpy(), jaen['valor'].to_numpy())
+
+    pair = cube.sel(provincia=['Madrid', 'Jaén'], indicador='tasa_paro', sexo='Mujeres')
+    assert pair.coords['provincia'].tolist() == ['Madrid', 'Jaén']
+    np.testing.assert_array_equal(
+        pair.values[1], cube.sel(provincia='Jaén', indicador='tasa_paro', sexo='Mujeres').values)
+    with pytest.raises(KeyError):
+        cube.sel(region='Jaén')
+
+
+def test_dense_builder_fills_chunks_and_rejects_duplicate_cells():
+    """Filled block by block the cube equals the in-memory one, and a cell
+    given twice (in one block or across blocks) raises."""
+    df = build_features(clean(load_csv(RAW_PATH)))
+    whole = build_dense(df)
+    builder = DenseBuilder()
+    for start in range(0, len(df), 20_000):
+        builder.add(df.iloc[start:start + 20_000])
+    chunked = builder.build()
+    np.testing.assert_array_equal(chunked.values, whole.values)
+    assert all(chunked.coords[dim].equals(whole.coords[dim]) for dim in whole.dims)
+    assert chunked.attrs == whole.attrs
+
+    with pytest.raises(ValueError, match='duplicate'):
+        build_dense(pd.concat([df, df.iloc[[5]]]))
+    with pytest.raises(ValueError, match='duplicate'):
+        DenseBuilder().add(df.iloc[:100]).add(df.iloc[50:60])
+
+
+def test_aggregates_match_groupby_rollups(tmp_path):
+    """CCAA/national rollups sum levels (NaN if a province is missing),
+    weight rates by their base over the provinces that report one, record
+    their coverage, and a year is the mean of its quarters."""
+    df = build_features(clean(load_csv(RAW_PATH)))
+    save_aggregates(rollup(build_dense(df)), tmp_path)
+    aggs = load_aggregates(tmp_path)
+    quarters, years = aggs['trimestre'], aggs['anyo']
+    assert isinstance(quarters.values, np.memmap)
+    assert aggs['cobertura_trimestre'].shape == quarters.shape
+    assert quarters.dims == ('indicador', 'ambito', 'sexo', 'trimestre')
+    assert 'Andalucía' in quarters.coords['ambito'] and 'Desconocida' not in quarters.coords['ambito']
+
+    prov = df[~df['es_nacional'] & (df['ccaa'] != 'Desconocida') & (df['sexo'] == 'Ambos sexos')]
+    prov = prov.assign(valor=prov['valor'].astype('float64'),
+                       provincia=prov['provincia'].astype(str),
+                       trimestre=prov['trimestre'].astype(str),
+                       indicador=prov['actividad'].astype(str).map(indicador_code))
+    ccaa = prov.drop_duplicates('provincia').set_index('provincia')['ccaa'].astype(str)
+    trimestres = sorted(prov['trimestre'].unique())
+
+    def wide(indicador):  # provincia × trimestre, NaN where there is no value
+        rows = prov[prov['indicador'] == indicador]
+        return rows.pivot(index='provincia', columns='trimestre', values='valor').reindex(
+            index=ccaa.index, columns=trimestres)
+
+    def by_ccaa(frame):  # sum per CCAA, NaN if any province is missing
+        return frame.groupby(ccaa).sum().mask(frame.isna().groupby(ccaa).any())
+
+    ocupados, paro, activos = wide('ocupados'), wide('tasa_paro'), wide('activos')
+    got = quarters.sel(indicador='ocupados', sexo='Ambos sexos').to_frame()
+    expected = by_ccaa(ocupados)
+    np.testing.assert_allclose(got.loc[expected.index, expected.columns].to_numpy(),
+                               expected.to_numpy(), rtol=1e-6)
+
+    # Rates: weighted by activos (a missing one filled with the province's
+    # mean) over the provinces that have both, NaN only if none has
+    weights = activos.T.fillna(activos.mean(axis=1)).T
+    used = paro.notna() & weights.notna()
+    weight = weights.where(used).groupby(ccaa).sum()
+    expected = ((paro * weights).where(used).groupby(ccaa).sum() / weight).where(weight > 0)
+    got = quarters.sel(indicador='tasa_paro', sexo='Ambos sexos').to_frame()
+    np.testing.assert_allclose(got.loc[expected.index, expected.columns].to_numpy(),
+                               expected.to_numpy(), rtol=1e-6)
+    coverage = aggs['cobertura_trimestre'].sel(indicador='tasa_paro', sexo='Ambos sexos')
+    expected = used.groupby(ccaa).mean()
+    np.testing.assert_allclose(coverage.to_frame().loc[expected.index, expected.columns],
+                               expected.to_numpy(), rtol=1e-6)
+    assert (expected < 1).to_numpy().any()
+
+    # Chart 6 draws every CCAA-quarter the plain mean of provincial rates had
+    baseline = paro.groupby(ccaa).mean()
+    heatmap = viz.CHART_INPUTS[CHARTS[5][0]](EpaCube(df, aggregates=aggs)).to_frame()
+    assert heatmap.drop(index='Total Nacional').notna().to_numpy().sum() >= (
+        baseline.notna().to_numpy().sum())
+    assert ocupados.isna().to_numpy().any()
+
+    nacional = ocupados.sum().mask(ocupados.isna().any())
+    got = quarters.sel(indicador='ocupados', sexo='Ambos sexos', ambito='Total Nacional')
+    np.testing.assert_allclose(got.values, nacional.loc[got.coords['trimestre']], rtol=1e-6)
+    anual = nacional.groupby(nacional.index.str[:4]).mean().mask(
+        nacional.isna().groupby(nacional.index.str[:4]).any())
+    np.testing.assert_allclose(
+        years.sel(indicador='ocupados', sexo='Ambos sexos', ambito='Total Nacional').values,
+        anual.loc[years.coords['anyo']], rtol=1e-6)
+
+
+# ---------------------------------------------------------------------------
+# main.py / fetch_data.py startup
+# ---------------------------------------------------------------------------
+
+# Runs main.main() with the outputs redirected to argv[1] and raw data from
+# argv[2]; prints the seconds taken and which heavy libraries got imported
+CLI_PROBE = """
+import json, sys, time
+from pathlib import Path
+started = time.perf_counter()
+import main
+out, raw = Path(sys.argv[1]), Path(sys.argv[2])
+main.DATA_RAW, main.DATA_PROCESSED, main.CHARTS_DIR = raw, out / 'processed', out / 'charts'
+for name in ('RAW_PATH', 'RAW_PARQUET_PATH'):
+    setattr(main, name, raw / getattr(main, name).name)
+for name in ('OUT_PATH', 'OUT_PARQUET_PATH', 'STAR_SERIES_PATH', 'STAR_QUARTERS_PATH',
+             'STAR_FACTS_PATH', 'DENSE_PATH', 'DENSE_LABELS_PATH', 'AGG_QUARTERS_PATH',
+             'AGG_YEARS_PATH', 'AGG_QUARTERS_COVERAGE_PATH', 'AGG_YEARS_COVERAGE_PATH',
+             'SQLITE_PATH'):
+    setattr(main, name, main.DATA_PROCESSED / getattr(main, name).name)
+main.PERIODS_DATA_DIR = main.DATA_PROCESSED / 'periodos'
+main.PERIODS_CHARTS_DIR = main.CHARTS_DIR / 'periodos'
+sys.argv = ['main.py', *sys.argv[3:]]
+try:
+    main.main()
+except SystemExit:
+    pass
+print(json.dumps({'seconds': time.perf_counter() - started,
+                  'modules': [m for m in ('pandas', 'matplotlib', 'requests', 'fetch_data')
+                              if m in sys.modules]}))
+"""
+
+FETCH_HELP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import fetch_data
+sys.argv = ['fetch_data.py', '--help']
+try:
+    fetch_data.parse_args()
+except SystemExit:
+    pass
+print(json.dumps({'seconds': time.perf_counter() - started,
+                  'modules': [m for m in ('pandas', 'requests') if m in sys.modules]}))
+"""
+
+
+def _probe(*argv, script=CLI_PROBE):
+    out = subprocess.run([sys.executable, '-c', script, *map(str, argv)], cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_cli_modes_import_only_what_they_need(tmp_path):
+    """--help loads no heavy library, --no-charts no matplotlib and
+    --only-charts neither requests nor the fetch code."""
+    heavy = _probe(script="import json, time; t = time.perf_counter(); "
+                          "import pandas, matplotlib.pyplot, requests; "
+                          "print(json.dumps({'seconds': time.perf_counter() - t}))")
+    help_ = _probe(tmp_path, DATA_RAW, '--help')
+    assert help_['modules'] == []
+    assert help_['seconds'] < heavy['seconds'] / 4
+
+    fetch_help = _probe(script=FETCH_HELP_PROBE)
+    assert fetch_help['modules'] == []
+    assert fetch_help['seconds'] < heavy['seconds'] / 4
+
+    data = _probe(tmp_path, DATA_RAW, '--no-charts', '--no-cache', '--format', 'parquet')
+    assert data['modules'] == ['pandas']
+    assert (tmp_path / 'processed' / 'epa_mercado_laboral_clean.parquet').exists()
+    assert not (tmp_path / 'charts').exists()
+
+    charts = _probe(tmp_path, DATA_RAW, '--only-charts', '--no-cache', '-j', '1')
+    assert charts['modules'] == ['pandas', 'matplotlib']
+    assert len(list((tmp_path / 'charts').glob('*.png'))) == len(CHARTS)
+
+    # --only-charts reads data/processed/ only: no raw file is needed (the
+    # raw-table charts then fail, the others are drawn)
+    no_raw = tmp_path / 'no_raw'
+    no_raw.mkdir()
+    _probe(tmp_path, no_raw, '--only-charts', '--no-cache', '-j', '1')
+    assert len(list((tmp_path / 'charts').glob('*.png'))) == len(
+        [c for c in CHARTS if c[2] == 'df'])
+
+
+# ---------------------------------------------------------------------------
+# src/profiling.py
+# ---------------------------------------------------------------------------
+
+def test_profiler_nests_accumulates_and_tracks_memory(tmp_path, monkeypatch):
+    """Stages nest by path, repeat into one entry and report their peak."""
+    with stage('ignored'):     # no active profiler: no-op
+        pass
+    profiler = Profiler(memory=True, cprofile=True)
+    with profiler.activate():
+        with stage('outer'):
+            for _ in range(2):
+                with stage('inner'):
+                    block = bytearray(8 * 2**20)
+                    del block
+        with stage('clean'):
+            clean(load_csv(RAW_PATH).head(2000))
+
+    stages = profiler.stages
+    assert list(stages)[:2] == ['outer', 'outer/inner']
+    assert stages['outer/inner']['calls'] == 2
+    assert stages['outer/inner']['peak_mb'] >= 8
+    assert stages['outer']['peak_mb'] >= stages['outer/inner']['peak_mb']
+    assert {'clean/parse_names', 'clean/parse_dates', 'clean/dedup'} <= set(stages)
+
+    report = json.loads(profiler.write(tmp_path / 'profile.json', argv=['x']).read_text())
+    assert report['argv'] == ['x'] and report['stages']['outer']['calls'] == 1
+    assert report['cprofile']['stage'] == profiler.hottest()
+    assert (tmp_path / 'profile.prof').exists()
+
+    # Memory tracing is opt-in: by default only times and RSS are recorded
+    profiler = Profiler()
+    with profiler.activate(), stage('outer'):
+        assert not tracemalloc.is_tracing()
+    assert 'peak_mb' not in profiler.stages['outer'] and 'rss_mb' in profiler.stages['outer']
+
+    # Without resource (Windows) nor psutil, the RSS fields are left out
+    monkeypatch.setattr(profiling, 'resource', None)
+    monkeypatch.setattr(profiling, 'psutil', None)
+    profiler = Profiler()
+    with profiler.activate(), stage('outer'):
+        pass
+    assert 'rss_mb' not in profiler.stages['outer']
+    assert 'rss_mb' not in profiler.report()['total']
+
+
+# ---------------------------------------------------------------------------
+# src/cache.py
+# ---------------------------------------------------------------------------
+
+def test_stage_cache_roundtrip_and_force(tmp_path):
+    """Cached frames come back identical; force and disabled caches miss."""
+    df = build_features(clean(load_csv(RAW_PATH)))
+    key = stage_key('features', 'digest', 'code')
+    StageCache(tmp_path).put_frame(key, df)
+    pd.testing.assert_frame_equal(StageCache(tmp_path).get_frame(key),
+                                  df.reset_index(drop=True))
+    assert StageCache(tmp_path, force=True).get_frame(key) is None
+    assert StageCache(tmp_path, enabled=False).get_frame(key) is None
+    assert StageCache(tmp_path).get_frame(stage_key('features', 'other', 'code')) is None
+
+
+def test_stage_cache_evicts_least_recently_used(tmp_path):
+    """Entries beyond max_bytes are evicted oldest-use first."""
+    cache = StageCache(tmp_path / 'cache', max_bytes=2500)
+    for name in ('a', 'b', 'c'):
+        path = tmp_path / f'{name}.bin'
+        path.write_bytes(b'x' * 1000)
+        cache.put_files(name, [path])
+        if name == 'b':
+            assert cache.restore_files('a', tmp_path / 'out')  # touch 'a'
+    assert cache.restore_files('b', tmp_path / 'out') is None
+    assert cache.restore_files('a', tmp_path / 'out')
+    assert cache.restore_files('c', tmp_path / 'out')
+
+
+# ---------------------------------------------------------------------------
+# src/viz.py
+# ---------------------------------------------------------------------------
+
+def test_generate_all_charts_parallel_isolates_errors(tmp_path):
+    """Parallel rendering writes every chart and reports per-chart failures."""
+    df = build_features(clean(load_csv(RAW_PATH)))
+    profiler = Profiler(memory=False)
+    with profiler.activate(), stage('charts'):
+        failed = generate_all_charts(df, DATA_RAW, tmp_path / 'ok', workers=3)
+    assert failed == []
+    assert sorted(p.name for p in (tmp_path / 'ok').glob('*.png')) == [c[0] for c in CHARTS]
+    # Charts rendered by the workers are reported as sub-stages of the caller
+    assert list(profiler.stages)[1:] == [f'charts/{Path(c[0]).stem}' for c in CHARTS]
+
+    failed = generate_all_charts(df, tmp_path / 'no_raw', tmp_path / 'partial', workers=3)
+    assert failed == [c[0] for c in CHARTS if c[2] == 'raw']
+    assert len(list((tmp_path / 'partial').glob('*.png'))) == len(CHARTS) - len(failed)
+
+
+def test_generate_all_charts_rerenders_only_changed_inputs(tmp_path, capsys):
+    """A rerun keeps the charts whose input slice is unchanged and redraws
+    only the one whose rows changed."""
+    df = build_features(clean(load_csv(RAW_PATH)))
+    assert generate_all_charts(df, DATA_RAW, tmp_path) == []
+    mtimes = {p.name: p.stat().st_mtime_ns for p in tmp_path.glob('*.png')}
+    assert sorted(json.loads((tmp_path / viz.MANIFEST).read_text())) == sorted(mtimes)
+
+    capsys.readouterr()
+    generate_all_charts(df, DATA_RAW, tmp_path)
+    assert capsys.readouterr().out.count('sin cambios') == len(CHARTS)
+
+    # Only chart 2 reads the national unemployment rate of women
+    mujeres = (df['tabla'] == 65349) & df['es_nacional'] & (df['sexo'] == 'Mujeres')
+    df.loc[mujeres, 'valor'] += 1
+    generate_all_charts(df, DATA_RAW, tmp_path)
+    changed = sorted(p.name for p in tmp_path.glob('*.png')
+                     if p.stat().st_mtime_ns != mtimes[p.name])
+    assert changed == ['02_brecha_genero_paro.png']
+
+    generate_all_charts(df, DATA_RAW, tmp_path, reuse=False)
+    assert all(p.stat().st_mtime_ns != mtimes[p.name] for p in tmp_path.glob('*.png'))
+
+
+def test_render_profiles_and_formats(tmp_path):
+    """Preview renders are smaller than publication ones; vector and webp
+    outputs are written in their own format and tracked separately."""
+    from PIL import Image
+    cube = EpaCube(build_features(clean(load_csv(RAW_PATH))))
+    for render in viz.RENDER_PROFILES:
+        viz.plot_heatmap_paro_ccaa(cube, save_path=tmp_path / f'{render}.png', render=render)
+    with Image.open(tmp_path / 'preview.png') as preview, \
+            Image.open(tmp_path / 'publication.png') as publication:
+        assert preview.width * 2 < publication.width
+
+    viz.plot_brecha_genero(cube, save_path=tmp_path / 'brecha.svg', render='preview')
+    assert (tmp_path / 'brecha.svg').read_text().lstrip().startswith('<?xml')
+    viz.plot_brecha_genero(cube, save_path=tmp_path / 'brecha.pdf')
+    assert (tmp_path / 'brecha.pdf').read_bytes()[:4] == b'%PDF'
+    with pytest.raises(ValueError):
+        viz.chart_filename(CHARTS[0][0], 'bmp')
+
+    out = tmp_path / 'charts'
+    assert generate_all_charts(cube, DATA_RAW, out, render='preview') == []
+    # Switching format removes the charts of the previous manifest only
+    user_files = [out / 'mi_grafico.png', out / viz.chart_filename(CHARTS[0][0], 'svg')]
+    for path in user_files:
+        path.write_bytes(b'mine')
+    assert generate_all_charts(cube, DATA_RAW, out, render='preview', fmt='webp') == []
+    webps = sorted(p.name for p in out.glob('*.webp'))
+    assert webps == [viz.chart_filename(c[0], 'webp') for c in CHARTS]
+    assert sorted(json.loads((out / viz.MANIFEST).read_text())) == webps
+    assert sorted(out.glob('*.png')) == user_files[:1] and user_files[1].read_bytes() == b'mine'
+    with Image.open(out / webps[0]) as image:
+        assert image.format == 'WEBP'
+
+
+def test_periods_batch_slices_data_and_charts_per_window(tmp_path):
+    """Each window gets its rows and its charts (raw tables included) from
+    one featured frame, also when run by parallel workers."""
+    df = build_features(clean(load_csv(RAW_PATH)))
+    years = sorted(df['year'].dropna().unique().tolist())
+    middle = years[len(years) // 2]
+    windows = [(years[0], middle), (middle + 1, years[-1])]
+    results = run_periods(df, windows, tmp_path / 'data', tmp_path / 'charts', DATA_RAW,
+                          data_format='parquet', workers=2, render='preview')
+    assert sum(rows for rows, _ in results.values()) == len(df)
+    for window, (rows, failed) in results.items():
+        assert failed == []
+        part = load_processed(tmp_path / 'data' / window_name(window) / OUT_PARQUET_PATH.name)
+        assert len(part) == rows and viz._period_label(part) == f'{window[0]}–{window[1]}'
+        charts = tmp_path / 'charts' / window_name(window)
+        assert len(list(charts.glob('*.png'))) == len(CHARTS)
+
+    edad = viz._load_raw_table(viz.RawWindow(DATA_RAW, *windows[0]), 65219,
+                               'epa_tasas_paro_edad_raw.json', viz._parse_nombre_65219)
+    assert edad['anyo'].between(*windows[0]).all()
+
+
+def test_raw_table_cache_hits_and_invalidates(tmp_path):
+    """A raw table is parsed once per file version and copies are returned."""
+    series = [{'COD': 'A', 'Nombre': 'Total Nacional. Tasa de paro. Ambos sexos. '
+                                     'De 16 a 19 años. ',
+               'Data': [_ine_point(2021, 1, 30.0)]}]
+    path = tmp_path / 'epa_tasas_paro_edad_raw.json'
+    write_json_series(path, series)
+    viz._read_raw_table.cache_clear()
+
+    def load():
+        return viz._load_raw_table(tmp_path, 65219, path.name, viz._parse_nombre_65219)
+
+    first = load()
+    first['valor'] = 0.0
+    assert load()['valor'].tolist() == [30.0]
+    assert viz.raw_table_cache_info()[:2] == (1, 1)   # hits, misses
+
+    series[0]['Data'].append(_ine_point(2020, 4, 31.0))
+    write_json_series(path, series)
+    assert len(load()) == 2
+    assert viz.raw_table_cache_info()[:2] == (1, 2)
+
+
 # ---------------------------------------------------------------------------
 # src/utils.py
 # ---------------------------------------------------------------------------